@@ -12,6 +12,7 @@ from . import utilities
 
 from . import bots
 from . import cpp_bots
+from . import _corridors
 from .game import Game
 from .user import User
 from .board import locationFromDirection, hopTarget
@@ -42,7 +43,8 @@ def handle(name):
 async def handle_new_game(ws, who):
     assert who in ("human", "bot")
 
-    game = Game(red=ws.user)
+    # the native board, so the C++ bots needn't convert it every move
+    game = Game(red=ws.user, board=_corridors.Board())
 
     if "bot" == who:
         # game.players['blue']=bots.AlphaBetaBot(bots.StepsBot3())
@@ -192,9 +194,11 @@ async def handle_game_command(ws, command):
         if isinstance(game.players["blue"], bots.BaseBot):
             if not game.board.gameOver():
                 bot = game.players["blue"]
-                # This should probably be run in a threadpool
                 logging.info(" Calling bot")
-                command = bot(game.board)
+                # the bot gets an immutable snapshot, so can think in
+                # another thread while we carry on serving the board
+                loop = asyncio.get_event_loop()
+                command = await loop.run_in_executor(None, bot, game.board.snapshot())
                 logging.info("Bot suggests :{}".format(command))
                 game.board(*command)
                 await ractive_set(ws, "current_game", game)
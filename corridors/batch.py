@@ -0,0 +1,203 @@
+"""
+    Many positions at once, as stacked numpy arrays.
+
+    The main use is evaluating every child of a position in one go: the
+    children share all but (at most) one wall, so we can build their
+    (B, M, M) wall stack directly from the parent and the commands, without
+    ever applying them to a Board.
+"""
+import numpy as np
+
+from .board import locationFromDirection, hopTarget
+from .movement import HORIZONTAL, VERTICAL, UNREACHABLE
+
+
+class Positions:
+    """
+        B positions on boards of size N.
+
+        walls:      (B, N-1, N-1)
+        red, blue:  (B, 2) piece locations
+        redWalls, blueWalls: (B,) walls left
+        redToPlay:  (B,) bool
+    """
+
+    def __init__(self, N, walls, red, blue, redWalls, blueWalls, redToPlay):
+        self.N = N
+        self.walls = walls
+        self.red = red
+        self.blue = blue
+        self.redWalls = redWalls
+        self.blueWalls = blueWalls
+        self.redToPlay = redToPlay
+
+    def __len__(self):
+        return len(self.walls)
+
+    def arrays(self):
+        "The arrays in the order the _corridors batch functions take them"
+        return (
+            self.walls,
+            self.red,
+            self.blue,
+            self.redWalls,
+            self.blueWalls,
+            self.redToPlay,
+        )
+
+    @classmethod
+    def fromBoards(cls, boards):
+        return cls(
+            boards[0].N,
+            np.stack([board.walls for board in boards]),
+            np.array([board.red.location for board in boards]),
+            np.array([board.blue.location for board in boards]),
+            np.array([board.red.walls for board in boards]),
+            np.array([board.blue.walls for board in boards]),
+            np.array([board.turn == "red" for board in boards]),
+        )
+
+    @classmethod
+    def children(cls, board, commands):
+        """
+            The positions reached by applying each of `commands` to `board`.
+            Assumes the commands are legal.
+        """
+        B = len(commands)
+        red = board.turn == "red"
+        piece = board.currentPiece()
+
+        walls = np.repeat(board.walls[np.newaxis], B, axis=0)
+        locations = np.array([piece.location] * B)
+        wallsLeft = np.full(B, piece.walls)
+
+        for k, command in enumerate(commands):
+            action = command[0]
+            if "move" == action:
+                locations[k] = locationFromDirection(piece.location, command[1])
+            elif "hop" == action:
+                locations[k] = hopTarget(piece.location, command[1], command[2])
+            else:
+                walls[(k,) + tuple(command[1])] = (
+                    HORIZONTAL if action == "hwall" else VERTICAL
+                )
+                wallsLeft[k] -= 1
+
+        other = board.blue if red else board.red
+        otherLocations = np.array([other.location] * B)
+        otherWalls = np.full(B, other.walls)
+
+        return cls(
+            board.N,
+            walls,
+            locations if red else otherLocations,
+            otherLocations if red else locations,
+            wallsLeft if red else otherWalls,
+            otherWalls if red else wallsLeft,
+            np.full(B, not red),
+        )
+
+    def blocked(self):
+        """
+            For each direction a (B, N, N) mask of the squares that can't move
+            that way, because of a wall or the edge of the board.
+        """
+        N = self.N
+        B = len(self)
+        H = self.walls == HORIZONTAL
+        V = self.walls == VERTICAL
+
+        up, down, left, right = (np.zeros((B, N, N), dtype=bool) for _ in range(4))
+
+        # a horizontal wall at (j, i) separates rows j and j+1
+        # in columns i and i+1
+        down[:, :-1, :-1] |= H
+        down[:, :-1, 1:] |= H
+        up[:, 1:, :-1] |= H
+        up[:, 1:, 1:] |= H
+
+        # a vertical wall at (j, i) separates columns i and i+1
+        # in rows j and j+1
+        right[:, :-1, :-1] |= V
+        right[:, 1:, :-1] |= V
+        left[:, :-1, 1:] |= V
+        left[:, 1:, 1:] |= V
+
+        up[:, 0, :] = True
+        down[:, -1, :] = True
+        left[:, :, 0] = True
+        right[:, :, -1] = True
+        return up, down, left, right
+
+    def stepsToEscape(self, locations, target_rank, blocked=None):
+        """
+            (B,) shortest distances from `locations` to `target_rank`.
+
+            Grows every board's reachable region out from the goal row one
+            step at a time with shifted boolean masks, recording each
+            location's distance as the region reaches it.
+        """
+        up, down, left, right = blocked or self.blocked()
+        B = len(self)
+        index = np.arange(B)
+        j, i = locations[:, 0], locations[:, 1]
+
+        reached = np.zeros((B, self.N, self.N), dtype=bool)
+        reached[:, target_rank, :] = True
+        steps = np.full(B, UNREACHABLE, dtype=np.int64)
+
+        for step in range(self.N * self.N):
+            found = reached[index, j, i] & (steps == UNREACHABLE)
+            steps[found] = step
+            if (steps != UNREACHABLE).all():
+                break
+
+            grown = reached.copy()
+            # squares that can step up/down/left/right into the region
+            grown[:, 1:, :] |= reached[:, :-1, :] & ~up[:, 1:, :]
+            grown[:, :-1, :] |= reached[:, 1:, :] & ~down[:, :-1, :]
+            grown[:, :, 1:] |= reached[:, :, :-1] & ~left[:, :, 1:]
+            grown[:, :, :-1] |= reached[:, :, 1:] & ~right[:, :, :-1]
+            if (grown == reached).all():
+                break
+            reached = grown
+
+        return steps
+
+    def distanceFields(self, target_rank, blocked=None):
+        "(B, N, N) steps from every square to `target_rank`"
+        up, down, left, right = blocked or self.blocked()
+        B = len(self)
+
+        reached = np.zeros((B, self.N, self.N), dtype=bool)
+        reached[:, target_rank, :] = True
+        fields = np.full((B, self.N, self.N), UNREACHABLE, dtype=np.int64)
+        fields[reached] = 0
+
+        for step in range(1, self.N * self.N):
+            grown = reached.copy()
+            grown[:, 1:, :] |= reached[:, :-1, :] & ~up[:, 1:, :]
+            grown[:, :-1, :] |= reached[:, 1:, :] & ~down[:, :-1, :]
+            grown[:, :, 1:] |= reached[:, :, :-1] & ~left[:, :, 1:]
+            grown[:, :, :-1] |= reached[:, :, 1:] & ~right[:, :, :-1]
+            new = grown & ~reached
+            if not new.any():
+                break
+            fields[new] = step
+            reached = grown
+
+        return fields
+
+    def distances(self):
+        "(red, blue) arrays of steps to escape"
+        blocked = self.blocked()
+        return (
+            self.stepsToEscape(self.red, 0, blocked),
+            self.stepsToEscape(self.blue, self.N - 1, blocked),
+        )
+
+    def redWon(self):
+        return self.red[:, 0] == 0
+
+    def blueWon(self):
+        return self.blue[:, 0] == self.N - 1
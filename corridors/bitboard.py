@@ -0,0 +1,441 @@
+# coding: utf-8
+"""
+    A second Board backend that keeps everything as integer bitmasks.
+
+    Squares are numbered j * N + i, so a set of squares is a python int with
+    one bit per square.  Walls are stored the same way over the (N-1)x(N-1)
+    grid of wall slots.  For each direction we also keep the set of squares
+    that *cannot* move that way (board edges plus walls), which turns
+    legalMove into a single AND and escapability into a handful of shifts.
+
+    BitBoard has the same __call__/legalCommand/allLegalCommands API as
+    board.Board, and can be converted to and from one.
+"""
+
+import functools
+
+import numpy as np
+
+from .board import Piece, BrokenRule, ruleCheck, perpendicular, boardCommands
+from .movement import EMPTY, HORIZONTAL, VERTICAL
+
+DIRECTIONS = ("up", "right", "down", "left")
+
+
+class Geometry:
+    """
+        Masks that only depend on the board size.
+    """
+
+    def __init__(self, N):
+        M = N - 1
+        self.N = N
+        self.M = M
+        self.all = (1 << (N * N)) - 1
+
+        self.rows = [sum(1 << (j * N + i) for i in range(N)) for j in range(N)]
+        self.columns = [sum(1 << (j * N + i) for j in range(N)) for i in range(N)]
+
+        # squares that can never move in a given direction
+        self.edges = {
+            "up": self.rows[0],
+            "down": self.rows[M],
+            "left": self.columns[0],
+            "right": self.columns[M],
+        }
+
+        # For each wall slot, the squares it blocks in each direction
+        self.hwallEdges = {}
+        self.vwallEdges = {}
+
+        # For each wall slot, the slots that a new wall of the same
+        # orientation would overlap
+        self.hwallNeighbours = {}
+        self.vwallNeighbours = {}
+
+        for j in range(M):
+            for i in range(M):
+                slot = j * M + i
+                a = 1 << (j * N + i)  # top left
+                b = 1 << (j * N + i + 1)  # top right
+                c = 1 << ((j + 1) * N + i)  # bottom left
+                d = 1 << ((j + 1) * N + i + 1)  # bottom right
+
+                self.hwallEdges[slot] = {"down": a | b, "up": c | d}
+                self.vwallEdges[slot] = {"right": a | c, "left": b | d}
+
+                h = 0
+                if i > 0:
+                    h |= 1 << (slot - 1)
+                if i < M - 1:
+                    h |= 1 << (slot + 1)
+                self.hwallNeighbours[slot] = h
+
+                v = 0
+                if j > 0:
+                    v |= 1 << (slot - M)
+                if j < M - 1:
+                    v |= 1 << (slot + M)
+                self.vwallNeighbours[slot] = v
+
+
+@functools.lru_cache()
+def geometry(N):
+    return Geometry(N)
+
+
+def shift(mask, direction, N):
+    if "up" == direction:
+        return mask >> N
+    if "down" == direction:
+        return mask << N
+    if "left" == direction:
+        return mask >> 1
+    return mask << 1
+
+
+def squareIndex(bit):
+    return bit.bit_length() - 1
+
+
+def flood(start, blocked, N, target=0):
+    """
+        Grow the set of squares reachable from `start`.
+
+        Returns (reached, steps), stopping early as soon as any square in
+        `target` has been reached.
+    """
+    reached = start
+    steps = 0
+    while not (reached & target):
+        grown = reached
+        for direction in DIRECTIONS:
+            grown |= shift(reached & ~blocked[direction], direction, N)
+        if grown == reached:
+            break
+        reached = grown
+        steps += 1
+    return reached, steps
+
+
+class BitBoard:
+    def __init__(self, N=9, wallsPerPiece=10):
+        self.N = self.boardSize = N
+        self.wallsPerPiece = wallsPerPiece
+        self.reset()
+
+        # set this to false e.g. in tree searches when we know
+        # we're only applying valid commands
+        self.do_checks = True
+
+    def reset(self):
+        N = self.N
+        M = N - 1
+        g = self.geometry = geometry(N)
+
+        self.blocked = dict(g.edges)
+        self.hwalls = 0
+        self.vwalls = 0
+
+        i = int(N / 2)
+        self.redBit = 1 << (M * N + i)
+        self.blueBit = 1 << i
+        self.redWalls = self.wallsPerPiece
+        self.blueWalls = self.wallsPerPiece
+
+        self.turn = "red"
+
+    @classmethod
+    def fromBoard(cls, board):
+        bitboard = cls(board.N, board.wallsPerPiece)
+        N = bitboard.N
+
+        for (j, i), wall in np.ndenumerate(board.walls):
+            if wall != EMPTY:
+                bitboard._placeWall((j, i), wall)
+
+        bitboard.redBit = 1 << (board.red.location[0] * N + board.red.location[1])
+        bitboard.blueBit = 1 << (board.blue.location[0] * N + board.blue.location[1])
+        bitboard.redWalls = board.red.walls
+        bitboard.blueWalls = board.blue.walls
+        bitboard.turn = board.turn
+        return bitboard
+
+    def toBoard(self):
+        from .board import Board
+
+        board = Board(self.N, self.wallsPerPiece)
+        for location, wall in np.ndenumerate(self.walls):
+            if wall != EMPTY:
+                board.placeWall(location, wall)
+        board.red.location = self.red.location
+        board.blue.location = self.blue.location
+        board.red.walls = self.redWalls
+        board.blue.walls = self.blueWalls
+        board.turn = self.turn
+        board.rehash()
+        return board
+
+    def location(self, bit):
+        return divmod(squareIndex(bit), self.N)
+
+    @property
+    def red(self):
+        return Piece(
+            "red", location=self.location(self.redBit), N=self.N, walls=self.redWalls
+        )
+
+    @property
+    def blue(self):
+        return Piece(
+            "blue", location=self.location(self.blueBit), N=self.N, walls=self.blueWalls
+        )
+
+    @property
+    def walls(self):
+        M = self.N - 1
+        walls = np.full((M, M), EMPTY, dtype=np.int32)
+        for slot in range(M * M):
+            if self.hwalls >> slot & 1:
+                walls[divmod(slot, M)] = HORIZONTAL
+            elif self.vwalls >> slot & 1:
+                walls[divmod(slot, M)] = VERTICAL
+        return walls
+
+    def __json__(self):
+        return self.toBoard().__json__()
+
+    def __repr__(self):
+        return repr(self.toBoard())
+
+    def __eq__(self, other):
+        return all(
+            [
+                (self.N == other.N),
+                (self.hwalls == other.hwalls),
+                (self.vwalls == other.vwalls),
+                (self.redBit == other.redBit),
+                (self.blueBit == other.blueBit),
+                (self.redWalls == other.redWalls),
+                (self.blueWalls == other.blueWalls),
+                (self.turn == other.turn),
+            ]
+        )
+
+    def __deepcopy__(self, memo):
+        board = BitBoard.__new__(BitBoard)
+        board.__dict__.update(self.__dict__)
+        board.blocked = dict(self.blocked)
+        return board
+
+    def gameOver(self):
+        g = self.geometry
+        return bool((self.redBit & g.rows[0]) or (self.blueBit & g.rows[-1]))
+
+    def winner(self):
+        g = self.geometry
+        if self.redBit & g.rows[0]:
+            return "red"
+        if self.blueBit & g.rows[-1]:
+            return "blue"
+
+    def currentPiece(self):
+        return getattr(self, self.turn)
+
+    def info(self):
+        return self.toBoard().info()
+
+    def _pieceBit(self):
+        return self.redBit if self.turn == "red" else self.blueBit
+
+    def _wallsLeft(self):
+        return self.redWalls if self.turn == "red" else self.blueWalls
+
+    def legalMove(self, bit, direction, checkPieces=True):
+        if self.blocked[direction] & bit:
+            return False
+        if checkPieces:
+            if shift(bit, direction, self.N) & (self.redBit | self.blueBit):
+                return False
+        return True
+
+    def legalHop(self, bit, d1, d2):
+        l1 = shift(bit, d1, self.N)
+
+        # square described by l1 MUST contain a piece.
+        if not (l1 & (self.redBit | self.blueBit)):
+            return False
+
+        # must be able to move to l1
+        if not self.legalMove(bit, d1, checkPieces=False):
+            return False
+
+        # if we CAN continue in the same direction, we MUST
+        if self.legalMove(l1, d1):
+            return d2 == d1
+        else:
+            return perpendicular(d1, d2) and self.legalMove(l1, d2)
+
+    def legalWall(self, location, orientation):
+        M = self.N - 1
+        j, i = location
+        assert 0 <= j < M
+        assert 0 <= i < M
+        slot = j * M + i
+        g = self.geometry
+
+        if (self.hwalls | self.vwalls) >> slot & 1:
+            return False
+        if orientation == HORIZONTAL:
+            return not (self.hwalls & g.hwallNeighbours[slot])
+        return not (self.vwalls & g.vwallNeighbours[slot])
+
+    def _wallEdges(self, location, orientation):
+        M = self.N - 1
+        j, i = location
+        slot = j * M + i
+        g = self.geometry
+        return slot, (g.hwallEdges if orientation == HORIZONTAL else g.vwallEdges)[
+            slot
+        ]
+
+    def _canEscape(self, bit, target, blocked):
+        reached, _ = flood(bit, blocked, self.N, target)
+        return bool(reached & target)
+
+    def piecesCanEscape(self, blocked=None):
+        blocked = blocked or self.blocked
+        g = self.geometry
+        return self._canEscape(self.redBit, g.rows[0], blocked) and self._canEscape(
+            self.blueBit, g.rows[-1], blocked
+        )
+
+    def canEscape(self, piece):
+        g = self.geometry
+        bit = self.redBit if piece.color == "red" else self.blueBit
+        target = g.rows[0] if piece.color == "red" else g.rows[-1]
+        return self._canEscape(bit, target, self.blocked)
+
+    def escapableWall(self, location, orientation):
+        "blocked masks are ints, so we test a modified copy rather than the board"
+        _, edges = self._wallEdges(location, orientation)
+        blocked = dict(self.blocked)
+        for direction, mask in edges.items():
+            blocked[direction] |= mask
+        return self.piecesCanEscape(blocked)
+
+    def stepsToEscape(self, piece):
+        "flood backwards from the goal row until we hit the piece"
+        g = self.geometry
+        bit = self.redBit if piece.color == "red" else self.blueBit
+        start = g.rows[0] if piece.color == "red" else g.rows[-1]
+        reached, steps = flood(start, self.blocked, self.N, bit)
+        assert reached & bit, "no way out"
+        return steps
+
+    def _placeWall(self, location, orientation):
+        slot, edges = self._wallEdges(location, orientation)
+        if orientation == HORIZONTAL:
+            self.hwalls |= 1 << slot
+        else:
+            self.vwalls |= 1 << slot
+        for direction, mask in edges.items():
+            self.blocked[direction] |= mask
+
+    def _addWall(self, location, orientation):
+        assert len(location) == 2
+        location = tuple(location)  # in case it's a list
+
+        assert not self.gameOver(), "Game over, dude!"
+        assert orientation in (HORIZONTAL, VERTICAL)
+
+        if self.do_checks:
+            ruleCheck(self._wallsLeft() > 0, "No walls left")
+            ruleCheck(
+                self.legalWall(location, orientation),
+                "illegal wall at {}: {}".format(location, orientation),
+            )
+            ruleCheck(
+                self.escapableWall(location, orientation),
+                "trapping wall at {}: {}".format(location, orientation),
+            )
+
+        self._placeWall(location, orientation)
+        if self.turn == "red":
+            self.redWalls -= 1
+        else:
+            self.blueWalls -= 1
+
+    def _hwall(self, location):
+        self._addWall(location, HORIZONTAL)
+
+    def _vwall(self, location):
+        self._addWall(location, VERTICAL)
+
+    def _setPieceBit(self, bit):
+        if self.turn == "red":
+            self.redBit = bit
+        else:
+            self.blueBit = bit
+
+    def _hop(self, d1, d2):
+        assert not self.gameOver(), "Game over, dude!"
+        bit = self._pieceBit()
+
+        if self.do_checks:
+            ruleCheck(
+                self.legalHop(bit, d1, d2),
+                "illegal hop for {}: {} {}".format(self.turn, d1, d2),
+            )
+        self._setPieceBit(shift(shift(bit, d1, self.N), d2, self.N))
+
+    def _move(self, direction):
+        assert not self.gameOver(), "Game over, dude!"
+        bit = self._pieceBit()
+
+        if self.do_checks:
+            ruleCheck(
+                self.legalMove(bit, direction),
+                "illegal move for {}: {}".format(self.turn, direction),
+            )
+        self._setPieceBit(shift(bit, direction, self.N))
+
+    def _endTurn(self):
+        self.turn = "red" if self.turn == "blue" else "blue"
+
+    def legalCommand(self, command):
+        if self.gameOver():
+            return False
+        action = command[0]
+
+        if "hop" == action:
+            return self.legalHop(self._pieceBit(), *command[1:])
+        if "move" == action:
+            return self.legalMove(self._pieceBit(), *command[1:])
+        if action in ("vwall", "hwall"):
+            orientation = HORIZONTAL if action == "hwall" else VERTICAL
+            location = tuple(command[1])
+            assert len(location) == 2
+            return (
+                self._wallsLeft() > 0
+                and self.legalWall(location, orientation)
+                and self.escapableWall(location, orientation)
+            )
+        return False
+
+    def __call__(self, *command):
+        action = command[0]
+
+        if self.do_checks:
+            assert action in ("move", "hwall", "vwall", "hop"), action
+            if not self.legalCommand(command):
+                raise BrokenRule("Illegal command: {}".format(command))
+
+        fn = getattr(self, "_" + action)
+        fn(*command[1:])
+        self._endTurn()
+
+    def allLegalCommands(self):
+        return (
+            command for command in boardCommands(self.N) if self.legalCommand(command)
+        )
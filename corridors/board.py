@@ -3,13 +3,18 @@
 import numpy as np
 import attr
 
+import copy
 import functools
+import itertools
 
 from attr.validators import instance_of
 
 from . import movement
+from . import zobrist
 from .movement import canEscape
-from .movement import EMPTY, HORIZONTAL, VERTICAL
+from .movement import EMPTY, HORIZONTAL, VERTICAL, UNREACHABLE
+from .movement import FREE, TRAPPING, orientationIndex
+from .movement import UP, DOWN, LEFT, RIGHT
 
 
 def defaultDrawnGrid(N):
@@ -44,6 +49,11 @@ class Piece:
         return {"color": self.color, "location": self.location, "walls": self.walls}
 
 
+@attr.s(frozen=True)
+class FrozenPiece(Piece):
+    "A piece in a Snapshot; can be shared, because it can't be moved"
+
+
 def locationFromDirection(location, direction):
 
     j, i = location
@@ -57,6 +67,9 @@ def locationFromDirection(location, direction):
         return j, i + 1
 
 
+DIRECTION_BITS = {"up": UP, "down": DOWN, "left": LEFT, "right": RIGHT}
+
+
 def hopTarget(location, d1, d2):
     location = locationFromDirection(location, d1)
     location = locationFromDirection(location, d2)
@@ -109,20 +122,69 @@ def wallCommands(boardSize):
     ]
 
 
+def slotIndex(command):
+    "(orientation index, j, i) of a wall command's slot"
+    j, i = command[1]
+    return (0 if command[0] == "hwall" else 1, j, i)
+
+
+# every position a board passes through gets a fresh version number
+_versions = itertools.count()
+
+
 @functools.lru_cache()
 def boardCommands(boardSize):
     return MOVE_COMMANDS + HOP_COMMANDS + wallCommands(boardSize)
 
 
+@functools.lru_cache()
+def emptySquares(boardSize):
+    return movement.emptySquares(boardSize)
+
+
+@functools.lru_cache()
+def emptyDistances(boardSize):
+    "Distance fields are read-only, so every new board can share these"
+    N = boardSize
+    squares = emptySquares(N)
+    return {
+        "red": movement.distanceField(squares, N, 0),
+        "blue": movement.distanceField(squares, N, N - 1),
+    }
+
+
+@functools.lru_cache()
+def emptyAvailable(boardSize):
+    M = boardSize - 1
+    return movement.availableWalls(np.full((M, M), EMPTY, dtype=np.int32))
+
+
 class Board:
-    def __init__(self):
+    # Everything that is derived from, or cached for, the current position.
+    # These are all treated as immutable, so push/pop and copies just
+    # save and restore references.
+    DERIVED = (
+        "squares",
+        "distances",
+        "available",
+        "_key",
+        "_wallKey",
+        "_mirrorKey",
+        "_mirrorWallKey",
+        "_version",
+        "_legalCommands",
+        "_wallStatus",
+        "_snapshot",
+    )
+
+    def __init__(self, N=9, wallsPerPiece=10):
         """
             The wall grid is the grid of intersections of the wall slots, so is 8x8.
             The movement grid is the grid of squares, so 9x9
             (Assuming standard size board)
         """
-        self.N = self.boardSize = 9
-        self.wallsPerPiece = 10
+        self.N = self.boardSize = N
+        self.wallsPerPiece = wallsPerPiece
         self.reset()
 
         # set this to false e.g. in tree searches when we know
@@ -140,6 +202,64 @@ class Board:
         self.turn = "red"
         # self.history    = []
 
+        # blocked directions for each square, as in the C++ Board
+        self.squares = emptySquares(N)
+        # steps from every square to each piece's goal row, kept up to date
+        # as walls are placed
+        self.distances = emptyDistances(N)
+        # slots where a wall would physically fit
+        self.available = emptyAvailable(N)
+        self._undo = []
+        self.rehash()
+        self._invalidate()
+
+    def rehash(self):
+        """
+            Recompute the Zobrist key from scratch.  The key is otherwise
+            updated incrementally, so call this after setting pieces, wall
+            counts or the turn by hand.
+        """
+        self._key = zobrist.key(self)
+        self._wallKey = zobrist.wallKey(self.walls)
+        self._mirrorKey = zobrist.key(self, mirror=True)
+        self._mirrorWallKey = zobrist.mirrorWallKey(self.walls)
+
+    def key(self):
+        "64 bit Zobrist key of the position"
+        return self._key
+
+    def canonicalKey(self):
+        """
+            The same key for a position and its left-right mirror image,
+            for tables that only want to store one of them
+        """
+        return min(self._key, self._mirrorKey)
+
+    def isCanonical(self):
+        """
+            Whether this is the orientation that canonicalKey() stands for.
+            Moves stored under the canonical key of a board that isn't have
+            to be mirrored, see symmetry.mirrorCommand.
+        """
+        return self._key <= self._mirrorKey
+
+    def __hash__(self):
+        return self._key
+
+    def _invalidate(self):
+        "Called whenever the position changes"
+        self._version = next(_versions)
+        self._legalCommands = None
+        self._wallStatus = None
+        self._snapshot = None
+
+    def _derived(self):
+        return tuple(getattr(self, name) for name in Board.DERIVED)
+
+    def _restore(self, derived):
+        for name, value in zip(Board.DERIVED, derived):
+            setattr(self, name, value)
+
     def __json__(self):
         return {
             "red": self.red,
@@ -151,27 +271,68 @@ class Board:
         }
 
     def __eq__(self, other):
+        # Different keys always mean different positions.  Equal keys
+        # almost always mean equal positions, but we check in full in case
+        # of a collision.
+        if self.key() != other.key():
+            return False
         return all(
             [
                 (self.N == other.N),
                 (self.walls == other.walls).all(),
-                (self.red == other.red),
-                (self.blue == other.blue),
+                (attr.astuple(self.red) == attr.astuple(other.red)),
+                (attr.astuple(self.blue) == attr.astuple(other.blue)),
                 (self.turn == other.turn),
             ]
         )
 
     def __deepcopy__(self, memo):
+        # the walls are copied straight away, so neither board's walls are
+        # left read-only; everything else is immutable, so is shared
+        board = self._clone(self.walls.copy())
+        board.do_checks = self.do_checks
+        board._undo = list(self._undo)
+        return board
 
-        board = Board()
-        board.walls = self.walls.copy()
-        board.red.location = self.red.location
-        board.blue.location = self.blue.location
-        board.red.walls = self.red.walls
-        board.blue.walls = self.blue.walls
+    def _clone(self, walls):
+        "A Board for this position on `walls`, without building one from scratch"
+        board = Board.__new__(Board)
+        board.N = board.boardSize = self.N
+        board.wallsPerPiece = self.wallsPerPiece
+        board.walls = walls
+        board.red = Piece(*attr.astuple(self.red, recurse=False))
+        board.blue = Piece(*attr.astuple(self.blue, recurse=False))
         board.turn = self.turn
+        board._restore(tuple(getattr(self, name) for name in Board.DERIVED))
+        board._undo = []
+        board.do_checks = True
         return board
 
+    def snapshot(self):
+        """
+            An immutable copy of the current position, which can be read
+            from other threads while this board carries on changing.
+
+            Cheap: the walls array is shared with the snapshot, so is made
+            read-only, and this board copies it the next time it places or
+            removes a wall.  Until then, writing to board.walls directly
+            raises ValueError; go through placeWall, or copy.deepcopy the
+            board, whose copy has walls of its own.
+        """
+        if self._snapshot is None:
+            self.walls.flags.writeable = False
+            self._snapshot = Snapshot(self)
+        return self._snapshot
+
+    def thaw(self):
+        "A mutable copy"
+        return copy.deepcopy(self)
+
+    def _ownWalls(self):
+        "Copy the walls before writing to them if they're shared with a snapshot"
+        if not self.walls.flags.writeable:
+            self.walls = self.walls.copy()
+
     def gameOver(self):
         return self.red.hasWon() or self.blue.hasWon()
 
@@ -220,22 +381,12 @@ class Board:
     def legalMove(self, location, direction, checkPieces=True):
 
         j, i = location
-        N = self.N
-        M = N - 1
 
         assert direction in ("up", "down", "left", "right")
 
-        # check edges first
-        if (j == 0) and (direction == "up"):
-            return False
-        if (j >= M) and (direction == "down"):
-            return False
-        if (i == 0) and (direction == "left"):
+        # edges and walls
+        if self.squares[j][i] & DIRECTION_BITS[direction]:
             return False
-        if (i >= M) and (direction == "right"):
-            return False
-
-        # check piece location
 
         # we DON'T want to to do this check when testing escapability!
         if checkPieces:
@@ -243,39 +394,6 @@ class Board:
             if self.red.location == target or self.blue.location == target:
                 return False
 
-        # Check Walls
-        if "up" == direction:
-            if i > 0:
-                if self.walls[(j - 1, i - 1)] == HORIZONTAL:
-                    return False
-            if i < M:
-                if self.walls[(j - 1, i)] == HORIZONTAL:
-                    return False
-
-        if "left" == direction:
-            if j > 0:
-                if self.walls[(j - 1, i - 1)] == VERTICAL:
-                    return False
-            if j < M:
-                if self.walls[(j, i - 1)] == VERTICAL:
-                    return False
-
-        if "right" == direction:
-            if j > 0:
-                if self.walls[(j - 1, i)] == VERTICAL:
-                    return False
-            if j < M:
-                if self.walls[(j, i)] == VERTICAL:
-                    return False
-
-        if "down" == direction:
-            if i > 0:
-                if self.walls[(j, i - 1)] == HORIZONTAL:
-                    return False
-            if i < M:
-                if self.walls[(j, i)] == HORIZONTAL:
-                    return False
-
         return True
 
     def canEscape(self, piece):
@@ -286,21 +404,74 @@ class Board:
 
     def legalWall(self, location, orientation):
         j, i = location
-        return movement.legalWall(self.walls, j, i, orientation)
+        return movement.legalWall(self.available, j, i, orientation)
+
+    def wallStatus(self):
+        """
+            FREE/OCCUPIED/TRAPPING for every wall slot, indexed
+            [orientationIndex(orientation), j, i].  Worked out for all slots
+            at once the first time it's needed for a position.
+        """
+        if self._wallStatus is None:
+            self._wallStatus = movement.classifyWalls(
+                self.squares, self.available, (self.red, self.blue), self.distances
+            )
+        return self._wallStatus
+
+    def stepsToEscape(self, piece):
+        steps = self.distances[piece.color][piece.location]
+        assert steps != UNREACHABLE, "no way out"
+        return int(steps)
+
+    def _placeWall(self, location, orientation):
+        "Update the walls and everything derived from them"
+        j, i = location
+        self._ownWalls()
+        self.walls[location] = orientation
+        t = zobrist.table(self.N)
+        wallKey = t.wall(location, orientation)
+        self._key ^= wallKey
+        self._wallKey ^= wallKey
+        mirrorKey = t.mirrorWall(location, orientation)
+        self._mirrorKey ^= mirrorKey
+        self._mirrorWallKey ^= mirrorKey
+        self.squares = movement.applyWall(self.squares, j, i, orientation)
+
+        # The same wall set turns up all over a search tree, and so does its
+        # mirror image.  Fields are cached for whichever has the smaller key.
+        mirrored = self._mirrorWallKey < self._wallKey
+        cacheKey = (self.N, min(self._wallKey, self._mirrorWallKey))
+        distances = movement.distanceCache.get(cacheKey)
+        if distances is None:
+            distances = {
+                color: movement.repairDistanceField(
+                    field, self.squares, self.N, j, i, orientation
+                )
+                for color, field in self.distances.items()
+            }
+            movement.distanceCache.put(
+                cacheKey, movement.mirrorFields(distances) if mirrored else distances
+            )
+        elif mirrored:
+            distances = movement.mirrorFields(distances)
+        self.distances = distances
+        self.available = movement.placeAvailable(self.available, j, i, orientation)
+
+    def placeWall(self, location, orientation):
+        """
+            For manually constructing a board; doesn't check anything
+            or decrement wall count
+        """
+        self._placeWall(tuple(location), orientation)
+        self._invalidate()
 
     def escapableWall(self, location, orientation):
-        "put it on, test, take it off!"
         assert orientation in (HORIZONTAL, VERTICAL), orientation
         j, i = location
         M = self.N - 1
-        walls = self.walls
         assert 0 <= j < M
         assert 0 <= i < M
-
-        walls[location] = orientation
-        escapable = self.piecesCanEscape()
-        walls[location] = 0
-        return escapable
+        return self.wallStatus()[orientationIndex(orientation), j, i] != TRAPPING
 
     def _addWall(self, location, orientation):
         assert len(location) == 2
@@ -323,7 +494,11 @@ class Board:
                 "trapping wall at {}: {}".format(location, orientation),
             )
 
-        self.walls[location] = orientation
+        self._placeWall(location, orientation)
+        wallsLeft = zobrist.table(self.N).wallsLeft[color]
+        change = wallsLeft[piece.walls] ^ wallsLeft[piece.walls - 1]
+        self._key ^= change
+        self._mirrorKey ^= change
         piece.walls -= 1
 
     def _hwall(self, location):
@@ -347,8 +522,7 @@ class Board:
                 "illegal hop for {}: {} {}".format(color, d1, d2),
             )
         # if it's legal...
-        piece.location = locationFromDirection(piece.location, d1)
-        piece.location = locationFromDirection(piece.location, d2)
+        self._movePiece(piece, hopTarget(piece.location, d1, d2))
 
     def _move(self, direction):
         assert not self.gameOver(), "Game over, dude!"
@@ -363,10 +537,23 @@ class Board:
                 "illegal move for {}: {}".format(color, direction),
             )
 
-        piece.location = locationFromDirection(piece.location, direction)
+        self._movePiece(piece, locationFromDirection(piece.location, direction))
+
+    def _movePiece(self, piece, location):
+        t = zobrist.table(self.N)
+        self._key ^= t.piece(piece.color, piece.location) ^ t.piece(
+            piece.color, location
+        )
+        self._mirrorKey ^= t.mirrorPiece(piece.color, piece.location) ^ t.mirrorPiece(
+            piece.color, location
+        )
+        piece.location = location
 
     def _endTurn(self):
         self.turn = "red" if self.turn == "blue" else "blue"
+        blueToMove = zobrist.table(self.N).blueToMove
+        self._key ^= blueToMove
+        self._mirrorKey ^= blueToMove
 
     def currentPiece(self):
         return getattr(self, self.turn)
@@ -387,11 +574,10 @@ class Board:
             # messy, we should fix
             location = command[1]
             assert len(location) == 2
-            location = tuple(location)  # in case it's a list
+            j, i = location
             return (
                 piece.walls > 0
-                and self.legalWall(location, orientation)
-                and self.escapableWall(location, orientation)
+                and self.wallStatus()[orientationIndex(orientation), j, i] == FREE
             )
         return False
 
@@ -408,6 +594,32 @@ class Board:
         fn = getattr(self, "_" + action)
         fn(*command[1:])
         self._endTurn()
+        self._invalidate()
+
+    def push(self, command):
+        """
+            Apply a command in place, remembering enough to take it back
+            with pop().  Tree searches should use this rather than copying
+            the board for every child.
+        """
+        piece = self.currentPiece()
+        undo = (command, piece.location, piece.walls, self._derived())
+        self(*command)
+        self._undo.append(undo)
+
+    def pop(self):
+        "Undo the last pushed command, and return it"
+        command, location, walls, derived = self._undo.pop()
+
+        self._endTurn()
+        piece = self.currentPiece()
+        piece.location = location
+        piece.walls = walls
+        if command[0] in ("hwall", "vwall"):
+            self._ownWalls()
+            self.walls[tuple(command[1])] = EMPTY
+        self._restore(derived)
+        return command
 
     def __repr__(self):
 
@@ -435,15 +647,143 @@ class Board:
             + "\n\n"
         )
 
-    def allLegalCommands(self):
+    def pieceCommands(self):
+        "Legal moves and hops for the current piece; cheap to compute"
+        return (
+            command
+            for command in MOVE_COMMANDS + HOP_COMMANDS
+            if self.legalCommand(command)
+        )
+
+    def wallCommands(self, selective=False):
         """
-            I suspect if _this_ was a generator, 
-            then we could get some awesome early-termination speedups in a 
-            pruning tree search.  I.e. if we aborted early, we wouldn't have to 
-            even check the legality of later commands 
-            
-            This should be set/cached every time we make a move.
+            Legal walls for the current piece, checked lazily, since every
+            candidate costs an escapability search.
+
+            If `selective`, only walls that could slow the other piece down
+            or that are right next to a piece; see movement.selectiveWalls.
         """
-        return (
-            command for command in boardCommands(self.N) if self.legalCommand(command)
+        piece = self.currentPiece()
+        if piece.walls <= 0:
+            return
+        commands = wallCommands(self.N)
+        if selective:
+            other = self.blue if piece is self.red else self.red
+            slots = movement.selectiveWalls(
+                self.squares, self.distances, (self.red, self.blue), other
+            )
+            commands = [c for c in commands if slotIndex(c) in slots]
+        for command in commands:
+            if self.legalCommand(command):
+                yield command
+
+    def _generateLegalCommands(self):
+        version = self._version
+        commands = []
+        for stage in (self.pieceCommands(), self.wallCommands()):
+            for command in stage:
+                commands.append(command)
+                yield command
+
+        # only cache if we ran to completion on an unchanged position
+        if version == self._version:
+            self._legalCommands = commands
+
+    def allLegalCommands(self, selective=False):
+        """
+            Pawn moves come first and walls are checked lazily, so a pruning
+            tree search that stops early never pays for the escapability
+            checks of the walls it didn't look at.
+
+            Once the generator has been exhausted the full list is cached
+            until the next command is applied.
+
+            `selective` leaves out the walls that can't change the race
+            (see wallCommands), which is what a tree search wants, but is
+            no good for deciding what a player may do.
+        """
+        if self.gameOver():
+            return iter(())
+        if selective:
+            # a piece that can't move still has to be able to do something
+            pieceCommands = list(self.pieceCommands())
+            if pieceCommands:
+                return itertools.chain(pieceCommands, self.wallCommands(True))
+        if self._legalCommands is not None:
+            return iter(self._legalCommands)
+        return self._generateLegalCommands()
+
+
+class Snapshot:
+    """
+        An immutable position, taken with Board.snapshot().
+
+        Has the read-only part of the Board API, so can be handed to bots,
+        renderers and JSON encoders in other threads without locking.  The
+        walls array is read-only and shared with the board it came from
+        (and any other snapshot of the same position); the pieces are
+        frozen; squares, distances and so on are immutable anyway, so are
+        shared too.  Use thaw() to get a Board to play on.
+    """
+
+    def __init__(self, board):
+        fields = dict(zip(Board.DERIVED, board._derived()))
+        fields.update(
+            N=board.N,
+            boardSize=board.N,
+            wallsPerPiece=board.wallsPerPiece,
+            walls=board.walls,
+            red=FrozenPiece(*attr.astuple(board.red, recurse=False)),
+            blue=FrozenPiece(*attr.astuple(board.blue, recurse=False)),
+            turn=board.turn,
         )
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        # the lazily filled caches are the only thing that can change, and
+        # they always get the same value whichever thread fills them
+        if name not in ("_legalCommands", "_wallStatus"):
+            raise AttributeError("Snapshots are immutable")
+        object.__setattr__(self, name, value)
+
+    def __deepcopy__(self, memo):
+        # copies are for changing, so bots that copy the board they're
+        # given work just the same when handed a snapshot
+        return self.thaw()
+
+    def snapshot(self):
+        return self
+
+    def thaw(self):
+        """
+            A mutable Board for this position, sharing the read-only walls
+            until it places or removes one (see Board.snapshot)
+        """
+        return Board._clone(self, self.walls)
+
+    # everything that only reads the position
+    key = Board.key
+    canonicalKey = Board.canonicalKey
+    isCanonical = Board.isCanonical
+    __hash__ = Board.__hash__
+    __eq__ = Board.__eq__
+    __json__ = Board.__json__
+    __repr__ = Board.__repr__
+    info = Board.info
+    gameOver = Board.gameOver
+    winner = Board.winner
+    currentPiece = Board.currentPiece
+    legalHop = Board.legalHop
+    legalMove = Board.legalMove
+    legalWall = Board.legalWall
+    canEscape = Board.canEscape
+    piecesCanEscape = Board.piecesCanEscape
+    wallStatus = Board.wallStatus
+    escapableWall = Board.escapableWall
+    stepsToEscape = Board.stepsToEscape
+    legalCommand = Board.legalCommand
+    pieceCommands = Board.pieceCommands
+    wallCommands = Board.wallCommands
+    _generateLegalCommands = Board._generateLegalCommands
+    allLegalCommands = Board.allLegalCommands
@@ -3,21 +3,26 @@ import datetime
 import logging
 import copy
 import math
+
+import numpy as np
+
 from .utilities import timed
 from .movement import stepsToEscape
+from .batch import Positions
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+from .symmetry import mirrorCommand
 
 now = datetime.datetime.now
 INFINITY = float("inf")
 
 
-def apply_command(board, command):
+def search_copy(board):
     """
-        assumes command is legal
+        One private copy per search, which is then walked with push/pop,
+        so the board we were handed is never touched.
     """
     clone = copy.deepcopy(board)
     clone.do_checks = False
-    clone(*command)
-
     return clone
 
 
@@ -43,13 +48,25 @@ class BaseBot:
             return -INFINITY
         return 0
 
+    def evaluate_batch(self, board, commands):
+        """
+            Scores for the positions reached by each of `commands`.
+            Bots with a vectorized evaluation should override this.
+        """
+        board = search_copy(board)
+        scores = []
+        for command in commands:
+            board.push(command)
+            scores.append(self.evaluate(board))
+            board.pop()
+        return scores
+
     def __call__(self, board):
         """
             Must return a legal command
         """
         commands = list(board.allLegalCommands())
-        positions = [apply_command(board, command) for command in commands]
-        scores = [self.evaluate(position) for position in positions]
+        scores = self.evaluate_batch(board, commands)
 
         commandScores = list(zip(commands, scores))
         commandScores.sort(key=lambda p: p[1])
@@ -102,6 +119,14 @@ class StepsBot(BaseBot):
         blueDistance = stepsToEscape(board, board.blue)
         return blueDistance - redDistance
 
+    def evaluate_batch(self, board, commands):
+        positions = Positions.children(board, commands)
+        red, blue = positions.distances()
+        scores = (blue - red).astype(float)
+        scores[positions.redWon()] = INFINITY
+        scores[positions.blueWon()] = -INFINITY
+        return scores.tolist()
+
 
 class StepsBot2(BaseBot):
     def evaluate(self, board):
@@ -116,6 +141,16 @@ class StepsBot2(BaseBot):
         b = 0.5 + stepsToEscape(board, board.blue)
         return b / r - 1 if r < b else 1 - (r / b)
 
+    def evaluate_batch(self, board, commands):
+        positions = Positions.children(board, commands)
+        red, blue = positions.distances()
+        r = 0.5 + red
+        b = 0.5 + blue
+        scores = np.where(r < b, b / r - 1, 1 - (r / b))
+        scores[positions.redWon()] = INFINITY
+        scores[positions.blueWon()] = -INFINITY
+        return scores.tolist()
+
 
 class StepsBot3(BaseBot):
     def evaluate(self, board):
@@ -142,6 +177,18 @@ class StepsBot3(BaseBot):
             + WEIGHT * wallScore
         )
 
+    def evaluate_batch(self, board, commands):
+        WEIGHT = 0.1
+
+        positions = Positions.children(board, commands)
+        red, blue = positions.distances()
+        blue = blue + positions.redToPlay
+        red = red + ~positions.redToPlay
+
+        wallScore = np.log(1 + positions.redWalls) - np.log(1 + positions.blueWalls)
+        scores = np.log(1 + blue) - np.log(1 + red) + WEIGHT * wallScore
+        return scores.tolist()
+
 
 class DumbBot(BaseBot):
     def evaluate(self, board):
@@ -151,7 +198,7 @@ class DumbBot(BaseBot):
             return -INFINITY
 
         red_distance = board.red.location[0] - 0
-        blue_distance = 8 - board.blue.location[0]
+        blue_distance = board.N - 1 - board.blue.location[0]
 
         return blue_distance - red_distance
 
@@ -159,70 +206,136 @@ class DumbBot(BaseBot):
 class AlphaBetaBot(BaseBot):
     """
         This has been entirely re-written in C++, which is WAY faster.
-        
+
+        Searches with iterative deepening up to maxDepth, keeping a
+        transposition table between calls.  Each iteration's best moves are
+        tried first by the next, which is what makes the deeper searches
+        affordable.
+
+        With `selective` it only searches the walls that could change the
+        race (see Board.allLegalCommands), a fraction of them all.
     """
 
     MAX_AB_CALLS = 10000
 
-    def __init__(self, evalBot, maxDepth=1):
+    def __init__(self, evalBot, maxDepth=3, tableBits=16, selective=True):
         self.maxDepth = maxDepth
+        self.selective = selective
         self.evalBot = evalBot
+        self.table = TranspositionTable(tableBits)
 
     def __str__(self):
 
         eval_bot_name = str(self.evalBot)
         return f"AlphaBetaBot<{eval_bot_name}>"
 
+    def orderedCommands(self, board, depth, first):
+        """
+            All legal commands, starting with `first` (the table's best move).
+
+            Above the frontier the rest are sorted by a batch static
+            evaluation, best for the side to move first.  Just above the
+            leaves that would cost as much as searching them, so they're
+            generated lazily instead.
+        """
+        if first is not None and board.legalCommand(first):
+            yield first
+
+        commands = board.allLegalCommands(self.selective)
+        if depth > 1:
+            ranked = list(commands)
+            scores = self.evalBot.evaluate_batch(board, ranked)
+            order = sorted(
+                range(len(ranked)),
+                key=scores.__getitem__,
+                reverse=(board.turn == "red"),
+            )
+            commands = [ranked[k] for k in order]
+
+        for command in commands:
+            if command != first:
+                yield command
+
+    def _probe(self, board, depth, α, β):
+        """
+            Looks the position up in the table.  Returns a score if the entry
+            settles it, None if not; the entry's move, mirrored back if this
+            is the mirror image of the position stored; and the window the
+            entry narrows (α, β) to.
+        """
+        # a position and its mirror image share an entry, which holds the
+        # best move for the canonical one
+        entry = self.table.get(board.canonicalKey())
+        if entry is None:
+            return None, None, α, β
+        move = entry.move
+        if move is not None and not board.isCanonical():
+            move = mirrorCommand(move, board.N)
+        if entry.depth < depth:
+            return None, move, α, β
+        if entry.flag == EXACT:
+            return entry.score, move, α, β
+        if entry.flag == LOWER:
+            α = max(α, entry.score)
+        else:
+            β = min(β, entry.score)
+        return (entry.score if β <= α else None), move, α, β
+
+    def _store(self, board, depth, α, β, v, command):
+        "Stores a search of the window (α, β) that came to v, like _probe reads it"
+        if v <= α:
+            flag = UPPER
+        elif v >= β:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if command is not None and not board.isCanonical():
+            command = mirrorCommand(command, board.N)
+        self.table.store(board.canonicalKey(), depth, flag, v, command)
+
     def alphabeta(self, board, depth, α, β):
 
-        if depth == 0:
+        if depth == 0 or board.gameOver():
             return self.evalBot.evaluate(board), None
 
-        if board.gameOver():
-            return self.evalBot.evaluate(board), None
+        score, move, α, β = self._probe(board, depth, α, β)
+        if score is not None:
+            return score, move
 
         self.ab_calls += 1
-
-        commands = list(board.allLegalCommands())
-
-        if board.turn == "red":
-            v = -INFINITY
-            best_command = commands[0]
-            for command in commands:
-                child = apply_command(board, command)
-                score, _ = self.alphabeta(child, depth - 1, α, β)
-
-                if score > v:
-                    v = score
-                    best_command = command
-                # v = max(v, score)  # which command gives us this?
+        α0, β0 = α, β
+
+        # red maximizes and blue minimizes, so compare sign * score
+        red = board.turn == "red"
+        sign = 1 if red else -1
+        v = -sign * INFINITY
+        best_command = None
+
+        # lazy, so a cutoff skips the legality checks of the remaining walls
+        for command in self.orderedCommands(board, depth, move):
+            board.push(command)
+            score, _ = self.alphabeta(board, depth - 1, α, β)
+            board.pop()
+
+            if sign * score > sign * v or best_command is None:
+                v = score
+                best_command = command
+            if red:
                 α = max(α, v)
-                if β <= α:
-                    break
+            else:
+                β = min(β, v)
+            if β <= α:
+                break
 
-                if self.ab_calls >= AlphaBetaBot.MAX_AB_CALLS:
-                    logging.warning("max ab calls")
-                    break
+            if self.ab_calls >= AlphaBetaBot.MAX_AB_CALLS:
+                self.aborted = True
+                break
 
-            return v, best_command
-        else:  # blue
-            v = +INFINITY
-            best_command = commands[0]
-            for command in commands:
-                child = apply_command(board, command)
-                score, _ = self.alphabeta(child, depth - 1, α, β)
-
-                if score < v:
-                    v = score
-                    best_command = command
-                # v = min(v, score)
-                β = min(β, v)
-                if β <= α:
-                    break
-                if self.ab_calls >= AlphaBetaBot.MAX_AB_CALLS:
-                    logging.warning("max ab calls")
-                    break
-            return v, best_command
+        # an aborted search's scores can't be trusted
+        if not self.aborted:
+            self._store(board, depth, α0, β0, v, best_command)
+
+        return v, best_command
 
     def evaluate(self, board):
         assert 0
@@ -230,12 +343,23 @@ class AlphaBetaBot(BaseBot):
     def __call__(self, board):
 
         self.ab_calls = 0
-        maxDepth = 3
+        self.aborted = False
+        self.table.newSearch()
+        board = search_copy(board)
 
-        logging.info(f"{self}.__call__(), maxDepth:{maxDepth}")
+        logging.info(f"{self}.__call__(), maxDepth:{self.maxDepth}")
         with timed():
-            score, command = self.alphabeta(board, maxDepth, -INFINITY, INFINITY)
+            for depth in range(1, self.maxDepth + 1):
+                score, best = self.alphabeta(board, depth, -INFINITY, INFINITY)
+                if self.aborted:
+                    if depth == 1:
+                        command = best
+                    logging.warning("max ab calls")
+                    break
+                command = best
 
-        logging.info(f"score:{score}, command: {command}, ab_calls: {self.ab_calls}")
+        logging.info(
+            f"score:{score}, command: {command}, depth: {depth}, ab_calls: {self.ab_calls}"
+        )
 
         return command
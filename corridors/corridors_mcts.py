@@ -1,4 +1,4 @@
-from ._corridors_mcts import _corridors_mcts
+from ._corridors_mcts import _corridors_mcts, BOARD_SIZE
 from math import sqrt
 import numpy as np
 import logging
@@ -6,11 +6,11 @@ import logging
 def python_to_c_format(board):
     assert hasattr(board,"N"), "Board must have attribute 'N'"
     assert isinstance(board.N,int), "N must be an integer"
-    assert board.N==9, "Board must be 9x9"
+    assert board.N==BOARD_SIZE, f"Board must be {BOARD_SIZE}x{BOARD_SIZE}, the size _corridors_mcts was built for"
     assert hasattr(board,'walls'), "Board must have walls attribute"
     # board has a member 'walls', a 2d numpy array
     assert isinstance(board.walls,np.ndarray), "board.walls must be numpy array"
-    assert board.walls.shape==(8,8), "board.walls must be 8x8 grid"
+    assert board.walls.shape==(board.N-1,board.N-1), "board.walls must be (N-1)x(N-1) grid"
     
     for w in board.walls.flatten():
         assert w in (0,-1,1), "each wall must be either -1 (vertical), +1 (horizontal), or zero (nonexistant)"
@@ -33,10 +33,10 @@ def python_to_c_format(board):
     assert isinstance(board.blue.location,tuple), "blue piece must have a location"
     assert len(board.blue.location)==2
     
-    assert 0 <=board.red.location[0] <=8, "red Y coordinate must be between 0 and 8"
-    assert 0 <=board.red.location[1] <=8, "red X coordinate must be between 0 and 8"
-    assert 0 <=board.blue.location[0] <=8, "blue Y coordinate must be between 0 and 8"
-    assert 0 <=board.blue.location[1] <=8 , "blue X coordinate must be between 0 and 8"
+    assert 0 <=board.red.location[0] <board.N, "red Y coordinate must be between 0 and N-1"
+    assert 0 <=board.red.location[1] <board.N, "red X coordinate must be between 0 and N-1"
+    assert 0 <=board.blue.location[0] <board.N, "blue Y coordinate must be between 0 and N-1"
+    assert 0 <=board.blue.location[1] <board.N , "blue X coordinate must be between 0 and N-1"
 
     assert board.turn=='blue', "Error: must be blue's turn. Currently assumes AI is only needed to make decisions for blue"
     c_format_board={
@@ -48,25 +48,25 @@ def python_to_c_format(board):
         'villain_walls_remaining':board.blue.walls,
         'flip': False if board.turn=='red' else True
     }
-    BOARD_SIZE = board.N
+    N = board.N
 
-    wall_middles = [False for _ in range((BOARD_SIZE-1)*(BOARD_SIZE-1))]
-    horizontal_walls = [False for _ in range((BOARD_SIZE-1)*BOARD_SIZE)]
-    vertical_walls = [False for _ in range((BOARD_SIZE-1)*BOARD_SIZE)]
+    wall_middles = [False for _ in range((N-1)*(N-1))]
+    horizontal_walls = [False for _ in range((N-1)*N)]
+    vertical_walls = [False for _ in range((N-1)*N)]
 
     # loop over all wall middles and set flags where appropriate
-    for x in range(BOARD_SIZE-1): # x is horizontal axis
-        for y in range(BOARD_SIZE-1): # y is vertical axis
+    for x in range(N-1): # x is horizontal axis
+        for y in range(N-1): # y is vertical axis
             curr_wall = board.walls[y,x]
             if curr_wall!=0:
-                middle_ind = (BOARD_SIZE-2-y)*(BOARD_SIZE-1) + x
+                middle_ind = (N-2-y)*(N-1) + x
                 wall_middles[middle_ind] = True
                 if curr_wall==1: # horizontal
-                    h_wall_ind = (BOARD_SIZE-2-y)*BOARD_SIZE + x
+                    h_wall_ind = (N-2-y)*N + x
                     horizontal_walls[h_wall_ind] = True
                     horizontal_walls[h_wall_ind+1] = True
                 if curr_wall==-1: # vertical
-                    v_wall_ind = x*BOARD_SIZE + (BOARD_SIZE-2-y)
+                    v_wall_ind = x*N + (N-2-y)
                     vertical_walls[v_wall_ind] = True
                     vertical_walls[v_wall_ind+1] = True
 
@@ -95,7 +95,7 @@ def TREVORSc_move_text_to_python(c_move_text,board):
         piece = board.red if board.turn=='red' else board.blue
         pj,pi=piece.location
         if board.turn=='blue':
-            j=8-j
+            j=board.N-1-j
         diff=abs(pj-j) + abs(pi-i)
         assert diff <=2, f"Bad move for piece {piece}: {j},{i}"
         
@@ -117,7 +117,7 @@ def TREVORSc_move_text_to_python(c_move_text,board):
     else:
         
         if board.turn=='blue':
-            j=7-j  # maybe?
+            j=board.N-2-j  # maybe?
         command = ['hwall' if action=='H' else 'vwall', (j,i)]
         # wall
         
@@ -129,7 +129,7 @@ def TREVORSc_move_text_to_python(c_move_text,board):
     
 def c_move_text_to_python(c_move_text, board):
     assert board.turn=='blue', "Move must be from blue's perspective"
-    BOARD_SIZE = board.N
+    N = board.N
     action_type = c_move_text[0]
     is_positional_move = action_type == '*'
     c_proposed_x, c_proposed_y = eval(c_move_text[1:])
@@ -138,7 +138,7 @@ def c_move_text_to_python(c_move_text, board):
     logging.info(f"c_move_text is {c_move_text}"
     )
     if is_positional_move:
-        new_pos_coordinates = (c_proposed_y, BOARD_SIZE-1-c_proposed_x)    
+        new_pos_coordinates = (c_proposed_y, N-1-c_proposed_x)    
         logging.info(f"new_pos_coordinates: {new_pos_coordinates}, curr_pos_coordinates: {board.blue.location}")
         
         all_legal_positional_moves=[c for c in board.allLegalCommands() if c[0] in ('move','hop')]
@@ -162,7 +162,7 @@ def c_move_text_to_python(c_move_text, board):
         raise Exception(f"Couldn't produce a valid python command from '{c_move_text}'")
     else:
         # wall placement
-        new_wall_coordinates = (c_proposed_y, BOARD_SIZE-2-c_proposed_x)
+        new_wall_coordinates = (c_proposed_y, N-2-c_proposed_x)
         command = ['hwall' if action_type=='H' else 'vwall', new_wall_coordinates]
 
     return command
@@ -8,80 +8,73 @@ from .corridors_mcts import Corridors_MCTS
 # Conversion to/from cpp representation
 def to_python_board(c_board):
     from . import board
-    from ._corridors import Color
 
-    p_board = board.Board()
-    p_board.red.location = (c_board.red.location.j, c_board.red.location.i)
-    p_board.blue.location = (c_board.blue.location.j, c_board.blue.location.i)
-    p_board.turn = "red" if (c_board.turn == Color.RED) else "blue"
+    p_board = board.Board(c_board.N, c_board.wallsPerPiece)
+    p_board.red.location = c_board.red.location
+    p_board.blue.location = c_board.blue.location
+    p_board.turn = c_board.turn
 
     p_board.red.walls = c_board.red.walls
     p_board.blue.walls = c_board.blue.walls
-    for j in range(8):
-        for i in range(8):
-            p_board.walls[j, i] = c_board.walls[j, i]
+    M = c_board.N - 1
+    for j in range(M):
+        for i in range(M):
+            wall = c_board.walls[j, i]
+            if wall:
+                p_board.placeWall((j, i), int(wall))
+    p_board.rehash()
 
     return p_board
 
 
 def to_cpp_board(p_board):
     from . import _corridors
-    from ._corridors import Color
 
-    c_board = _corridors.Board()
-    c_board.red.location.j = p_board.red.location[0]
-    c_board.red.location.i = p_board.red.location[1]
-    c_board.blue.location.j = p_board.blue.location[0]
-    c_board.blue.location.i = p_board.blue.location[1]
+    # _corridors.Board has the python Board's API, so may already be one
+    if isinstance(p_board, _corridors.Board):
+        return p_board.snapshot()
+
+    c_board = _corridors.Board(p_board.N, p_board.wallsPerPiece)
+    c_board.red.location = p_board.red.location
+    c_board.blue.location = p_board.blue.location
     c_board.red.walls = p_board.red.walls
     c_board.blue.walls = p_board.blue.walls
 
-    for j in range(8):
-        for i in range(8):
+    M = p_board.N - 1
+    for j in range(M):
+        for i in range(M):
             wall = p_board.walls[j, i]
             if wall:
                 c_board.place_wall(_corridors.Wall(wall), j, i)
 
-    c_board.turn = Color.RED if (p_board.turn == "red") else Color.BLUE
+    c_board.turn = p_board.turn
+    c_board.rehash()
 
     return c_board
 
 
 class CPPBotWrapper(BaseBot):
-    def __init__(self, cpp_bot):
+    def __init__(self, cpp_bot, *call_args):
         self.c_bot = cpp_bot
+        # extra arguments for c_bot.call, e.g. a time limit
+        self.call_args = call_args
         # self.c_bot=_corridors.AlphaBetaBot()
 
     def __call__(self, p_board):
         c_board = to_cpp_board(p_board)
         try:
             with timed():
-                c_command = self.c_bot.call(c_board)
+                move = self.c_bot.move(c_board, *self.call_args)
         except Exception as e:
 
             print("exception evaluating board")
             print(c_board)
             raise
-        # print(c_command)
-
-        c_command = c_command.to_tuple()
-        # print(c_command)
-        if c_command[0] == "h":
-            p_command = ["hwall", (c_command[1], c_command[2])]
-        if c_command[0] == "v":
-            p_command = ["vwall", (c_command[1], c_command[2])]
-
-        if len(c_command) == 1:
-            p_command = ["move", c_command[0]]
-        if len(c_command) == 2:
-            p_command = ["hop", c_command[0], c_command[1]]
-
-        assert p_command in board.boardCommands(9), "Not a real command: {}".format(
-            p_command
-        )
-
-        legal = list(p_board.allLegalCommands())
-        if p_command not in legal:
+
+        # move codes are indices into boardCommands
+        p_command = board.boardCommands(p_board.N)[move]
+
+        if not c_board.legal_move(move):
             print(p_board)
             print(p_command)
             print(c_board)
@@ -97,8 +90,17 @@ class CPPStepsBot(CPPBotWrapper):
 
 
 class CPPAlphaBetaBot(CPPBotWrapper):
-    def __init__(self,max_depth):
-        super().__init__(_corridors.AlphaBetaBot(max_depth))
+    def __init__(self, max_depth, time_ms=None, selective=True, threads=1):
+        """
+            Searches deeper and deeper up to max_depth, and if time_ms is
+            given, stops after that many milliseconds with the best move of
+            the deepest search that finished.  Unless selective is turned
+            off it only searches walls that could change the race.  More
+            than one thread runs a Lazy SMP search.
+        """
+        call_args = () if time_ms is None else (time_ms,)
+        c_bot = _corridors.AlphaBetaBot(max_depth, selective, threads=threads)
+        super().__init__(c_bot, *call_args)
         
         
 class MCTSBot(BaseBot):
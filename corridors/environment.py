@@ -0,0 +1,285 @@
+"""
+    Many games played at once, as stacked numpy arrays.
+
+    Games holds B games in the same layout as batch.Positions, and works out
+    legal moves and applies them for all of them in one go, so random and
+    heuristic self-play run at array speed rather than one Board at a time.
+
+    Actions are indices into board.boardCommands(N): 4 moves, then 12 hops,
+    then the (N-1)x(N-1) horizontal wall slots and the vertical ones, so
+    144 actions on a standard board.
+"""
+import numpy as np
+
+from .batch import Positions
+from .board import MOVE_COMMANDS, HOP_COMMANDS, boardCommands
+from .movement import EMPTY, HORIZONTAL, VERTICAL, UNREACHABLE
+
+DELTAS = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+DIRECTIONS = ("up", "down", "left", "right")
+
+PIECE_ACTIONS = len(MOVE_COMMANDS) + len(HOP_COMMANDS)
+
+# where each move and hop takes a piece, relative to where it is
+PIECE_OFFSETS = np.array(
+    [
+        np.sum([DELTAS[d] for d in command[1:]], axis=0)
+        for command in MOVE_COMMANDS + HOP_COMMANDS
+    ]
+)
+
+
+class Games(Positions):
+    @classmethod
+    def new(cls, count, N=9, wallsPerPiece=10):
+        "`count` games at the starting position"
+        M = N - 1
+        return cls(
+            N,
+            np.full((count, M, M), EMPTY, dtype=np.int32),
+            np.tile([M, N // 2], (count, 1)),
+            np.tile([0, N // 2], (count, 1)),
+            np.full(count, wallsPerPiece),
+            np.full(count, wallsPerPiece),
+            np.ones(count, dtype=bool),
+        )
+
+    def commands(self):
+        "The command for each action index"
+        return boardCommands(self.N)
+
+    def over(self):
+        return self.redWon() | self.blueWon()
+
+    def winner(self):
+        "(B,) 1 where red has won, -1 where blue has, 0 if still playing"
+        return np.where(self.redWon(), 1, np.where(self.blueWon(), -1, 0))
+
+    def current(self):
+        "(locations, wallsLeft) of the pieces whose turn it is"
+        red = self.redToPlay
+        return (
+            np.where(red[:, np.newaxis], self.red, self.blue),
+            np.where(red, self.redWalls, self.blueWalls),
+        )
+
+    def other(self):
+        red = self.redToPlay
+        return np.where(red[:, np.newaxis], self.blue, self.red)
+
+    def legalMask(self):
+        "(B, actions) mask of the legal actions in each game"
+        blocked = self.blocked()
+        mask = np.concatenate([self.pieceMask(blocked), self.wallMask(blocked)], axis=1)
+        mask[self.over()] = False
+        return mask
+
+    def pieceMask(self, blocked):
+        blocked = dict(zip(("up", "down", "left", "right"), blocked))
+        N = self.N
+        index = np.arange(len(self))
+        location, _ = self.current()
+        other = self.other()
+        j, i = location[:, 0], location[:, 1]
+
+        def neighbour(j, i, direction):
+            dj, di = DELTAS[direction]
+            return np.clip(j + dj, 0, N - 1), np.clip(i + di, 0, N - 1)
+
+        def free(j, i, direction):
+            return ~blocked[direction][index, j, i]
+
+        mask = np.zeros((len(self), PIECE_ACTIONS), dtype=bool)
+        for k, command in enumerate(MOVE_COMMANDS + HOP_COMMANDS):
+            d1 = command[1]
+            j1, i1 = neighbour(j, i, d1)
+            intoOther = (j1 == other[:, 0]) & (i1 == other[:, 1])
+            if command[0] == "move":
+                mask[:, k] = free(j, i, d1) & ~intoOther
+                continue
+
+            d2 = command[2]
+            # if we can carry on past the other piece we have to, otherwise
+            # we go round it
+            straight = free(j1, i1, d1)
+            if d2 == d1:
+                mask[:, k] = free(j, i, d1) & intoOther & straight
+            else:
+                mask[:, k] = free(j, i, d1) & intoOther & ~straight & free(j1, i1, d2)
+        return mask
+
+    def availableWalls(self):
+        "(B, 2, M, M) slots where a wall would fit, ignoring escapability"
+        E = self.walls == EMPTY
+        H = self.walls == HORIZONTAL
+        V = self.walls == VERTICAL
+
+        h = E.copy()
+        h[:, :, 1:] &= ~H[:, :, :-1]
+        h[:, :, :-1] &= ~H[:, :, 1:]
+        v = E.copy()
+        v[:, 1:, :] &= ~V[:, :-1, :]
+        v[:, :-1, :] &= ~V[:, 1:, :]
+        return np.stack([h, v], axis=1)
+
+    def shortestPathWalls(self, location, field, blocked):
+        """
+            (B, 2, M, M) slots whose walls would cut one shortest path from
+            `location` to its goal.  A wall that doesn't can't trap the piece.
+        """
+        blocked = dict(zip(("up", "down", "left", "right"), blocked))
+        N = self.N
+        M = N - 1
+        B = len(self)
+        index = np.arange(B)
+        cut = np.zeros((B, 2, M, M), dtype=bool)
+
+        j, i = location[:, 0].copy(), location[:, 1].copy()
+        steps = field[index, j, i]
+        active = (steps > 0) & (steps != UNREACHABLE)
+
+        def mark(games, orientation, row, column):
+            valid = (row >= 0) & (row < M) & (column >= 0) & (column < M)
+            cut[games[valid], orientation, row[valid], column[valid]] = True
+
+        while active.any():
+            moved = np.zeros(B, dtype=bool)
+            nj, ni = j.copy(), i.copy()
+            for direction in DIRECTIONS:
+                dj, di = DELTAS[direction]
+                tj = np.clip(j + dj, 0, N - 1)
+                ti = np.clip(i + di, 0, N - 1)
+                step = (
+                    active
+                    & ~moved
+                    & ~blocked[direction][index, j, i]
+                    & (field[index, tj, ti] == steps - 1)
+                )
+                games = index[step]
+                if dj:
+                    row = np.minimum(j, tj)[step]
+                    mark(games, 0, row, i[step] - 1)
+                    mark(games, 0, row, i[step])
+                else:
+                    column = np.minimum(i, ti)[step]
+                    mark(games, 1, j[step] - 1, column)
+                    mark(games, 1, j[step], column)
+                nj[step] = tj[step]
+                ni[step] = ti[step]
+                moved |= step
+            j, i = nj, ni
+            steps = field[index, j, i]
+            active &= moved & (steps > 0)
+
+        return cut
+
+    def wallMask(self, blocked):
+        M = self.N - 1
+        _, wallsLeft = self.current()
+        mask = self.availableWalls() & (wallsLeft > 0).reshape(-1, 1, 1, 1)
+
+        # only walls across a shortest path could trap a piece, so only
+        # those need checking, in one batch of candidate positions
+        suspects = mask & (
+            self.shortestPathWalls(self.red, self.distanceFields(0, blocked), blocked)
+            | self.shortestPathWalls(
+                self.blue, self.distanceFields(self.N - 1, blocked), blocked
+            )
+        )
+        k, o, j, i = np.nonzero(suspects)
+        if len(k):
+            walls = self.walls[k].copy()
+            walls[np.arange(len(k)), j, i] = np.where(o == 0, HORIZONTAL, VERTICAL)
+            candidates = Positions(
+                self.N,
+                walls,
+                self.red[k],
+                self.blue[k],
+                self.redWalls[k],
+                self.blueWalls[k],
+                self.redToPlay[k],
+            )
+            red, blue = candidates.distances()
+            mask[k, o, j, i] = (red != UNREACHABLE) & (blue != UNREACHABLE)
+
+        return mask.reshape(len(self), 2 * M * M)
+
+    def step(self, actions):
+        """
+            Apply one action per game; assumes they're legal.  Games that are
+            over, or given a negative action, are left alone.
+        """
+        N = self.N
+        M = N - 1
+        actions = np.asarray(actions)
+        live = ~self.over() & (actions >= 0)
+        red = self.redToPlay.copy()
+
+        moving = live & (actions < PIECE_ACTIONS)
+        location, _ = self.current()
+        target = location + PIECE_OFFSETS[np.clip(actions, 0, PIECE_ACTIONS - 1)]
+        self.red[moving & red] = target[moving & red]
+        self.blue[moving & ~red] = target[moving & ~red]
+
+        walling = live & (actions >= PIECE_ACTIONS)
+        k = np.nonzero(walling)[0]
+        orientation, slot = np.divmod(actions[k] - PIECE_ACTIONS, M * M)
+        self.walls[k, slot // M, slot % M] = np.where(
+            orientation == 0, HORIZONTAL, VERTICAL
+        )
+        self.redWalls[walling & red] -= 1
+        self.blueWalls[walling & ~red] -= 1
+
+        self.redToPlay[live] = ~red[live]
+
+
+def randomActions(games, mask, rng):
+    "A random legal action for each game, or -1 where there are none"
+    scores = rng.random(mask.shape)
+    scores[~mask] = -1
+    actions = scores.argmax(axis=1)
+    actions[~mask.any(axis=1)] = -1
+    return actions
+
+
+def greedyActions(games, mask, rng, wallRate=0.1):
+    """
+        Step along a shortest path, breaking ties at random.  Now and then
+        (with probability `wallRate`) play a random wall instead.
+    """
+    N = games.N
+    index = np.arange(len(games))
+    blocked = games.blocked()
+    fields = np.where(
+        games.redToPlay[:, np.newaxis, np.newaxis],
+        games.distanceFields(0, blocked),
+        games.distanceFields(N - 1, blocked),
+    )
+    location, _ = games.current()
+    targets = np.clip(location[:, np.newaxis, :] + PIECE_OFFSETS, 0, N - 1)
+    steps = fields[index[:, np.newaxis], targets[..., 0], targets[..., 1]]
+    steps = steps + rng.random(steps.shape)
+    steps[~mask[:, :PIECE_ACTIONS]] = np.inf
+    actions = steps.argmin(axis=1)
+
+    walls = mask.copy()
+    walls[:, :PIECE_ACTIONS] = False
+    walling = (rng.random(len(games)) < wallRate) & walls.any(axis=1)
+    walling |= ~mask[:, :PIECE_ACTIONS].any(axis=1)
+    actions[walling] = randomActions(games, walls[walling], rng)
+    actions[~mask.any(axis=1)] = -1
+    return actions
+
+
+def selfPlay(count, policy=randomActions, seed=None, maxMoves=1000, N=9):
+    """
+        Play `count` games with `policy` on both sides, and return the
+        finished Games, with their winners in games.winner().
+    """
+    rng = np.random.default_rng(seed)
+    games = Games.new(count, N=N)
+    for move in range(maxMoves):
+        if games.over().all():
+            break
+        games.step(policy(games, games.legalMask(), rng))
+    return games
@@ -1,5 +1,5 @@
 import uuid
-from . import board
+from .board import Board
 
 
 class Game:
@@ -7,8 +7,12 @@ class Game:
         Is it a mistake to have separate 'game' and 'board' classes?
     """
 
-    def __init__(self, red):
-        self.board = board.Board()
+    def __init__(self, red, board=None):
+        """
+            `board` can be anything with board.Board's API, such as the much
+            faster _corridors.Board; by default a new board.Board.
+        """
+        self.board = Board() if board is None else board
         self.uuid = str(uuid.uuid4())
         self.players = {"red": red, "blue": None}
 
@@ -1,3 +1,7 @@
+import collections
+import heapq
+import threading
+
 import numpy as np
 
 EMPTY = 0
@@ -10,141 +14,381 @@ RIGHT = 2
 DOWN = 4
 LEFT = 8
 
+# distance-field value for squares that can't reach the goal at all
+UNREACHABLE = np.iinfo(np.int32).max
+
+# wall slot masks and statuses are indexed [orientationIndex, j, i]
+ORIENTATIONS = (HORIZONTAL, VERTICAL)
+
+FREE = 0
+OCCUPIED = 1
+TRAPPING = 2
+
+
+def orientationIndex(orientation):
+    return 0 if orientation == HORIZONTAL else 1
+
+
+def emptySquares(N):
+    """
+        For every square, the directions (UP|RIGHT|DOWN|LEFT bits) that are
+        blocked.  Starts out with just the edges of the board.
+
+        Boards keep this as a tuple of tuples, which is immutable (so can be
+        shared) and much quicker to index than a numpy array.
+    """
+    M = N - 1
+    return tuple(
+        tuple(
+            (UP if j == 0 else 0)
+            | (DOWN if j == M else 0)
+            | (LEFT if i == 0 else 0)
+            | (RIGHT if i == M else 0)
+            for i in range(N)
+        )
+        for j in range(N)
+    )
 
-def canMove(walls, j, i, direction):
-    M = 8
-    if UP == direction:
-        if j == 0:
-            return 0
-        if i > 0:
-            if walls[(j - 1, i - 1)] == HORIZONTAL:
-                return 0
-        if i < M:
-            if walls[(j - 1, i)] == HORIZONTAL:
-                return 0
-
-    if LEFT == direction:
-        if i == 0:
-            return 0
-        if j > 0:
-            if walls[(j - 1, i - 1)] == VERTICAL:
-                return 0
-        if j < M:
-            if walls[(j, i - 1)] == VERTICAL:
-                return 0
-
-    if RIGHT == direction:
-        if i >= M:
-            return 0
-        if j > 0:
-            if walls[(j - 1, i)] == VERTICAL:
-                return 0
-        if j < M:
-            if walls[(j, i)] == VERTICAL:
-                return 0
-
-    if DOWN == direction:
-        if j >= M:
-            return 0
-        if i > 0:
-            if walls[(j, i - 1)] == HORIZONTAL:
-                return 0
-        if i < M:
-            if walls[(j, i)] == HORIZONTAL:
-                return 0
-
-    return 1
+
+def applyWall(squares, j, i, orientation):
+    "Returns new squares with the four square edges next to the wall blocked"
+    top = list(squares[j])
+    bottom = list(squares[j + 1])
+    if orientation == HORIZONTAL:
+        top[i] |= DOWN
+        top[i + 1] |= DOWN
+        bottom[i] |= UP
+        bottom[i + 1] |= UP
+    else:
+        top[i] |= RIGHT
+        bottom[i] |= RIGHT
+        top[i + 1] |= LEFT
+        bottom[i + 1] |= LEFT
+    return squares[:j] + (tuple(top), tuple(bottom)) + squares[j + 2 :]
+
+
+def canMove(squares, j, i, direction):
+    return not (squares[j][i] & direction)
 
 
 def stepsToEscape(board, piece):
-    N = board.N
+    "Boards keep distance fields up to date, so this is just a lookup"
+    return board.stepsToEscape(piece)
 
-    walls = board.walls
-    squares = np.full((N, N), None)
 
-    target_rank = 0 if piece.color == "red" else board.N - 1
+def openNeighbours(squares, j, i):
+    blocked = squares[j][i]
+    neighbours = []
+    if not blocked & UP:
+        neighbours.append((j - 1, i))
+    if not blocked & DOWN:
+        neighbours.append((j + 1, i))
+    if not blocked & LEFT:
+        neighbours.append((j, i - 1))
+    if not blocked & RIGHT:
+        neighbours.append((j, i + 1))
+    return neighbours
+
+
+def wallEdges(j, i, orientation):
+    "The two pairs of squares that a wall separates"
+    if orientation == HORIZONTAL:
+        return [((j, i), (j + 1, i)), ((j, i + 1), (j + 1, i + 1))]
+    return [((j, i), (j, i + 1)), ((j + 1, i), (j + 1, i + 1))]
 
+
+class DistanceCache:
+    """
+        LRU cache of distance fields.  A field only depends on the walls and
+        the goal row, so boards key it on their wall-only Zobrist key.
+    """
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            fields = self.entries.get(key)
+            if fields is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return fields
+
+    def put(self, key, fields):
+        with self.lock:
+            self.entries[key] = fields
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+distanceCache = DistanceCache()
+
+
+def frozenField(field):
+    field = np.array(field, dtype=np.int32)
+    field.flags.writeable = False
+    return field
+
+
+def mirrorFields(fields):
+    "Distance fields for the left-right mirror image of the board"
+    return {color: field[:, ::-1] for color, field in fields.items()}
+
+
+def distanceField(squares, N, target_rank):
+    """
+        Steps from every square to target_rank, ignoring pieces.
+        A BFS outwards from the whole target row.
+    """
+    field = [[UNREACHABLE] * N for _ in range(N)]
     neighbours = [(target_rank, i) for i in range(N)]
+    for (j, i) in neighbours:
+        field[j][i] = 0
 
     steps = 0
-
-    for it in range(N ** 2):
+    while neighbours:
+        steps += 1
+        layer = []
         for (j, i) in neighbours:
-            squares[j, i] = steps
-            if (j, i) == piece.location:
-                return squares[j, i]
+            for (jj, ii) in openNeighbours(squares, j, i):
+                if field[jj][ii] == UNREACHABLE:
+                    field[jj][ii] = steps
+                    layer.append((jj, ii))
+        neighbours = layer
 
-        neighbours = [
+    return frozenField(field)
+
+
+def repairDistanceField(field, squares, N, j, i, orientation):
+    """
+        Returns a new distance field that accounts for a wall just placed
+        at (j, i).  `squares` must already include it.
+
+        Placing a wall can only make distances longer, and only for squares
+        whose every shortest route crossed it, so we find those squares,
+        forget their distances, and recompute just that region outwards from
+        its still-valid border.
+    """
+    field = field.tolist()
+
+    def supported(j, i):
+        d = field[j][i]
+        return d == 0 or any(
+            field[jj][ii] == d - 1 for (jj, ii) in openNeighbours(squares, j, i)
+        )
+
+    stack = [
+        square
+        for edge in wallEdges(j, i, orientation)
+        for square in edge
+        if field[square[0]][square[1]] != UNREACHABLE
+    ]
+    invalid = set()
+    while stack:
+        square = stack.pop()
+        if square in invalid or supported(*square):
+            continue
+        invalid.add(square)
+        jj, ii = square
+        d = field[jj][ii]
+        field[jj][ii] = UNREACHABLE
+        stack.extend(
             target
-            for (jj, ii) in neighbours
-            for direction, target in [
-                (UP, (jj - 1, ii)),
-                (DOWN, (jj + 1, ii)),
-                (LEFT, (jj, ii - 1)),
-                (RIGHT, (jj, ii + 1)),
-            ]
-            if canMove(walls, jj, ii, direction)
-            if squares[target] is None
-        ]
-
-        neighbours = list(set(neighbours))  # remove dupes
-        steps += 1
+            for target in openNeighbours(squares, jj, ii)
+            if field[target[0]][target[1]] == d + 1
+        )
 
-    assert 0, "no way out"
+    # Dijkstra (well, BFS with a heap) over just the invalidated squares
+    heap = []
+    for (jj, ii) in invalid:
+        d = min(
+            (field[a][b] for (a, b) in openNeighbours(squares, jj, ii)),
+            default=UNREACHABLE,
+        )
+        if d != UNREACHABLE:
+            field[jj][ii] = d + 1
+            heapq.heappush(heap, (d + 1, (jj, ii)))
 
+    while heap:
+        d, (jj, ii) = heapq.heappop(heap)
+        if d > field[jj][ii]:
+            continue
+        for target in openNeighbours(squares, jj, ii):
+            a, b = target
+            if target in invalid and field[a][b] > d + 1:
+                field[a][b] = d + 1
+                heapq.heappush(heap, (d + 1, target))
+
+    return frozenField(field)
 
-def canEscape(board, piece):
-    walls = board.walls
-    checked_squares = set()
-    N = board.N
 
-    def inner(location, target_rank):
-        j = location[0]
-        i = location[1]
+def canReach(squares, location, target_rank):
+    "Depth first search"
+    checked_squares = {location}
+    stack = [location]
+    while stack:
+        j, i = stack.pop()
         if j == target_rank:
             return True
+        for target in openNeighbours(squares, j, i):
+            if target not in checked_squares:
+                checked_squares.add(target)
+                stack.append(target)
+    return False
 
-        if location in checked_squares:
-            return False
-        checked_squares.add(location)
 
-        for direction, target in (
-            (UP, (j - 1, i)),
-            (DOWN, (j + 1, i)),
-            (LEFT, (j, i - 1)),
-            (RIGHT, (j, i + 1)),
-        ):
-            if target not in checked_squares:
-                if canMove(walls, j, i, direction):
-                    if inner(target, target_rank):
-                        return True
-        return False
+def canEscape(board, piece):
+    target_rank = 0 if piece.color == "red" else board.N - 1
+    return canReach(board.squares, piece.location, target_rank)
+
+
+def availableWalls(walls):
+    """
+        Mask of the slots where a wall would fit, ignoring escapability.
+        Placed walls never move, so boards keep this and update it with
+        placeAvailable rather than recomputing it.
+    """
+    occupied = walls != EMPTY
+    h = walls == HORIZONTAL
+    v = walls == VERTICAL
+
+    horizontal = ~occupied
+    horizontal[:, 1:] &= ~h[:, :-1]
+    horizontal[:, :-1] &= ~h[:, 1:]
 
-    target_rank = 0 if piece.color == "red" else N - 1
+    vertical = ~occupied
+    vertical[1:, :] &= ~v[:-1, :]
+    vertical[:-1, :] &= ~v[1:, :]
 
-    return inner(piece.location, target_rank)
+    available = np.stack([horizontal, vertical])
+    available.flags.writeable = False
+    return available
 
 
-def legalWall(walls, j, i, orientation):
+def placeAvailable(available, j, i, orientation):
+    "Returns a copy of the mask with a wall placed at (j, i)"
+    M = available.shape[1]
+    available = available.copy()
+    available[:, j, i] = False
+    if orientation == HORIZONTAL:
+        available[0, j, max(i - 1, 0) : i + 2] = False
+    else:
+        available[1, max(j - 1, 0) : j + 2, i] = False
+    assert available.shape == (2, M, M)
+    available.flags.writeable = False
+    return available
+
 
-    M = 8
+def legalWall(available, j, i, orientation):
+    "available is the mask from availableWalls"
+    M = available.shape[1]
     assert 0 <= j < M
     assert 0 <= i < M
     assert orientation in (HORIZONTAL, VERTICAL), orientation
+    return bool(available[orientationIndex(orientation), j, i])
 
-    if orientation == HORIZONTAL:
-        if walls[j, i]:
-            return False
-        if i > 0 and walls[j, i - 1] == HORIZONTAL:
-            return False
-        if i < M - 1 and walls[j, i + 1] == HORIZONTAL:
-            return False
-    if orientation == VERTICAL:
-        if walls[j, i]:
-            return False
-        if j > 0 and walls[j - 1, i] == VERTICAL:
-            return False
-        if j < M - 1 and walls[j + 1, i] == VERTICAL:
-            return False
-
-    return True
+
+def shortestPath(field, squares, location):
+    "The edges along one shortest route to the goal, walking down the field"
+    j, i = location
+    d = field[j][i]
+    assert d != UNREACHABLE, "no way out"
+    path = []
+    while d > 0:
+        for (jj, ii) in openNeighbours(squares, j, i):
+            if field[jj][ii] == d - 1:
+                break
+        path.append(((j, i), (jj, ii)))
+        j, i, d = jj, ii, d - 1
+    return path
+
+
+def shortestPathEdges(field, squares, location):
+    "Every edge on some shortest route to the goal, walking down the field"
+    j, i = location
+    assert field[j][i] != UNREACHABLE, "no way out"
+    edges = set()
+    seen = {location}
+    stack = [location]
+    while stack:
+        j, i = stack.pop()
+        d = field[j][i]
+        for (jj, ii) in openNeighbours(squares, j, i) if d > 0 else ():
+            if field[jj][ii] == d - 1:
+                edges.add(((j, i), (jj, ii)))
+                if (jj, ii) not in seen:
+                    seen.add((jj, ii))
+                    stack.append((jj, ii))
+    return edges
+
+
+def blockingWalls(a, b, M):
+    "Slots (orientation index, j, i) of the walls that would cut edge a-b"
+    (j, i), (jj, ii) = sorted((a, b))
+    if i == ii:
+        return [(0, j, x) for x in (i - 1, i) if 0 <= x < M]
+    return [(1, y, i) for y in (j - 1, j) if 0 <= y < M]
+
+
+def selectiveWalls(squares, distances, pieces, other):
+    """
+        Slots (orientation index, j, i) of the walls worth trying in a
+        search: ones that cut a step on one of the `other` piece's shortest
+        routes, which are the only ones that can slow it down, and ones
+        right next to any of `pieces`.
+    """
+    M = len(squares) - 1
+    field = distances[other.color].tolist()
+    slots = {
+        slot
+        for a, b in shortestPathEdges(field, squares, other.location)
+        for slot in blockingWalls(a, b, M)
+    }
+    for piece in pieces:
+        j, i = piece.location
+        for y in (j - 1, j):
+            for x in (i - 1, i):
+                if 0 <= y < M and 0 <= x < M:
+                    slots.update(((0, y, x), (1, y, x)))
+    return slots
+
+
+def classifyWalls(squares, available, pieces, distances):
+    """
+        FREE, OCCUPIED or TRAPPING for every wall slot, in one pass.
+
+        A wall can only trap a piece if it cuts every route to the goal, so
+        in particular it must cut any one shortest route.  So only the
+        handful of available walls that cross one of the pieces' shortest
+        paths need an actual search; everything else is FREE.
+    """
+    M = available.shape[1]
+    N = M + 1
+    status = np.where(available, FREE, OCCUPIED).astype(np.int8)
+
+    for piece in pieces:
+        target_rank = 0 if piece.color == "red" else N - 1
+        field = distances[piece.color].tolist()
+        candidates = {
+            slot
+            for a, b in shortestPath(field, squares, piece.location)
+            for slot in blockingWalls(a, b, M)
+        }
+        for (o, j, i) in candidates:
+            if status[o, j, i] != FREE:
+                continue
+            walled = applyWall(squares, j, i, ORIENTATIONS[o])
+            if not canReach(walled, piece.location, target_rank):
+                status[o, j, i] = TRAPPING
+
+    status.flags.writeable = False
+    return status
@@ -7,6 +7,8 @@ import corridors.bots
 import corridors.movement
 import datetime
 import contextlib
+import random
+import time
 
 
 @contextlib.contextmanager
@@ -90,6 +92,103 @@ def test_speed_pybind():
         print(" movecount: {}".format(movecount))
 
 
+def test_speed_vectorized():
+    print("test_speed_vectorized")
+    from corridors import environment
+
+    with timed():
+        games = environment.selfPlay(1000, environment.greedyActions, seed=0)
+        redWins = (games.winner() == 1).sum()
+        print(" games: {}, red wins: {}".format(len(games), redWins))
+
+
+def test_scaling(sizes=(5, 7, 9, 11), games=3):
+    """
+        How move generation, BFS and search cost grow with the board size.
+        Times are per position for move generation and BFS, and per first
+        move for the depth 2 searches.
+    """
+    print("test_scaling")
+    from corridors import _corridors
+
+    print(" N   movegen ms   BFS ms   python AB(2) s   C++ AB(2) s")
+    for N in sizes:
+        random.seed(N)
+        movegen = bfs = 0
+        positions = 0
+        for game in range(games):
+            board = corridors.board.Board(N)
+            while not board.gameOver():
+                start = time.perf_counter()
+                commands = list(board.allLegalCommands())
+                movegen += time.perf_counter() - start
+
+                start = time.perf_counter()
+                corridors.movement.distanceField(board.squares, N, 0)
+                bfs += time.perf_counter() - start
+
+                positions += 1
+                board(*random.choice(commands))
+
+        start = time.perf_counter()
+        corridors.bots.AlphaBetaBot(corridors.bots.StepsBot2(), maxDepth=2)(
+            corridors.board.Board(N)
+        )
+        search = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _corridors.AlphaBetaBot(2).call(_corridors.Board(N))
+        cppSearch = time.perf_counter() - start
+
+        print(
+            "{:2d}   {:10.2f}   {:6.3f}   {:14.2f}   {:11.3f}".format(
+                N,
+                1000 * movegen / positions,
+                1000 * bfs / positions,
+                search,
+                cppSearch,
+            )
+        )
+
+
+def test_threads(threads=(1, 2, 4, 8), time_ms=1000, positions=4):
+    """
+        Nodes per second of the C++ AlphaBetaBot's Lazy SMP search, by
+        number of threads, over a few mid-game positions.
+    """
+    print("test_threads")
+    from corridors import _corridors
+    from corridors.cpp_bots import to_cpp_board
+
+    random.seed(1)
+    board = corridors.board.Board()
+    boards = []
+    while len(boards) < positions and not board.gameOver():
+        boards.append(to_cpp_board(board))
+        for move in range(6):
+            if not board.gameOver():
+                board(*random.choice(list(board.allLegalCommands())))
+
+    print(" threads   nodes/s   scaling   depths")
+    base = None
+    for count in threads:
+        nodes = 0
+        depths = []
+        start = time.perf_counter()
+        for c_board in boards:
+            bot = _corridors.AlphaBetaBot(20, threads=count)
+            bot.call(c_board, time_ms)
+            nodes += bot.nodes
+            depths.append(bot.depth)
+        rate = nodes / (time.perf_counter() - start)
+        base = base or rate
+        print(
+            " {:7d}   {:7.0f}   {:7.2f}   {}".format(
+                count, rate, rate / base, " ".join(map(str, depths))
+            )
+        )
+
+
 if __name__ == "__main__":
     config.configureLogging()
     test_speed_ab()
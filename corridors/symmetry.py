@@ -0,0 +1,68 @@
+"""
+    Left-right mirror symmetry.
+
+    Reflecting a position in the centre file (column i -> N-1-i) gives a
+    position that's exactly as good for the same player, with every move
+    reflected too.  The start position is its own mirror image, and so are
+    plenty of positions after it, so tables keyed on Board.canonicalKey()
+    store one entry for both orientations.
+"""
+import functools
+
+from .board import Board, boardCommands
+
+MIRROR_DIRECTIONS = {"up": "up", "down": "down", "left": "right", "right": "left"}
+
+
+def mirrorCommand(command, N=9):
+    "The command that does in the mirror image what `command` does here"
+    action = command[0]
+    if action in ("move", "hop"):
+        return [action] + [MIRROR_DIRECTIONS[d] for d in command[1:]]
+    j, i = command[1]
+    return [action, (j, N - 2 - i)]
+
+
+@functools.lru_cache()
+def mirrorTable(N):
+    """
+        Maps indices into boardCommands(N) to the indices of their mirrored
+        commands.  Its own inverse.
+    """
+    commands = boardCommands(N)
+    index = {repr(command): k for k, command in enumerate(commands)}
+    return tuple(index[repr(mirrorCommand(command, N))] for command in commands)
+
+
+def mirrorBoard(board):
+    "A new Board with the mirror image of `board`'s position"
+    N = board.N
+    mirror = Board(N, board.wallsPerPiece)
+    for j, i in zip(*board.walls.nonzero()):
+        mirror.placeWall((int(j), N - 2 - int(i)), int(board.walls[j, i]))
+    for piece, original in ((mirror.red, board.red), (mirror.blue, board.blue)):
+        j, i = original.location
+        piece.location = (j, N - 1 - i)
+        piece.walls = original.walls
+    mirror.turn = board.turn
+    mirror.rehash()
+    mirror._invalidate()
+    return mirror
+
+
+def mirrored(board):
+    "(mirror image of `board`, move remapping table)"
+    return mirrorBoard(board), mirrorTable(board.N)
+
+
+def canonical(board):
+    """
+        (canonical form of `board`, move remapping table)
+
+        The canonical form is whichever of the position and its mirror image
+        has the smaller key, so is the same for both.  When it's `board`
+        itself the table is the identity.
+    """
+    if board.isCanonical():
+        return board, tuple(range(len(boardCommands(board.N))))
+    return mirrored(board)
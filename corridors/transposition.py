@@ -0,0 +1,51 @@
+"""
+    A fixed size transposition table for alpha-beta searches, keyed on
+    Board.key().
+"""
+import collections
+
+EXACT = 0
+LOWER = 1  # the search failed high, so the real score is at least this
+UPPER = 2  # the search failed low, so the real score is at most this
+
+Entry = collections.namedtuple("Entry", "key depth flag score move generation")
+
+
+class TranspositionTable:
+    def __init__(self, bits=16):
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.slots = [None] * self.size
+
+        # bumped for every new search, so we can tell stale entries apart
+        self.generation = 0
+
+    def __len__(self):
+        return sum(1 for entry in self.slots if entry is not None)
+
+    def newSearch(self):
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+    def get(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry.key == key:
+            return entry
+
+    def store(self, key, depth, flag, score, move):
+        """
+            Depth-preferred replacement: an entry is only overwritten by a
+            search of the same position, or one at least as deep, unless it's
+            left over from an earlier search.
+        """
+        index = key & self.mask
+        old = self.slots[index]
+        if (
+            old is None
+            or old.key == key
+            or old.generation != self.generation
+            or depth >= old.depth
+        ):
+            self.slots[index] = Entry(key, depth, flag, score, move, self.generation)
@@ -0,0 +1,85 @@
+"""
+    Zobrist hashing.
+
+    Every feature of a position (a wall in a slot, a piece on a square, a
+    number of walls left, blue to move) gets a random 64 bit number, and a
+    position's key is the XOR of the numbers of its features.  XOR is its
+    own inverse, so boards update their key as they go rather than
+    rehashing.
+"""
+import functools
+
+import numpy as np
+
+from .movement import EMPTY, orientationIndex
+
+# wall counts above this can't be hashed
+MAX_WALLS = 32
+
+
+class Table:
+    def __init__(self, N, seed=0x5EED):
+        rng = np.random.default_rng(seed)
+        M = N - 1
+        self.N = N
+
+        def numbers(*shape):
+            return rng.integers(0, 2 ** 64, size=shape, dtype=np.uint64).tolist()
+
+        # indexed [orientationIndex][j][i]
+        self.walls = numbers(2, M, M)
+        self.pieces = {"red": numbers(N, N), "blue": numbers(N, N)}
+        self.wallsLeft = {"red": numbers(MAX_WALLS + 1), "blue": numbers(MAX_WALLS + 1)}
+        self.blueToMove = numbers(1)[0]
+
+    def wall(self, location, orientation):
+        j, i = location
+        return self.walls[orientationIndex(orientation)][j][i]
+
+    def piece(self, color, location):
+        j, i = location
+        return self.pieces[color][j][i]
+
+    # The numbers for the left-right mirror image of a feature, so a board
+    # can keep its mirror image's key up to date as well as its own
+
+    def mirrorWall(self, location, orientation):
+        j, i = location
+        return self.walls[orientationIndex(orientation)][j][self.N - 2 - i]
+
+    def mirrorPiece(self, color, location):
+        j, i = location
+        return self.pieces[color][j][self.N - 1 - i]
+
+
+@functools.lru_cache()
+def table(N):
+    return Table(N)
+
+
+def wallKey(walls):
+    "The part of the key that comes from the walls"
+    t = table(len(walls) + 1)
+    key = 0
+    for (j, i), wall in np.ndenumerate(walls):
+        if wall != EMPTY:
+            key ^= t.wall((j, i), wall)
+    return key
+
+
+def mirrorWallKey(walls):
+    "wallKey of the mirror image of `walls`"
+    return wallKey(walls[:, ::-1])
+
+
+def key(board, mirror=False):
+    "A board's key (or its mirror image's), from scratch"
+    t = table(board.N)
+    key = mirrorWallKey(board.walls) if mirror else wallKey(board.walls)
+    piece = t.mirrorPiece if mirror else t.piece
+    for p in (board.red, board.blue):
+        key ^= piece(p.color, p.location)
+        key ^= t.wallsLeft[p.color][p.walls]
+    if board.turn == "blue":
+        key ^= t.blueToMove
+    return key
@@ -16,6 +16,8 @@ ext_modules = [
             pybind11.get_include(user=False),
             pybind11.get_include(user=True)
         ],
+        # AlphaBetaBot can search with several threads
+        extra_link_args=['-pthread'],
         language='c++'
     ),
     Extension(
@@ -1,12 +1,60 @@
 #include "board.hpp"
 #include <set>
 #include <iostream>
+#include <random>
 using std::cout;
 using std::endl;
 
 namespace {
     //not sure how else I get an iterable?
     std::vector<Direction> directions = {UP,RIGHT,LEFT,DOWN};
+    
+    struct Zobrist{
+        uint64_t keys[2][MAX_N-1][MAX_N-1];
+        uint64_t sizes[MAX_N+1];
+        uint64_t pieces[2][MAX_N][MAX_N];   // indexed by Color
+        uint64_t walls_left[2][MAX_WALLS+1];
+        uint64_t blue_to_move;
+        
+        Zobrist(){
+            std::mt19937_64 rng(0x5EED);
+            for(uint o=0;o<2;o++)
+                for(uint j=0;j<MAX_N-1;j++)
+                    for(uint i=0;i<MAX_N-1;i++)
+                        keys[o][j][i]=rng();
+            for(uint N=0;N<=MAX_N;N++)
+                sizes[N]=rng();
+            for(uint c=0;c<2;c++){
+                for(uint j=0;j<MAX_N;j++)
+                    for(uint i=0;i<MAX_N;i++)
+                        pieces[c][j][i]=rng();
+                for(uint w=0;w<=MAX_WALLS;w++)
+                    walls_left[c][w]=rng();
+            }
+            blue_to_move=rng();
+        }
+    };
+    const Zobrist zobrist_keys;
+}
+
+uint64_t wall_zobrist(Wall orientation, uint j, uint i){
+    return zobrist_keys.keys[orientation==HORIZONTAL?0:1][j][i];
+}
+
+uint64_t size_zobrist(uint N){
+    return zobrist_keys.sizes[N];
+}
+
+uint64_t piece_zobrist(Color color, uint j, uint i){
+    return zobrist_keys.pieces[color][j][i];
+}
+
+uint64_t walls_left_zobrist(Color color, uint walls){
+    return zobrist_keys.walls_left[color][walls];
+}
+
+uint64_t blue_to_move_zobrist(){
+    return zobrist_keys.blue_to_move;
 }
 
 
@@ -43,121 +91,281 @@ std::ostream &operator<<(std::ostream& os, Location l){
 }
 
 
-Board::Board():
-     red(RED,  Location(8,5),10)
-    ,blue(BLUE,Location(0,5),10)
-    ,walls(boost::extents[8][8])
-    ,squares(boost::extents[9][9])
-    ,N(9)
+Board::Board(uint N_, uint walls_):
+     red(RED,  Location(N_-1,N_/2),walls_,0)
+    ,blue(BLUE,Location(0,N_/2),walls_,N_-1)
+    ,N(N_)
+    ,walls_per_piece(walls_)
     ,turn(RED)
+    ,wall_key(0)
+    ,mirror_wall_key(0)
+    ,key(0)
+    ,mirror_key(0)
 {
-    std::fill_n(walls.data(),   walls.num_elements(), EMPTY);
-    std::fill_n(squares.data(), squares.num_elements(), 0);
-    
-    //now apply external boundaries to walls
-    for(uint i=0;i<9;i++){
-        squares[0][i] |= UP;
-        squares[8][i] |= DOWN;
-    }
+    if (N<3 or N>MAX_N)
+        throw std::invalid_argument("Board size must be between 3 and 11");
+    if (walls_>MAX_WALLS)
+        throw std::invalid_argument("Too many walls to hash");
     
-    for(uint j=0;j<9;j++){
-        squares[j][0] |= LEFT;
-        squares[j][8] |= RIGHT;
-    }
+    // every square can go every way, except off the edge of the board
+    const Bits all = square_bit(N*N)-1;
+    const Bits row = square_bit(N)-1;
+    Bits column = 0;
+    for(uint j=0;j<N;j++)
+        column |= square_bit(j*N);
+    exits[direction_slot(UP)]    = all&~row;
+    exits[direction_slot(DOWN)]  = all&~(row<<(N*(N-1)));
+    exits[direction_slot(LEFT)]  = all&~column;
+    exits[direction_slot(RIGHT)] = all&~(column<<(N-1));
+    rehash();
 }
 
-class legality_visitor : public boost::static_visitor<bool>{
-    const Board& board_;
-public:
-    legality_visitor(const Board& board):board_(board){}
-    
-    bool operator()(const WallCommand& c) const{
-        return board_.legalWall(c);
-    }
-    bool operator()(const MoveCommand& c) const{
-        Piece piece = board_.currentPiece();
-        return board_.legalMove(piece,c);
-    }
-    bool operator()(const HopCommand& c) const{
-        Piece piece = board_.currentPiece();
-        return board_.legalHop(piece,c);
+void Board::hash_piece(const Piece& piece){
+    const Location& l = piece.location;
+    const uint64_t walls_left = walls_left_zobrist(piece.color,piece.walls);
+    key ^= piece_zobrist(piece.color,l.j,l.i) ^ walls_left;
+    mirror_key ^= piece_zobrist(piece.color,l.j,N-1-l.i) ^ walls_left;
+}
+
+void Board::rehash(){
+    wall_key=mirror_wall_key=size_zobrist(N);
+    for(uint j=0;j<N-1;j++)
+        for(uint i=0;i<N-1;i++)
+            if (walls.get(j,i)!=EMPTY){
+                wall_key^=wall_zobrist(walls.get(j,i),j,i);
+                mirror_wall_key^=wall_zobrist(walls.get(j,i),j,N-2-i);
+            }
+    key=wall_key;
+    mirror_key=mirror_wall_key;
+    hash_piece(red);
+    hash_piece(blue);
+    if (turn==BLUE){
+        key^=blue_to_move_zobrist();
+        mirror_key^=blue_to_move_zobrist();
     }
-};
+}
 
 bool Board::legalCommand(const Command& command) const{
-    if (gameOver()) return false;
-    return boost::apply_visitor( legality_visitor(*this), command);
+    return legal(command_index(command,N));
 }
 
 
-bool canEscape(const Squares& squares, const Location& location, const uint target_rank, boost::multi_array<bool,2>& ignore){
+namespace {
+    // the index of a Bits' lowest set bit
+    inline uint lowest(Bits bits){
+        const uint64_t low = uint64_t(bits);
+        return low?__builtin_ctzll(low):64+__builtin_ctzll(uint64_t(bits>>64));
+    }
     
-    if (location.j==target_rank) return true;
+    // the squares one step from any of squares
+    inline Bits expand(const std::array<Bits,4>& exits, Bits squares, uint N){
+        return ((squares&exits[direction_slot(UP)])>>N)
+            | ((squares&exits[direction_slot(DOWN)])<<N)
+            | ((squares&exits[direction_slot(LEFT)])>>1)
+            | ((squares&exits[direction_slot(RIGHT)])<<1);
+    }
     
-    if (ignore[location.j][location.i]) return false;
-    ignore[location.j][location.i]=true;
-    const uint square = squares[location.j][location.i];
+    inline Bits goal_row(const Piece& piece, uint N){
+        return (square_bit(N)-1)<<((piece.color==RED?0:N-1)*N);
+    }
     
-    for(auto const& direction: directions) {
-        if (canMove(square,direction)){
-            Location target = locationFromDirection(location,direction);
-            if (canEscape(squares,target,target_rank,ignore)){
+    bool can_escape(const std::array<Bits,4>& exits, uint N, uint start, Bits goal){
+        Bits frontier=square_bit(start);
+        Bits reached=frontier;
+        while(frontier){
+            if (frontier&goal)
                 return true;
+            frontier=expand(exits,frontier,N)&~reached;
+            reached|=frontier;
+        }
+        return false;
+    }
+    
+    // wall slots, [0] horizontal and [1] vertical, bit j*(N-1)+i
+    typedef std::array<Bits,2> WallSlots;
+    
+    // adds the slots of the walls that would cut the step between a and b
+    void add_blocking(WallSlots& slots, uint a, uint b, uint N){
+        const uint M = N-1;
+        const uint low = std::min(a,b);
+        const uint j = low/N;
+        const uint i = low%N;
+        if (a+N==b or b+N==a){
+            if (i>0) slots[0]|=square_bit(j*M+i-1);
+            if (i<M) slots[0]|=square_bit(j*M+i);
+        }
+        else{
+            if (j>0) slots[1]|=square_bit((j-1)*M+i);
+            if (j<M) slots[1]|=square_bit(j*M+i);
+        }
+    }
+    
+    /*
+        The walls that would leave the piece no way to its goal.  A wall
+        can only do that if it cuts every route, and in particular any one
+        shortest route, so only the few walls across one need flood filling.
+    */
+    WallSlots trapping_walls(const Board& board, const Piece& piece){
+        const uint N = board.N;
+        const Bits goal = goal_row(piece,N);
+        
+        // BFS layers out from the piece, until one reaches the goal
+        Bits layers[MAX_N*MAX_N];
+        uint count=0;
+        Bits frontier=square_bit(piece.location.j*N+piece.location.i);
+        Bits reached=frontier;
+        while(frontier and not (frontier&goal)){
+            layers[count++]=frontier;
+            frontier=expand(board.exits,frontier,N)&~reached;
+            reached|=frontier;
+        }
+        if (not frontier){
+            // already stuck, so nothing makes it any worse
+            return WallSlots{~Bits(0),~Bits(0)};
+        }
+        
+        // and back down them, along one shortest route
+        WallSlots candidates{0,0};
+        uint at = lowest(frontier&goal);
+        while(count--){
+            for(auto direction: directions){
+                if (not (board.exits[direction_slot(direction)]&square_bit(at)))
+                    continue;
+                const Location l = locationFromDirection(Location(at/N,at%N),direction);
+                const uint next = l.j*N+l.i;
+                if (layers[count]&square_bit(next)){
+                    add_blocking(candidates,at,next,N);
+                    at=next;
+                    break;
+                }
             }
         }
+        
+        WallSlots trapping{0,0};
+        const uint M = N-1;
+        const uint start = piece.location.j*N+piece.location.i;
+        for(uint o=0;o<2;o++)
+            for(Bits slots=candidates[o];slots;slots&=slots-1){
+                const uint slot = lowest(slots);
+                std::array<Bits,4> exits = board.exits;
+                block(exits,o==0?HORIZONTAL:VERTICAL,slot/M,slot%M,N);
+                if (not can_escape(exits,N,start,goal))
+                    trapping[o]|=square_bit(slot);
+            }
+        return trapping;
     }
-    return false;
-}
-
-bool canEscape(const Squares& squares, const Piece& piece){
-    boost::multi_array<bool,2> ignore(boost::extents[9][9]);
-    std::fill_n(ignore.data(),   ignore.num_elements(), false);
     
+    /*
+        trapping_walls only depends on the walls and where the piece is, so
+        the answers are kept, keyed on both: siblings reached by the other
+        piece moving, and anywhere the same walls and square come up again,
+        look them up.  Direct mapped, one per thread.
+    */
+    class EscapeCache{
+        struct Entry{
+            uint64_t wall_key;
+            Color color;
+            uint location;
+            bool used;
+            WallSlots trapping;
+        };
+        std::vector<Entry> entries_;
+    public:
+        EscapeCache():entries_(4096){}
+        
+        WallSlots trapping(const Board& board, const Piece& piece){
+            const uint location = piece.location.j*board.N+piece.location.i;
+            const uint64_t key = board.wall_key
+                ^ piece_zobrist(piece.color,piece.location.j,piece.location.i);
+            Entry& entry = entries_[key&(entries_.size()-1)];
+            if (not (entry.used and entry.wall_key==board.wall_key
+                and entry.color==piece.color and entry.location==location)
+            )
+                entry = Entry{board.wall_key,piece.color,location,true,trapping_walls(board,piece)};
+            return entry.trapping;
+        }
+    };
     
-    uint target_rank = piece.color==RED?0:8; 
-    return canEscape(squares, piece.location, target_rank, ignore);
+    EscapeCache& escape_cache(){
+        thread_local EscapeCache cache;
+        return cache;
+    }
 }
 
-void apply_wall(Squares& squares, Wall orientation, uint j, uint i){
+void block(std::array<Bits,4>& exits, Wall orientation, uint j, uint i, uint N){
+    const uint a = j*N+i;
     if (orientation==HORIZONTAL){
-        squares[j][i]      |=  DOWN;
-        squares[j][i+1]    |=  DOWN;
-        squares[j+1][i]    |=  UP;
-        squares[j+=1][i+1] |=  UP;
+        exits[direction_slot(DOWN)] &= ~(square_bit(a)|square_bit(a+1));
+        exits[direction_slot(UP)]   &= ~(square_bit(a+N)|square_bit(a+N+1));
     }
     else{
-        squares[j][i]       |= RIGHT;
-        squares[j+1][i]     |= RIGHT;
-        squares[j][i+1]     |= LEFT;
-        squares[j+1][i+1]   |= LEFT;
+        exits[direction_slot(RIGHT)] &= ~(square_bit(a)|square_bit(a+N));
+        exits[direction_slot(LEFT)]  &= ~(square_bit(a+1)|square_bit(a+N+1));
     }
 }
-void apply_wall(Squares& squares, const WallCommand& c){
-    apply_wall(squares, c.orientation, c.location.j,c.location.i);
+bool Board::wall_fits(Wall orientation, uint j, uint i) const{
+    const uint M = N-1;
+    if (walls.get(j,i)) return false;
+    if (orientation==HORIZONTAL){
+        if (i>0   and walls.get(j,i-1)==HORIZONTAL) return false;
+        if (i<M-1 and walls.get(j,i+1)==HORIZONTAL) return false;
+    }
+    if (orientation==VERTICAL){
+        if (j>0   and walls.get(j-1,i)==VERTICAL)   return false;
+        if (j<M-1 and walls.get(j+1,i)==VERTICAL)   return false;
+    }
+    return true;
 }
+
 bool Board::legalWall(const WallCommand& c) const {
+    return legalWall(c.orientation,c.location.j,c.location.i);
+}
 
-    const uint M = 8;
+bool Board::legalWall(Wall orientation, uint j, uint i) const {
     if (not currentPiece().walls) return 0;
-    
-    uint j=c.location.j;
-    uint i = c.location.i;
-    if (walls[j][i]) return false;
-    if (c.orientation==HORIZONTAL){
-        if (i>0   and walls[j][i-1]==HORIZONTAL) return false;
-        if (i<M-1 and walls[j][i+1]==HORIZONTAL) return false;
-    }
-    if (c.orientation==VERTICAL){
-        if (j>0   and walls[j-1][i]==VERTICAL)   return false;
-        if (j<M-1 and walls[j+1][i]==VERTICAL)   return false;
-    }
+    if (not wall_fits(orientation,j,i)) return false;
 
-    Squares tmp_squares(this->squares);
+    // whether it would trap either piece, without touching the board
+    const uint slot = j*(N-1)+i;
+    const uint o = orientation==HORIZONTAL?0:1;
+    return not (escape_cache().trapping(*this,red)[o]&square_bit(slot))
+        and not (escape_cache().trapping(*this,blue)[o]&square_bit(slot));
+}
+
+bool Board::legal(Move move) const{
+    if (gameOver()) return false;
+    const MoveInfo& m = decode(move,N);
+    switch(m.kind){
+        case STEP:  return legalMove(currentPiece().location,m.d1);
+        case HOP:   return legalHop(currentPiece(),m.d1,m.d2);
+        default:    return legalWall(m.orientation,m.j,m.i);
+    }
+}
 
-    apply_wall(tmp_squares,c);
+MoveList Board::legal_moves() const{
+    MoveList moves;
+    if (gameOver()) return moves;
     
-    return  canEscape(tmp_squares, this->red) and canEscape(tmp_squares, this->blue);
+    const Piece& piece = currentPiece();
+    for(Move move=0;move<16;move++){
+        const MoveInfo& m = decode(move,N);
+        if (m.kind==STEP?legalMove(piece.location,m.d1):legalHop(piece,m.d1,m.d2))
+            moves.push_back(move);
+    }
+    if (not piece.walls) return moves;
     
+    // look the trapping walls up once, rather than once a slot
+    const uint M = N-1;
+    const WallSlots red_trapping = escape_cache().trapping(*this,red);
+    const WallSlots blue_trapping = escape_cache().trapping(*this,blue);
+    const WallSlots trapping{red_trapping[0]|blue_trapping[0],red_trapping[1]|blue_trapping[1]};
+    for(Move move=16;move<command_count(N);move++){
+        const MoveInfo& m = decode(move,N);
+        const uint o = m.orientation==HORIZONTAL?0:1;
+        if (wall_fits(m.orientation,m.j,m.i) and not (trapping[o]&square_bit(m.j*M+m.i)))
+            moves.push_back(move);
+    }
+    return moves;
 }
 
 
@@ -172,11 +380,7 @@ bool Board::legalMove(const Piece& piece, const MoveCommand& c) const {
 
 bool Board::legalMove(const Location& location, const Direction& direction, bool checkPieces) const{
 
-    uint j=location.j;
-    uint i = location.i;
-    uint square = this->squares[j][i];
-    
-    if (square & direction) return false;
+    if (not can_move(location,direction)) return false;
 
     if (checkPieces){
         Location target = locationFromDirection(location,direction);
@@ -194,61 +398,199 @@ inline bool perpendicular(Direction d1, Direction d2){
 }
 
 bool Board::legalHop(const Piece& piece, const HopCommand& c) const {
-    Location l1 = locationFromDirection(piece.location,c.d1);
+    return legalHop(piece,c.d1,c.d2);
+}
+
+bool Board::legalHop(const Piece& piece, Direction d1, Direction d2) const {
+    Location l1 = locationFromDirection(piece.location,d1);
     
     // square described by l1 MUST contain a piece.
     if (red.location!=l1 and blue.location!=l1) return false;
     
     // must be able to move to l1
-    if (not legalMove(piece.location,c.d1,false)) return false;
+    if (not legalMove(piece.location,d1,false)) return false;
     
     // if we CAN continue in the same direction, we MUST
-    if (legalMove(l1,c.d1))
-        return c.d2==c.d1;
+    if (legalMove(l1,d1))
+        return d2==d1;
     else
         // else d2 must be perpendicular to d1 AND
         // d1->d2 must be legal    
-        return perpendicular(c.d1,c.d2) and legalMove(l1,c.d2);
+        return perpendicular(d1,d2) and legalMove(l1,d2);
+}
+
+void Board::place_wall(Wall orientation, uint j, uint i){
+    walls.set(j,i,orientation);
+    //now block the moves across it
+    block(exits,orientation,j,i,N);
+    const uint64_t wall = wall_zobrist(orientation,j,i);
+    const uint64_t mirror_wall = wall_zobrist(orientation,j,N-2-i);
+    wall_key^=wall;
+    mirror_wall_key^=mirror_wall;
+    key^=wall;
+    mirror_key^=mirror_wall;
+}
+
+void Board::apply(const Command& command){
+    apply(Move(command_index(command,N)));
 }
 
-class command_visitor : public boost::static_visitor<>
+void Board::apply(Move move){
+    Piece& piece=currentPiece();
+    const MoveInfo& m = decode(move,N);
+    hash_piece(piece);
+    switch(m.kind){
+        case STEP:
+            piece.location = locationFromDirection(piece.location,m.d1);
+            break;
+        case HOP:
+            piece.location = locationFromDirection(piece.location,m.d1);
+            piece.location = locationFromDirection(piece.location,m.d2);
+            break;
+        default:
+            place_wall(m.orientation,m.j,m.i);
+            piece.walls-=1;
+    }
+    hash_piece(piece);
+    
+    this->turn = (this->turn==BLUE)?RED:BLUE;
+    key^=blue_to_move_zobrist();
+    mirror_key^=blue_to_move_zobrist();
+}
+
+namespace {
+    uint direction_index(Direction d){
+        switch(d){
+            case UP:    return 0;
+            case DOWN:  return 1;
+            case LEFT:  return 2;
+            default:    return 3;
+        }
+    }
+}
+
+class index_visitor : public boost::static_visitor<uint>
 {
-    Board& board_;
+    const uint M_;
 public:
-    command_visitor(Board& board):board_(board){
-        
+    index_visitor(uint N):M_(N-1){}
+    
+    uint operator()(const MoveCommand& c) const{
+        return direction_index(c.direction);
     }
-    void operator()(const WallCommand& c) const
-    {
-        /*
-            For fast lookups we store both 
-            the location of each wall AND the 
-            way that it affects each square
-        */
-        Piece& piece=board_.currentPiece();
-        board_.walls[c.location.j][c.location.i]=c.orientation;
-        
-        //now set walls on the four affected squares
-        apply_wall(board_.squares,c);
-        piece.walls-=1;
+    uint operator()(const HopCommand& c) const{
+        // three hops per first direction, leaving out going back
+        const uint first = direction_index(c.d1);
+        const uint second = direction_index(c.d2);
+        const uint back = first^1;
+        return 4 + 3*first + (second - (second>back?1:0));
     }
+    uint operator()(const WallCommand& c) const{
+        const uint slot = c.location.j*M_ + c.location.i;
+        return 16 + (c.orientation==HORIZONTAL?0:M_*M_) + slot;
+    }
+};
+
+uint command_index(const Command& command, uint N){
+    return boost::apply_visitor(index_visitor(N),command);
+}
+
+Direction mirror(Direction d){
+    switch(d){
+        case LEFT:  return RIGHT;
+        case RIGHT: return LEFT;
+        default:    return d;
+    }
+}
+
+class mirror_visitor : public boost::static_visitor<Command>
+{
+    const uint N_;
+public:
+    mirror_visitor(uint N):N_(N){}
     
-    void operator()(const MoveCommand& c) const
-    {
-        Piece& piece=board_.currentPiece();
-        piece.location = locationFromDirection(piece.location,c.direction);
-        
+    Command operator()(const WallCommand& c) const{
+        return WallCommand(Location(c.location.j,N_-2-c.location.i),c.orientation);
     }
-    void operator()(const HopCommand& c) const
-    {
-        Piece& piece=board_.currentPiece();
-        piece.location = locationFromDirection(piece.location,c.d1);
-        piece.location = locationFromDirection(piece.location,c.d2);
+    Command operator()(const MoveCommand& c) const{
+        return MoveCommand(mirror(c.direction));
+    }
+    Command operator()(const HopCommand& c) const{
+        return HopCommand(mirror(c.d1),mirror(c.d2));
     }
 };
 
-void Board::apply(const Command& command){
+Command mirror(const Command& command, uint N){
+    return boost::apply_visitor(mirror_visitor(N),command);
+}
+
+namespace {
+    // every command, in Move order
+    std::vector<Command> board_commands(uint N){
+        std::vector<Command> commands;
+        for(auto d: {UP,DOWN,LEFT,RIGHT})
+            commands.push_back(MoveCommand(d));
+        for(auto d1: {UP,DOWN,LEFT,RIGHT})
+            for(auto d2: {UP,DOWN,LEFT,RIGHT})
+                if (d1==d2 or perpendicular(d1,d2))
+                    commands.push_back(HopCommand(d1,d2));
+        for(auto o: {HORIZONTAL,VERTICAL})
+            for(uint j=0;j<N-1;j++)
+                for(uint i=0;i<N-1;i++)
+                    commands.push_back(WallCommand(Location(j,i),o));
+        return commands;
+    }
     
-    boost::apply_visitor( command_visitor(*this), command);
-    this->turn = (this->turn==BLUE)?RED:BLUE;
-}
\ No newline at end of file
+    class info_visitor : public boost::static_visitor<MoveInfo>
+    {
+    public:
+        MoveInfo operator()(const MoveCommand& c) const{
+            return MoveInfo{STEP,c.direction,c.direction,EMPTY,0,0};
+        }
+        MoveInfo operator()(const HopCommand& c) const{
+            return MoveInfo{HOP,c.d1,c.d2,EMPTY,0,0};
+        }
+        MoveInfo operator()(const WallCommand& c) const{
+            return MoveInfo{PLACE_WALL,UP,UP,c.orientation,
+                uint8_t(c.location.j),uint8_t(c.location.i)};
+        }
+    };
+    
+    std::array<MoveTable,MAX_N+1> move_tables(){
+        std::array<MoveTable,MAX_N+1> tables;
+        for(uint N=3;N<=MAX_N;N++)
+            for(const Command& command: board_commands(N)){
+                const Move move = command_index(command,N);
+                tables[N].info[move] = boost::apply_visitor(info_visitor(),command);
+                tables[N].mirrored[move] = command_index(mirror(command,N),N);
+            }
+        return tables;
+    }
+}
+
+const std::array<MoveTable,MAX_N+1> MOVE_TABLES = move_tables();
+
+Command to_command(Move move, uint N){
+    const MoveInfo& m = decode(move,N);
+    switch(m.kind){
+        case STEP:  return MoveCommand(m.d1);
+        case HOP:   return HopCommand(m.d1,m.d2);
+        default:    return WallCommand(Location(m.j,m.i),m.orientation);
+    }
+}
+
+Board mirror(const Board& board){
+    const uint N=board.N;
+    Board m(N,board.walls_per_piece);
+    m.red.location  = Location(board.red.location.j,  N-1-board.red.location.i);
+    m.blue.location = Location(board.blue.location.j, N-1-board.blue.location.i);
+    m.red.walls  = board.red.walls;
+    m.blue.walls = board.blue.walls;
+    m.turn = board.turn;
+    for(uint j=0;j<N-1;j++)
+        for(uint i=0;i<N-1;i++)
+            if (board.walls.get(j,i))
+                m.place_wall(board.walls.get(j,i),j,N-2-i);
+    m.rehash();
+    return m;
+}
@@ -2,11 +2,15 @@
 
 
 #include <list>
+#include <vector>
 #include <sstream>
-#include "boost/multi_array.hpp"
 #include <boost/variant.hpp>
 
 #include <set>
+#include <cstdint>
+#include <array>
+#include <type_traits>
+#include <algorithm>
 
 
 //not yet in C++!
@@ -18,6 +22,9 @@ bool contains(const std::set<T> s, const T& v){
 
 
 
+// boards can be any size up to this
+const uint MAX_N=11;
+
 enum Color { RED=1,  BLUE =0};
 enum Wall {EMPTY=0,HORIZONTAL=1, VERTICAL=-1};
 enum Direction {UP=0x01, RIGHT=0x02, DOWN=0x04, LEFT=0x08};
@@ -37,10 +44,55 @@ inline bool canMove(const uint square, const Direction& direction ){
     return not (square & direction) ;
 }
 
-typedef boost::multi_array<Wall, 2> walls_type;
-typedef boost::multi_array<uint,2> Squares;
+// one bit per square, bit j*N+i; 121 squares fit in 128 bits
+typedef unsigned __int128 Bits;
+
+inline Bits square_bit(uint index){
+    return Bits(1)<<index;
+}
+
+// 0 to 3 for UP, RIGHT, DOWN and LEFT
+inline uint direction_slot(Direction direction){
+    return __builtin_ctz(direction);
+}
+
+/*
+    Which wall, if any, is in each slot, in a fixed size grid so that a
+    Board is a plain value.  One byte a slot, so python can look at it as
+    a numpy array.
+*/
+struct Walls{
+    std::array<std::array<int8_t,MAX_N-1>,MAX_N-1> grid;
+    
+    Walls(){
+        for(auto& row: grid)
+            row.fill(EMPTY);
+    }
+    
+    inline Wall get(uint j, uint i) const{
+        return Wall(grid[j][i]);
+    }
+    inline void set(uint j, uint i, Wall wall){
+        grid[j][i]=wall;
+    }
+};
+typedef Walls walls_type;
+
+// clears the exits, as in Board::exits, that a wall closes
+void block(std::array<Bits,4>& exits, Wall orientation, uint j, uint i, uint N);
 
-void apply_wall(Squares& squares, Wall orientation, uint j, uint i);
+// Zobrist number for a wall in a slot; a board's wall_key is the XOR of these
+uint64_t wall_zobrist(Wall orientation, uint j, uint i);
+// and of this, so that boards of different sizes never share keys
+uint64_t size_zobrist(uint N);
+
+// wall counts above this can't be hashed
+const uint MAX_WALLS=32;
+// the rest of a board's key: where the pieces are, how many walls they have
+// left, and whose turn it is
+uint64_t piece_zobrist(Color color, uint j, uint i);
+uint64_t walls_left_zobrist(Color color, uint walls);
+uint64_t blue_to_move_zobrist();
 
 //could just be std::pair?
 struct Location{
@@ -86,6 +138,10 @@ struct WallCommand{
     Wall orientation;
     WallCommand(Location l, Wall o):
         location(l), orientation(o){}
+    
+    bool operator==(const WallCommand& rhs) const{
+        return location==rhs.location and orientation==rhs.orientation;
+    }
 };
 struct HopCommand{
     Direction d1;
@@ -95,6 +151,9 @@ struct HopCommand{
         d2(d2_)
         {}
     
+    bool operator==(const HopCommand& rhs) const{
+        return d1==rhs.d1 and d2==rhs.d2;
+    }
 };
 struct MoveCommand{
     Direction direction;
@@ -102,6 +161,9 @@ struct MoveCommand{
         direction(d)
         {}
     
+    bool operator==(const MoveCommand& rhs) const{
+        return direction==rhs.direction;
+    }
 };
 
 /*
@@ -122,6 +184,73 @@ std::ostream &operator<<(std::ostream& os, Location l);
 //Might be simpler to do this with py::object?
 typedef boost::variant<WallCommand, MoveCommand, HopCommand> Command;
 
+// commands numbered in the order of the python board.boardCommands(N): 4 moves,
+// 12 hops, then the horizontal and vertical walls, each in row order
+uint command_index(const Command& command, uint N);
+const uint MAX_COMMANDS = 16 + 2*(MAX_N-1)*(MAX_N-1);
+
+inline uint command_count(uint N){
+    return 16 + 2*(N-1)*(N-1);
+}
+
+/*
+    Commands as small numbers: a Move is a command_index, so 0 to 143 on a
+    standard board, and the same as python's index into
+    board.boardCommands(N).  The searches pass these around instead of
+    Commands, and decode them with a table lookup.
+*/
+typedef uint16_t Move;
+const Move NO_MOVE = 0xFFFF;
+
+enum MoveKind {STEP, HOP, PLACE_WALL};
+
+struct MoveInfo{
+    MoveKind kind;
+    Direction d1;       // steps and hops
+    Direction d2;       // hops
+    Wall orientation;   // walls
+    uint8_t j;
+    uint8_t i;
+};
+
+struct MoveTable{
+    std::array<MoveInfo,MAX_COMMANDS> info;
+    std::array<Move,MAX_COMMANDS> mirrored;
+};
+// by board size
+extern const std::array<MoveTable,MAX_N+1> MOVE_TABLES;
+
+inline const MoveInfo& decode(Move move, uint N){
+    return MOVE_TABLES[N].info[move];
+}
+
+Command to_command(Move move, uint N);
+
+// a list with room for CAPACITY items, that never allocates
+template <typename T, uint CAPACITY>
+class FixedList{
+    std::array<T,CAPACITY> items_;
+    uint size_;
+public:
+    FixedList():size_(0){}
+    
+    inline void push_back(const T& item){items_[size_++]=item;}
+    inline void pop_back(){size_--;}
+    inline T& back(){return items_[size_-1];}
+    inline void clear(){size_=0;}
+    inline uint size() const {return size_;}
+    inline bool empty() const {return size_==0;}
+    
+    inline T& operator[](uint k){return items_[k];}
+    inline const T& operator[](uint k) const {return items_[k];}
+    inline T* begin(){return items_.data();}
+    inline T* end(){return items_.data()+size_;}
+    inline const T* begin() const {return items_.data();}
+    inline const T* end() const {return items_.data()+size_;}
+};
+
+typedef FixedList<Move,MAX_COMMANDS> MoveList;
+
 
 
 class Piece{
@@ -131,11 +260,18 @@ public:
     Color color;
     Location location;
     uint walls;
-    Piece(Color c, Location l, uint w):
+    // the row it's racing to
+    uint goal;
+    Piece(Color c, Location l, uint w, uint g):
          color(c)
         ,location(l)
         ,walls(w)
+        ,goal(g)
     {}
+    
+    inline bool hasWon() const{
+        return location.j==goal;
+    }
         
     void reset(Location l){
         this->location = l;
@@ -144,24 +280,48 @@ public:
 };
 
 
+/*
+    Fixed size and trivially copyable, so that copying one for every
+    search node is just a memcpy.
+*/
 struct Board{
     Piece red;
     Piece blue;
     
     walls_type walls;
-    Squares squares;
-    const uint N;
+    // not const, so that a saved copy can be assigned back
+    uint N;
+    uint walls_per_piece;
     Color turn;
+    
+    // Zobrist key of just the wall set, kept up to date by place_wall
+    uint64_t wall_key;
+    // the same for the wall set's left-right mirror image
+    uint64_t mirror_wall_key;
+    // the squares a piece can leave in each direction, by direction_slot,
+    // kept up to date by place_wall; walls and the edge of the board block
+    std::array<Bits,4> exits;
+    
+    // Zobrist key of the whole position, and of its mirror image, kept up
+    // to date by apply and place_wall
+    uint64_t key;
+    uint64_t mirror_key;
      
-    Board();
+    Board(uint N=9, uint walls=10);
     
     // void reset();
     
     bool legalCommand(const Command& c) const;
     bool legalWall(const WallCommand& c) const;
+    bool legalWall(Wall orientation, uint j, uint i) const;
     bool legalMove(const Piece& piece, const MoveCommand& c) const;
     bool legalMove(const Location& location, const Direction& d, bool checkPieces=true) const;
     bool legalHop(const Piece& piece, const HopCommand& c) const;
+    bool legalHop(const Piece& piece, Direction d1, Direction d2) const;
+    
+    bool legal(Move move) const;
+    // all the legal moves, in Move order
+    MoveList legal_moves() const;
         
     
     inline Piece& currentPiece(){
@@ -171,9 +331,51 @@ struct Board{
         return  (RED==turn)?red:blue;
     }
     
+    // whether there's no wall or edge in the way, ignoring pieces
+    inline bool can_move(const Location& location, Direction direction) const{
+        return exits[direction_slot(direction)]&square_bit(location.j*N+location.i);
+    }
+    
     inline bool gameOver() const{
-        return red.location.j==0 or blue.location.j==8;
+        return red.hasWon() or blue.hasWon();
     }
     
+    // sets walls, exits and the keys; doesn't check anything
+    void place_wall(Wall orientation, uint j, uint i);
+    
     void apply(const Command& c);
-}; 
\ No newline at end of file
+    void apply(Move move);
+    
+    // works the keys out from scratch, for after the pieces or turn have
+    // been set by hand
+    void rehash();
+    
+    // the smaller of key and mirror_key, the same for a position and its
+    // mirror image
+    inline uint64_t canonical_key() const{
+        return std::min(key,mirror_key);
+    }
+    inline bool is_canonical() const{
+        return key<=mirror_key;
+    }
+private:
+    // toggles a piece's location and walls left in the keys
+    void hash_piece(const Piece& piece);
+    // whether a wall fits in the slot, whether or not it traps anyone
+    bool wall_fits(Wall orientation, uint j, uint i) const;
+};
+
+static_assert(std::is_trivially_copyable<Board>::value,
+    "Board is copied a lot by the searches, so should stay a plain block of memory");
+
+/*
+    Left-right mirror images, reflecting in the centre file.  A position
+    and its mirror image are equally good for the same player, so caches
+    only need to store one of them.
+*/
+Direction mirror(Direction d);
+Command mirror(const Command& command, uint N=9);
+inline Move mirror(Move move, uint N){
+    return MOVE_TABLES[N].mirrored[move];
+}
+Board mirror(const Board& board); 
\ No newline at end of file
@@ -4,121 +4,105 @@
 #include <list>
 #include <iostream>
 #include <cmath>
+#include <algorithm>
+#include <thread>
 using std::cout; 
 using std::endl;
 using boost::optional;
 
 namespace {
-    //not sure how else I get an iterable?
-    const std::vector<Direction> directions = {UP,RIGHT,LEFT,DOWN};
     const double inf = std::numeric_limits<double>::infinity();
 
 }
 
 
-std::vector<Command> allCommands(){
-    std::vector<Command> move_commands = {
-        MoveCommand(UP),
-        MoveCommand(DOWN),
-        MoveCommand(LEFT),
-        MoveCommand(RIGHT),
-    };
+Board apply(const Board& board, Move move){
+    Board copy = board;
+    copy.apply(move);
+    return copy;
+}
 
-    std::vector<Command> hop_commands={
-        HopCommand(UP,UP),HopCommand(UP,LEFT),HopCommand(UP,RIGHT),
-        HopCommand(DOWN,DOWN),HopCommand(DOWN,LEFT),HopCommand(DOWN,RIGHT),
-        HopCommand(LEFT,UP),HopCommand(LEFT,DOWN),HopCommand(LEFT,LEFT),
-        HopCommand(RIGHT,UP),HopCommand(RIGHT,DOWN),HopCommand(RIGHT,RIGHT)
-    };
-    
-    std::vector<Command> wall_commands;
-    for(uint j=0;j<8;j++){
-        for(uint i=0;i<8;i++)
-        {
-            wall_commands.push_back(WallCommand(Location(j,i),VERTICAL));
-            wall_commands.push_back(WallCommand(Location(j,i),HORIZONTAL));
-        }
+namespace{
+    // whether a wall is on one of the edges of the square
+    bool next_to(const MoveInfo& wall, const Location& location){
+        // unsigned, so squares above or left of the wall wrap to big numbers
+        return location.j-wall.j<2 and location.i-wall.i<2;
     }
-    
-    std::vector<Command> commands;
-    
-    //is this correct?
-    
-    commands.insert(commands.end(), move_commands.begin(), move_commands.end());
-    commands.insert(commands.end(), hop_commands.begin(), hop_commands.end());
-    commands.insert(commands.end(), wall_commands.begin(), wall_commands.end());
-    return commands;
 }
 
-//only want to calculate this once!
-std::vector<Command> ALL_COMMANDS=allCommands();
-
-
-Board apply(const Board& board, const Command& command){
-    Board copy = board; // probably need a copy constructor?
-    copy.apply(command);
-    return copy;
+MoveList BaseBot::legal_moves(const Board& board){
+    const MoveList moves = board.legal_moves();
+    // a piece that can't move still has to be able to do something
+    if (not selective or moves.empty() or decode(moves[0],board.N).kind==PLACE_WALL)
+        return moves;
     
+    const Piece& other = board.turn==RED?board.blue:board.red;
+    const PathSquares path = shortest_path_squares(board,other);
+    MoveList selected;
+    for(Move move: moves){
+        const MoveInfo& m = decode(move,board.N);
+        if (m.kind!=PLACE_WALL
+            or path_cuts(board,path,m.orientation,m.j,m.i)
+            or next_to(m,board.red.location)
+            or next_to(m,board.blue.location)
+        )
+            selected.push_back(move);
+    }
+    return selected;
 }
 
 std::vector<Command> BaseBot::legal_commands(const Board& board){
-    std::vector<Command> legalCommands;
-
-    std::copy_if (
-        ALL_COMMANDS.begin(), 
-        ALL_COMMANDS.end(), 
-        std::back_inserter(legalCommands), 
-        [&board](const Command& c){
-            return board.legalCommand(c);
-        } 
-    );
-    return legalCommands;
+    std::vector<Command> commands;
+    for(Move move: legal_moves(board))
+        commands.push_back(to_command(move,board.N));
+    return commands;
 }
 
 double BaseBot::evaluate(const Board& board) const{
     throw std::runtime_error("Don't call BaseBot::evaluate");
 }
 
-Command BaseBot::call(const Board& board){
+Move BaseBot::move(const Board& board){
     
-    std::vector<Command> legalCommands=legal_commands(board);
+    const MoveList legalMoves=legal_moves(board);
     
-    if (legalCommands.size()==0){
+    if (legalMoves.empty()){
         throw std::runtime_error("No legal commands left");
     }
-    Command best_command=legalCommands.at(0);
+    Move best_move=legalMoves[0];
     bool maximize = board.turn==RED;
     double best_score=maximize?-999999:999999;
     
-    for(auto const& command: legalCommands){
-        const Board child = apply(board,command);
+    for(Move move: legalMoves){
+        const Board child = apply(board,move);
  
         double score = this->evaluate(child);
         
         if (maximize){
             if (score>=best_score){
-                best_command=command;
+                best_move=move;
                 best_score=score;
             }
         }
         else{
             if (score<best_score){
-                best_command=command;
+                best_move=move;
                 best_score=score;
             }
         }
      
     }
-    return best_command;
+    return best_move;
 }
 
 double StepsBot2::evaluate(const Board& board) const{
     double inf = std::numeric_limits<double>::infinity();
     if (board.red.location.j==0)  return inf;
-    if (board.blue.location.j==8) return -inf;
+    if (board.blue.location.j==board.N-1) return -inf;
     
-    double r  = 0.5+  stepsToEscape(board,board.red);
-    double b  = 0.5+  stepsToEscape(board,board.blue);
+    const std::array<int,2> steps = distances(board);
+    double r  = 0.5+  steps[0];
+    double b  = 0.5+  steps[1];
     return (r<b)?( b/r -1):(1 -(r/b));
 }
 
@@ -131,8 +115,9 @@ double StepsBot3::evaluate(const Board& board) const{
     double wall_score = diff*diff*diff; // how do we cube stuff in C++
     
     
-    uint red_distance  = 1+stepsToEscape(board,board.red);
-    uint blue_distance = 1+stepsToEscape(board,board.blue);
+    const std::array<int,2> steps = distances(board);
+    uint red_distance  = 1+steps[0];
+    uint blue_distance = 1+steps[1];
     
     if(board.turn==RED)
         blue_distance+=1;
@@ -144,123 +129,506 @@ double StepsBot3::evaluate(const Board& board) const{
 }
 
 
-int stepsToEscape(const Board& board, const Piece& piece){
-    const Squares squares = board.squares;
-    
+namespace{
+    // writes steps into the field for every square in squares
+    void fill(DistanceField& field, Bits squares, uint8_t steps){
+        uint64_t low = uint64_t(squares);
+        uint64_t high = uint64_t(squares>>64);
+        for(;low;low&=low-1)
+            field[__builtin_ctzll(low)]=steps;
+        for(;high;high&=high-1)
+            field[64+__builtin_ctzll(high)]=steps;
+    }
+}
+
+DistanceFields distance_fields(const Board& board){
+    DistanceFields fields;
+    const uint N = board.N;
+    const Bits up    = board.exits[direction_slot(UP)];
+    const Bits down  = board.exits[direction_slot(DOWN)];
+    const Bits left  = board.exits[direction_slot(LEFT)];
+    const Bits right = board.exits[direction_slot(RIGHT)];
     
-    boost::multi_array<bool,2> checked(boost::extents[9][9]);
-    std::fill_n(checked.data(),   checked.num_elements(), false);
+    for(uint goal=0;goal<2;goal++){
+        DistanceField& field=fields[goal];
+        field.fill(UNREACHABLE);
+        
+        // out from the whole goal row; walls block both ways, so the
+        // squares one step further out are those that can step in
+        const uint target_rank = goal==0?0:N-1;
+        Bits frontier = ((square_bit(N)-1)<<(target_rank*N));
+        Bits reached = frontier;
+        for(uint8_t steps=0;frontier;steps++){
+            fill(field,frontier,steps);
+            const Bits next = ((frontier&up)>>N) | ((frontier&down)<<N)
+                | ((frontier&left)>>1) | ((frontier&right)<<1);
+            frontier = next&~reached;
+            reached |= frontier;
+        }
+    }
+    return fields;
+}
+
+DistanceCache::DistanceCache(uint bits):entries_(size_t(1)<<bits),mask_((size_t(1)<<bits)-1),used_(0),hits(0),misses(0){
+    clear();
+}
+
+const DistanceFields& DistanceCache::get(const Board& board){
+    const bool mirrored = fields_mirrored(board);
+    const uint64_t key = mirrored?board.mirror_wall_key:board.wall_key;
+    Entry& entry = entries_[key&mask_];
+    if (entry.used and entry.key==key){
+        hits+=1;
+        return entry.fields;
+    }
     
-    uint target_rank = piece.color==RED?0:8;
+    misses+=1;
+    used_+=not entry.used;
+    entry.key=key;
+    entry.used=true;
+    entry.fields = distance_fields(board);
+    if (mirrored)
+        for(auto& field: entry.fields)
+            for(uint j=0;j<board.N;j++)
+                std::reverse(field.begin()+j*board.N, field.begin()+(j+1)*board.N);
+    return entry.fields;
+}
+
+void DistanceCache::clear(){
+    for(auto& entry: entries_)
+        entry.used=false;
+    used_=0;
+}
+
+DistanceCache& distance_cache(){
+    thread_local DistanceCache cache;
+    return cache;
+}
+
+std::array<int,2> distances(const Board& board){
+    const DistanceFields& fields=distance_cache().get(board);
+    const std::array<int,2> steps = {
+        fields[0][field_index(board,board.red.location)],
+        fields[1][field_index(board,board.blue.location)]
+    };
+    if (steps[0]==UNREACHABLE or steps[1]==UNREACHABLE)
+        throw std::runtime_error("no way out");
+    return steps;
+}
+
+int stepsToEscape(const Board& board, const Piece& piece){
+    const DistanceFields& fields=distance_cache().get(board);
+    const uint8_t steps = fields[piece.color==RED?0:1][field_index(board,piece.location)];
     
-    std::set<Location> neighbours;
-    for(uint i=0;i<9;i++)
-        neighbours.insert(Location(target_rank,i));
+    //this is a problem
+    if (steps==UNREACHABLE)
+        throw std::runtime_error("no way out");
+    return steps;
+}
+
+TranspositionTable::TranspositionTable(uint bits):generation_(1){
+    if (bits>30)
+        throw std::invalid_argument("Transposition table too big");
+    entries_.resize(size_t(1)<<bits);
+    mask_ = entries_.size()-1;
+    clear();
+}
+
+bool TranspositionTable::get(uint64_t key, Entry& entry) const{
+    std::lock_guard<std::mutex> guard(lock(key));
+    const Entry& slot = entries_[key&mask_];
+    if (not (slot.generation and slot.key==key))
+        return false;
+    entry = slot;
+    return true;
+}
+
+void TranspositionTable::store(uint64_t key, uint depth, Bound bound, double score, Move move){
+    std::lock_guard<std::mutex> guard(lock(key));
+    Entry& old = entries_[key&mask_];
+    if (old.generation==0
+        or old.key==key
+        or old.generation!=generation_
+        or depth>=old.depth
+    )
+        old = Entry{key,score,move,depth,bound,generation_};
+}
+
+void TranspositionTable::new_search(){
+    generation_+=1;
+}
+
+void TranspositionTable::clear(){
+    std::fill(entries_.begin(),entries_.end(),Entry{0,0,NO_MOVE,0,EXACT,0});
+}
+
+size_t TranspositionTable::used() const{
+    return std::count_if(entries_.begin(),entries_.end(),[](const Entry& entry){
+        return entry.generation!=0;
+    });
+}
+
+const uint MAX_AB_CALLS=20000;
+
+AlphaBetaBot::AlphaBetaBot(const AlphaBetaBot& main, uint id, const std::atomic<bool>* stop)
+    :BaseBot(main.selective),ab_calls_(0),aborted_(false),timed_(main.timed_),deadline_(main.deadline_)
+    ,following_pv_(false),table_(main.table_)
+    ,threads_(1),first_depth_(1+id%2),stop_(stop),helper_nodes_(0)
+    ,best_move_(NO_MOVE),maxDepth_(main.maxDepth_),depth_(0)
+{
     
-    uint steps = 0;
+}
+
+Move AlphaBetaBot::move(const Board& board){
+    timed_=false;
+    return threads_>1?parallel_search(board):search(board);
+}
+
+Move AlphaBetaBot::move(const Board& board, uint time_ms){
+    timed_=true;
+    deadline_=Clock::now()+std::chrono::milliseconds(time_ms);
+    return threads_>1?parallel_search(board):search(board);
+}
+
+Move AlphaBetaBot::parallel_search(const Board& board){
+    table_->new_search();
     
+    std::atomic<bool> stop(false);
+    std::vector<std::unique_ptr<AlphaBetaBot>> helpers;
+    std::vector<Move> answers(threads_-1,NO_MOVE);
+    std::vector<std::exception_ptr> errors(threads_-1);
+    std::vector<std::thread> workers;
+    // all built before any thread starts, so they never move under one
+    for(uint k=1;k<threads_;k++)
+        helpers.emplace_back(new AlphaBetaBot(*this,k,&stop));
     
-    for(auto it=0;it<81;it++){
-        for(auto const& neighbour: neighbours){
-            
-            checked[neighbour.j][neighbour.i]=true;
-            if (neighbour==piece.location) return steps;
-        }
-        
-        //rebuild neighbours...
-        std::set<Location> n2;
-        for(auto const& neighbour: neighbours){
-            const uint square = squares[neighbour.j][neighbour.i];
-            for(auto const& direction: directions) {
-                if (canMove(square,direction)){
-                    const Location target = locationFromDirection(neighbour,direction);
-                    if (not checked[target.j][target.i]){
-                        n2.insert(target);
-                    }
+    // threads still running when they're destroyed would end the process
+    auto finish = [&](){
+        stop = true;
+        for(auto& worker: workers)
+            worker.join();
+    };
+    Move move;
+    try{
+        for(uint k=0;k<helpers.size();k++){
+            AlphaBetaBot* helper = helpers[k].get();
+            workers.emplace_back([&answers,&errors,&board,helper,k](){
+                try{
+                    answers[k] = helper->search(board);
                 }
-                
-            }
+                catch(...){
+                    errors[k] = std::current_exception();
+                }
+            });
         }
-        neighbours=n2;
-        steps+=1;
         
+        // the helpers are only any use while we're searching
+        move = search(board);
     }
-    //this is a problem
-    throw std::runtime_error("no way out");
+    catch(...){
+        finish();
+        throw;
+    }
+    finish();
+    for(auto& error: errors)
+        if (error)
+            std::rethrow_exception(error);
     
+    helper_nodes_=0;
+    for(uint k=0;k<helpers.size();k++){
+        helper_nodes_+=helpers[k]->ab_calls_;
+        if (answers[k]!=NO_MOVE and helpers[k]->depth_>depth_){
+            depth_=helpers[k]->depth_;
+            move=answers[k];
+        }
+    }
+    return move;
+}
+
+bool AlphaBetaBot::out_of_time(){
+    if (stop_ and stop_->load(std::memory_order_relaxed))
+        return true;
+    if (timed_)
+        return Clock::now()>=deadline_;
+    return ab_calls_>=MAX_AB_CALLS;
 }
 
-Command AlphaBetaBot::call(const Board& board){
+Move AlphaBetaBot::search(const Board& position){
+    if (position.gameOver())
+        throw std::runtime_error("Game over, dude!");
+    // a search that's stopped before it finds anything mustn't hand back
+    // the last move's answer
+    this->best_move_=NO_MOVE;
     this->ab_calls_=0;
-    best_command_ = boost::optional<Command>();
-    this->alphabeta(board,this->maxDepth_,-inf,inf);
+    this->aborted_=false;
+    this->depth_=0;
+    this->helper_nodes_=0;
+    // parallel_search has already started the helpers' search
+    if (not stop_ and threads_==1)
+        table_->new_search();
+    
+    // the pieces or turn may have been set by hand since the keys were
+    Board board(position);
+    board.rehash();
+    
+    // killers and history carry over from one iteration to the next, but
+    // not from one move to the next
+    for(auto& killers: killers_)
+        killers.fill(NO_MOVE);
+    for(auto& history: history_)
+        history.fill(0);
+    previous_pv_.clear();
+    
+    Move completed = NO_MOVE;
+    const uint maxDepth = std::min(maxDepth_, MAX_PLY-1);
+    for(uint depth=std::min(first_depth_,maxDepth);depth<=maxDepth;depth++){
+        following_pv_ = true;
+        this->alphabeta(board,depth,-inf,inf,0);
+        if (aborted_){
+            // a partial iteration's move is only better than nothing
+            if (completed==NO_MOVE)
+                completed = best_move_;
+            break;
+        }
+        completed = best_move_;
+        previous_pv_ = pv_[0];
+        depth_ = depth;
+    }
     
-    if(not best_command_)
-        throw std::runtime_error("Couldn't compute a command");
-    return *best_command_;
+    if(completed==NO_MOVE){
+        const MoveList legalMoves=legal_moves(board);
+        if (legalMoves.empty())
+            throw std::runtime_error("Couldn't compute a command");
+        completed = legalMoves[0];
+    }
+    return completed;
 }
 
-const uint MAX_AB_CALLS=20000;
-double AlphaBetaBot::alphabeta(const Board& board, uint depth, double alpha, double beta){
+PathSquares shortest_path_squares(const Board& board, const Piece& piece){
+    const DistanceField& field = distance_cache().get(board)[piece.color==RED?0:1];
+    const uint N = board.N;
+    PathSquares path;
+    path.fill(UNREACHABLE);
+    
+    // walk downhill from the piece, through every square one step nearer;
+    // a square is only pushed when it's first marked, so each fits once
+    FixedList<uint8_t,MAX_N*MAX_N> stack;
+    stack.push_back(piece.location.j*N+piece.location.i);
+    path[piece.location.j*N+piece.location.i]=field[field_index(board,piece.location)];
+    while(not stack.empty()){
+        const Location square(stack.back()/N,stack.back()%N);
+        stack.pop_back();
+        const uint8_t steps = path[square.j*N+square.i];
+        if (steps==0 or steps==UNREACHABLE)
+            continue;
+        for(auto direction: {UP,DOWN,LEFT,RIGHT}){
+            if (not board.can_move(square,direction))
+                continue;
+            const Location next = locationFromDirection(square,direction);
+            if (field[field_index(board,next)]!=steps-1 or path[next.j*N+next.i]!=UNREACHABLE)
+                continue;
+            path[next.j*N+next.i]=steps-1;
+            stack.push_back(next.j*N+next.i);
+        }
+    }
+    return path;
+}
+
+uint path_cuts(const Board& board, const PathSquares& path, Wall orientation, uint j, uint i){
+    const uint N = board.N;
+    // the two pairs of squares the wall would come between
+    const uint a = j*N+i;
+    const uint b = orientation==HORIZONTAL?a+N:a+1;
+    const uint c = orientation==HORIZONTAL?a+1:a+N;
+    const uint d = b+(c-a);
+    // both ends on a path, one step apart, is a step on one
+    auto step = [&path](uint x, uint y){
+        return path[x]!=UNREACHABLE and path[y]!=UNREACHABLE
+            and (path[x]==path[y]+1 or path[y]==path[x]+1);
+    };
+    return step(a,b) + step(c,d);
+}
+
+namespace{
+    // move ordering scores, in decreasing order of priority
+    const double PV_SCORE = 1e12;
+    const double KILLER_SCORE = 1e11;
+    const double GAIN_SCORE = 1e9;
+    
+    // where a step or hop takes a piece
+    Location target(const Location& from, const MoveInfo& m){
+        const Location next = locationFromDirection(from,m.d1);
+        return m.kind==HOP?locationFromDirection(next,m.d2):next;
+    }
+}
+
+void AlphaBetaBot::move_order(
+    const Board& board,
+    MoveList& moves,
+    uint ply,
+    Move table_move,
+    bool& pv_first
+){
+    const Piece& mine = board.currentPiece();
+    const Piece& theirs = board.turn==RED?board.blue:board.red;
+    const DistanceField& my_field = distance_cache().get(board)[mine.color==RED?0:1];
+    const int my_steps = my_field[field_index(board,mine.location)];
+    const auto& killers = killers_[ply];
+    const auto& history = history_[board.turn];
+    const bool on_pv = following_pv_ and ply<previous_pv_.size();
+    
+    // a wall can only lengthen a piece's way home if it cuts a step on one
+    // of its shortest paths, so this is much cheaper than trying them all
+    const PathSquares my_path = shortest_path_squares(board,mine);
+    const PathSquares their_path = shortest_path_squares(board,theirs);
+    
+    // ties stay in Move order
+    struct Scored{
+        double score;
+        uint k;
+        bool operator<(const Scored& other) const{
+            return score>other.score or (score==other.score and k<other.k);
+        }
+    };
+    std::array<Scored,MAX_COMMANDS> scored;
+    
+    pv_first = false;
+    for(uint k=0;k<moves.size();k++){
+        const Move move = moves[k];
+        double& score = scored[k].score;
+        scored[k].k = k;
+        if (on_pv and move==previous_pv_[ply]){
+            score = PV_SCORE+1;
+            pv_first = true;
+            continue;
+        }
+        if (move==table_move){
+            score = PV_SCORE;
+            continue;
+        }
+        if (move==killers[0]){
+            score = KILLER_SCORE+1;
+            continue;
+        }
+        if (move==killers[1]){
+            score = KILLER_SCORE;
+            continue;
+        }
+        score = history[move];
+        
+        // then moves that get us nearer home and walls in the other piece's
+        // way, ahead of ones that change nothing
+        const MoveInfo& m = decode(move,board.N);
+        int gain;
+        if (m.kind==PLACE_WALL)
+            gain = int(path_cuts(board,their_path,m.orientation,m.j,m.i))
+                -int(path_cuts(board,my_path,m.orientation,m.j,m.i));
+        else
+            gain = my_steps-my_field[field_index(board,target(mine.location,m))];
+        if (gain>0)
+            score += GAIN_SCORE*gain;
+    }
+    
+    std::sort(scored.begin(),scored.begin()+moves.size());
+    const MoveList unordered = moves;
+    for(uint k=0;k<moves.size();k++)
+        moves[k]=unordered[scored[k].k];
+}
+
+void AlphaBetaBot::cutoff(const Board& board, Move move, uint depth, uint ply){
+    auto& killers = killers_[ply];
+    if (move!=killers[0]){
+        killers[1] = killers[0];
+        killers[0] = move;
+    }
+    history_[board.turn][move] += depth*depth;
+}
+
+double AlphaBetaBot::alphabeta(const Board& board, uint depth, double alpha, double beta, uint ply){
+    pv_[ply].clear();
     
     if(depth==0)
         return evalbot_.evaluate(board);
     if (board.gameOver())
         return evalbot_.evaluate(board);
-        
+    
+    // a position and its mirror image share an entry, which holds the best
+    // move for the canonical one
+    const uint64_t key = board.canonical_key();
+    const bool mirrored = not board.is_canonical();
+    TranspositionTable::Entry entry;
+    const bool found = table_->get(key,entry);
+    Move table_move = NO_MOVE;
+    if (found and entry.move!=NO_MOVE)
+        table_move = mirrored?mirror(entry.move,board.N):entry.move;
+    // the root always searches, so that it has a move to answer with
+    if (found and entry.depth>=depth and ply>0){
+        if (entry.bound==EXACT)
+            return entry.score;
+        if (entry.bound==LOWER)
+            alpha=std::max(alpha,entry.score);
+        else
+            beta=std::min(beta,entry.score);
+        if (beta<=alpha)
+            return entry.score;
+    }
+    
     this->ab_calls_+=1;
+    const double alpha0=alpha;
+    const double beta0=beta;
     
-    std::vector<Command> legalCommands=legal_commands(board);
+    MoveList legalMoves=legal_moves(board);
     //If we don't have any legal commands, we're kinda screwed
     
-    if (legalCommands.size()==0){
+    if (legalMoves.empty()){
         std::stringstream s;
         s << "No legal commands left for AlphaBetaBot to evaluate.  Depth is " << depth << ", ab_calls_ is " << ab_calls_
             << "turn is " << board.turn;
         throw std::runtime_error(s.str());
     }
     
-    if (board.turn==RED){
-        double v = -inf;
-        Command best_command=legalCommands.at(0);
-        
-        for(auto const& command: legalCommands){
-            Board child = apply(board,command);
-            double score = alphabeta(child,depth-1,alpha,beta);
-            if (score > v){
-                v=score;
-                best_command=command;
-            }
-            alpha=std::max(alpha,v);
-            if (beta<=alpha)
-                break;
-            if (ab_calls_>=MAX_AB_CALLS){
-                std::cout << "MAX_AB_CALLS" << endl;
-                break;
-            }
+    bool pv_first;
+    move_order(board,legalMoves,ply,table_move,pv_first);
+    const bool on_pv = following_pv_;
+    
+    const bool red = board.turn==RED;
+    double v = red?-inf:inf;
+    Move best = legalMoves[0];
+    for(uint n=0;n<legalMoves.size();n++){
+        const Move move = legalMoves[n];
+        // only the first child of a node on the last principal variation
+        // is on it too
+        following_pv_ = on_pv and pv_first and n==0;
+        Board child = apply(board,move);
+        double score = alphabeta(child,depth-1,alpha,beta,ply+1);
+        if (n==0 or (red?score>v:score<v)){
+            v=score;
+            best=move;
+            pv_[ply].clear();
+            pv_[ply].push_back(move);
+            for(Move next: pv_[ply+1])
+                pv_[ply].push_back(next);
         }
-        best_command_=best_command;
-        return v;
-    }
-    else{ // BLUE
-        double v = inf;
-        Command best_command=legalCommands.at(0);
-        for(auto const& command: legalCommands){
-            Board child = apply(board,command);
-            double score = alphabeta(child,depth-1,alpha,beta);
-            if(score<v){
-                v=score;
-                best_command=command;
-            }
+        if (red)
+            alpha=std::max(alpha,v);
+        else
             beta=std::min(beta,v);
-            if(beta<=alpha)
-                break;
-            if (ab_calls_>=MAX_AB_CALLS){
-                std::cout << "MAX_AB_CALLS" << endl;
-                break;
-            }
+        if (beta<=alpha){
+            cutoff(board,move,depth,ply);
+            break;
         }
-        best_command_=best_command;
-        return v;
+        if (aborted_ or (aborted_=out_of_time()))
+            break;
     }
-}
\ No newline at end of file
+    following_pv_ = false;
+    
+    if (ply==0)
+        best_move_=best;
+    
+    // a partial search's score isn't worth keeping
+    if (not aborted_){
+        const Bound bound = v<=alpha0?UPPER:(v>=beta0?LOWER:EXACT);
+        table_->store(key,depth,bound,v,mirrored?mirror(best,board.N):best);
+    }
+    return v;
+}
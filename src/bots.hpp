@@ -1,9 +1,28 @@
 #include "board.hpp"
 #include "boost/optional.hpp"
+#include <array>
+#include <chrono>
+#include <atomic>
+#include <memory>
+#include <mutex>
 class BaseBot{
 public:
-    virtual Command call(const Board& board);
+    // only generate the walls that could change the race; see legal_commands
+    bool selective;
+    
+    BaseBot(bool selective=false):selective(selective){}
+    
+    virtual Move move(const Board& board);
+    Command call(const Board& board){
+        return to_command(move(board),board.N);
+    }
     virtual double evaluate(const Board& board) const;
+    /*
+        Pawn moves, then walls, in Move order.  If selective, only the walls
+        that cut a step on one of the other piece's shortest paths (nothing
+        else can slow it down) or that are right next to a piece.
+    */
+    MoveList legal_moves(const Board& board);
     std::vector<Command> legal_commands(const Board& board);
 };
 
@@ -20,20 +39,216 @@ public:
 
 
 
+const uint MAX_PLY=64;
+
+enum Bound {
+    EXACT,
+    LOWER,  // the search failed high, so the real score is at least this
+    UPPER   // the search failed low, so the real score is at most this
+};
+
+/*
+    A fixed size transposition table, keyed on Board::canonical_key(), so a
+    position and its mirror image share an entry.  The move is stored for
+    the canonical orientation.
+    
+    Safe to share between threads: entries are copied in and out under one
+    of a set of locks, picked by slot.
+*/
+class TranspositionTable{
+public:
+    struct Entry{
+        uint64_t key;
+        double score;
+        Move move;          // NO_MOVE if there isn't one
+        uint depth;
+        Bound bound;
+        uint generation;    // 0 for an empty slot
+    };
+    
+    TranspositionTable(uint bits=16);
+    
+    // copies the entry for key into entry, if there is one
+    bool get(uint64_t key, Entry& entry) const;
+    /*
+        Depth-preferred replacement: an entry is only overwritten by a
+        search of the same position, or one at least as deep, unless it's
+        left over from an earlier search.
+    */
+    void store(uint64_t key, uint depth, Bound bound, double score, Move move);
+    // bumped for every new search, so we can tell stale entries apart
+    void new_search();
+    void clear();
+    
+    size_t size() const {return entries_.size();}
+    size_t used() const;
+private:
+    std::vector<Entry> entries_;
+    uint64_t mask_;
+    uint generation_;
+    mutable std::array<std::mutex,256> locks_;
+    
+    std::mutex& lock(uint64_t key) const {return locks_[key&mask_&(locks_.size()-1)];}
+};
+
+/*
+    Searches with iterative deepening up to maxDepth, and answers with the
+    best move of the deepest search that finished.  A search is abandoned
+    when it runs out of nodes (MAX_AB_CALLS) or, if call() was given one,
+    time.
+    
+    Positions are looked up in a transposition table, kept between calls,
+    which cuts off transposed wall orders and gives a best move to try
+    first when it can't.
+    
+    Each node tries the last iteration's principal variation or the
+    table's move first, then the two killer moves for its ply (the last
+    moves there to cause a cutoff), then the rest by how much they gain in
+    the race home, and by the history heuristic.
+    
+    With more than one thread it's a Lazy SMP search: helper threads run
+    the same iterative deepening, half of them a ply ahead, and share only
+    the transposition table, which is how they help.  The answer comes
+    from whichever thread finished the deepest iteration.
+*/
 class AlphaBetaBot: public BaseBot{
+    typedef std::chrono::steady_clock Clock;
+    
     StepsBot3 evalbot_;
     
     uint ab_calls_;
-    double alphabeta(const Board& board, uint depth, double alpha, double beta);
-    boost::optional<Command> best_command_;
+    bool aborted_;
+    bool timed_;
+    Clock::time_point deadline_;
+    
+    double alphabeta(const Board& board, uint depth, double alpha, double beta, uint ply);
+    bool out_of_time();
+    Move search(const Board& board);
+    Move parallel_search(const Board& board);
+    
+    // a helper thread's searcher, sharing main's table
+    AlphaBetaBot(const AlphaBetaBot& main, uint id, const std::atomic<bool>* stop);
+    
+    // sorts moves into the order to search them
+    void move_order(
+        const Board& board,
+        MoveList& moves,
+        uint ply,
+        Move table_move,
+        bool& pv_first
+    );
+    void cutoff(const Board& board, Move move, uint depth, uint ply);
+    
+    typedef FixedList<Move,MAX_PLY> Line;
+    
+    std::array<std::array<Move,2>,MAX_PLY> killers_;    // NO_MOVE when empty
+    std::array<std::array<uint,MAX_COMMANDS>,2> history_; // by turn and move
+    std::array<Line,MAX_PLY+1> pv_;                       // from each ply down
+    Line previous_pv_;                                    // last finished iteration's
+    bool following_pv_;
+    
+    std::shared_ptr<TranspositionTable> table_;
+    
+    const uint threads_;
+    uint first_depth_;                      // helpers start deeper
+    const std::atomic<bool>* stop_;         // set when helpers should give up
+    uint helper_nodes_;
+    
+    Move best_move_;                        // root move of the current iteration
     const uint maxDepth_;
+    uint depth_;                            // deepest finished iteration
 public:
-    AlphaBetaBot(uint maxDepth=3):ab_calls_(0),maxDepth_(maxDepth){
+    AlphaBetaBot(uint maxDepth=3, bool selective=true, uint tableBits=16, uint threads=1)
+        :BaseBot(selective),ab_calls_(0),aborted_(false),timed_(false),following_pv_(false)
+        ,table_(std::make_shared<TranspositionTable>(tableBits))
+        ,threads_(std::max(threads,1u)),first_depth_(1),stop_(nullptr),helper_nodes_(0)
+        ,best_move_(NO_MOVE),maxDepth_(maxDepth),depth_(0)
+    {
         
     }
     
-    virtual Command call(const Board& board);
+    using BaseBot::call;
+    virtual Move move(const Board& board);
+    // the same, giving up on deeper searches after time_ms milliseconds
+    Move move(const Board& board, uint time_ms);
+    Command call(const Board& board, uint time_ms){
+        return to_command(move(board,time_ms),board.N);
+    }
     
+    uint depth() const {return depth_;}
+    // over all threads
+    uint nodes() const {return ab_calls_+helper_nodes_;}
+    uint threads() const {return threads_;}
+    const TranspositionTable& table() const {return *table_;}
 };
 
 int stepsToEscape(const Board& board, const Piece& location);
+// both pieces' steps to escape, [0] red and [1] blue, from one lookup
+std::array<int,2> distances(const Board& board);
+
+
+const uint8_t UNREACHABLE=255;
+
+// steps from every square (j*N+i) to a goal row
+typedef std::array<uint8_t,MAX_N*MAX_N> DistanceField;
+// indexed by goal: [0] for red (row 0), [1] for blue (row N-1)
+typedef std::array<DistanceField,2> DistanceFields;
+
+// flood fills outwards from both goal rows, a whole BFS layer at a time,
+// on the board's exits bitboards
+DistanceFields distance_fields(const Board& board);
+
+// whether the cached fields for this board are for its mirror image
+inline bool fields_mirrored(const Board& board){
+    return board.mirror_wall_key < board.wall_key;
+}
+
+inline uint field_index(const Board& board, const Location& location){
+    const uint i = fields_mirrored(board)?board.N-1-location.i:location.i;
+    return location.j*board.N+i;
+}
+
+/*
+    A piece's distance to its goal only depends on the walls, so we cache
+    whole distance fields keyed on Board::wall_key.  Then every pawn move
+    child of a node evaluates with a lookup, and only wall children miss.
+    
+    A wall set and its mirror image share an entry: get() returns the fields
+    for whichever has the smaller key, so look squares up through
+    field_index().
+    
+    It's direct mapped, with a power of two slots allocated up front, so a
+    lookup never allocates; a miss just overwrites whatever was in its
+    slot.  So a reference from get() is only good until the next get() for
+    a different wall set.
+*/
+class DistanceCache{
+    struct Entry{
+        uint64_t key;
+        bool used;
+        DistanceFields fields;
+    };
+    
+    std::vector<Entry> entries_;
+    uint64_t mask_;
+    size_t used_;
+public:
+    size_t hits;
+    size_t misses;
+    
+    DistanceCache(uint bits=12);
+    
+    const DistanceFields& get(const Board& board);
+    void clear();
+    size_t size() const {return used_;}
+};
+
+// one per thread, so searches never have to lock it
+DistanceCache& distance_cache();
+
+// steps to the goal from the squares on at least one shortest path from the
+// piece to its goal, by j*N+i, and UNREACHABLE everywhere else
+typedef std::array<uint8_t,MAX_N*MAX_N> PathSquares;
+PathSquares shortest_path_squares(const Board& board, const Piece& piece);
+// how many steps along those paths a wall would block (0, 1 or 2)
+uint path_cuts(const Board& board, const PathSquares& path, Wall orientation, uint j, uint i);
@@ -1,9 +1,11 @@
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 #include <iostream>
 #include <list>
+#include <algorithm>
 #include <exception>
 #include <sstream>
-#include "boost/multi_array.hpp"
 #include "boost/variant.hpp"
 
 #include "board.hpp"
@@ -27,8 +29,7 @@ void place_wall(Board& board, Wall orientation, uint j, uint i){
         For manually constructing a board; doesn't check anything
         or decrement wall count
     */
-    board.walls[j][i]=orientation;
-    apply_wall(board. squares, orientation,j,i);
+    board.place_wall(orientation,j,i);
 }
 
 
@@ -62,6 +63,231 @@ std::string repr_command(const Command& c){
     return s.str();
 }
 
+/*
+    The python side of board.Board's API: commands are lists like
+    ["move", "up"], ["hop", "up", "left"] or ["hwall", (j, i)], colours are
+    "red" and "blue", and illegal commands raise board.BrokenRule.
+*/
+[[noreturn]] void broken_rule(const std::string& message){
+    py::object BrokenRule = py::module_::import("corridors.board").attr("BrokenRule");
+    PyErr_SetString(BrokenRule.ptr(),message.c_str());
+    throw py::error_already_set();
+}
+
+/*
+    push/pop's undo stack and do_checks live in the python object's
+    __dict__, so that Board itself stays trivially copyable
+*/
+py::list undo_stack(py::object self){
+    py::dict dict = self.attr("__dict__");
+    if (not dict.contains("_undo"))
+        dict["_undo"] = py::list();
+    return dict["_undo"];
+}
+
+bool do_checks(py::object self){
+    py::dict dict = self.attr("__dict__");
+    return not dict.contains("_do_checks") or dict["_do_checks"].cast<bool>();
+}
+
+std::string color_name(Color color){
+    return color==RED?"red":"blue";
+}
+
+Direction direction_from_name(const std::string& name){
+    for(auto d: {UP,DOWN,LEFT,RIGHT})
+        if (direction_name(d)==name)
+            return d;
+    broken_rule("No such direction: "+name);
+}
+
+Move parse_command(py::sequence command, uint N){
+    const std::string action = py::str(command[0]);
+    Command parsed = MoveCommand(UP);
+    if (action=="move" and command.size()==2)
+        parsed = MoveCommand(direction_from_name(py::str(command[1])));
+    else if (action=="hop" and command.size()==3)
+        parsed = HopCommand(
+            direction_from_name(py::str(command[1])),
+            direction_from_name(py::str(command[2]))
+        );
+    else if ((action=="hwall" or action=="vwall") and command.size()==2){
+        const py::sequence location = command[1];
+        const bool slot = location.size()==2;
+        const int j = slot?location[0].cast<int>():-1;
+        const int i = slot?location[1].cast<int>():-1;
+        if (j<0 or i<0 or uint(j)>=N-1 or uint(i)>=N-1)
+            broken_rule("No such wall slot: "+std::string(py::repr(command[1])));
+        parsed = WallCommand(Location(j,i),action=="hwall"?HORIZONTAL:VERTICAL);
+    }
+    else
+        broken_rule("Not a command: "+std::string(py::repr(command)));
+    
+    // hops back the way they came don't have a code
+    const Move move = command_index(parsed,N);
+    if (not (to_command(move,N)==parsed))
+        broken_rule("Not a command: "+std::string(py::repr(command)));
+    return move;
+}
+
+// board.Board.__call__: checks the command's legal unless do_checks is off
+void play(py::object self, py::sequence command){
+    Board& board = self.cast<Board&>();
+    const Move move = parse_command(command,board.N);
+    if (do_checks(self) and not board.legal(move))
+        broken_rule("Illegal command: "+std::string(py::repr(command)));
+    board.apply(move);
+}
+
+py::list python_command(Move move, uint N){
+    const MoveInfo& m = decode(move,N);
+    py::list command;
+    switch(m.kind){
+        case STEP:
+            command.append("move");
+            command.append(direction_name(m.d1));
+            break;
+        case HOP:
+            command.append("hop");
+            command.append(direction_name(m.d1));
+            command.append(direction_name(m.d2));
+            break;
+        default:
+            command.append(m.orientation==HORIZONTAL?"hwall":"vwall");
+            command.append(py::make_tuple(m.j,m.i));
+    }
+    return command;
+}
+
+py::dict piece_json(const Piece& piece){
+    py::dict json;
+    json["color"] = color_name(piece.color);
+    json["location"] = py::make_tuple(piece.location.j,piece.location.i);
+    json["walls"] = piece.walls;
+    return json;
+}
+
+py::array_t<Move> moves_to_array(const MoveList& moves){
+    return py::array_t<Move>(moves.size(),moves.begin());
+}
+
+/*
+    Batches of positions come as stacked arrays, in the layout of python's
+    batch.Positions (see Positions.arrays()):
+    
+        walls               (B, N-1, N-1) EMPTY, HORIZONTAL or VERTICAL
+        red, blue           (B, 2) piece locations
+        red_walls, blue_walls (B,) walls left
+        red_to_play         (B,)
+*/
+typedef py::array_t<int, py::array::c_style | py::array::forcecast> IntArray;
+typedef py::array_t<bool, py::array::c_style | py::array::forcecast> BoolArray;
+
+std::vector<Board> unstack(
+    const IntArray& walls, const IntArray& red, const IntArray& blue,
+    const IntArray& red_walls, const IntArray& blue_walls, const BoolArray& red_to_play
+){
+    if (walls.ndim()!=3 or walls.shape(1)!=walls.shape(2))
+        throw std::invalid_argument("walls must be (B, N-1, N-1)");
+    const py::ssize_t B = walls.shape(0);
+    const uint N = walls.shape(1)+1;
+    if (red.ndim()!=2 or blue.ndim()!=2 or red.shape(0)!=B or blue.shape(0)!=B
+        or red.shape(1)!=2 or blue.shape(1)!=2)
+        throw std::invalid_argument("red and blue must be (B, 2)");
+    if (red_walls.size()!=B or blue_walls.size()!=B or red_to_play.size()!=B)
+        throw std::invalid_argument("red_walls, blue_walls and red_to_play must be (B,)");
+    
+    const auto w = walls.unchecked<3>();
+    const auto r = red.unchecked<2>();
+    const auto b = blue.unchecked<2>();
+    const int* r_walls = red_walls.data();
+    const int* b_walls = blue_walls.data();
+    const bool* red_turn = red_to_play.data();
+    
+    std::vector<Board> boards;
+    boards.reserve(B);
+    for(py::ssize_t k=0;k<B;k++){
+        Board board(N,0);
+        for(uint c=0;c<2;c++)
+            if (uint(r(k,c))>=N or uint(b(k,c))>=N)
+                throw std::invalid_argument("piece off the board");
+        if (uint(r_walls[k])>MAX_WALLS or uint(b_walls[k])>MAX_WALLS)
+            throw std::invalid_argument("Too many walls to hash");
+        board.red.location = Location(r(k,0),r(k,1));
+        board.blue.location = Location(b(k,0),b(k,1));
+        board.red.walls = r_walls[k];
+        board.blue.walls = b_walls[k];
+        board.turn = red_turn[k]?RED:BLUE;
+        for(uint j=0;j<N-1;j++)
+            for(uint i=0;i<N-1;i++){
+                const int wall = w(k,j,i);
+                if (wall==HORIZONTAL or wall==VERTICAL)
+                    board.place_wall(Wall(wall),j,i);
+                else if (wall!=EMPTY)
+                    throw std::invalid_argument("walls must be EMPTY, HORIZONTAL or VERTICAL");
+            }
+        board.rehash();
+        boards.push_back(board);
+    }
+    return boards;
+}
+
+py::array_t<bool> legal_mask(
+    const IntArray& walls, const IntArray& red, const IntArray& blue,
+    const IntArray& red_walls, const IntArray& blue_walls, const BoolArray& red_to_play
+){
+    const std::vector<Board> boards = unstack(walls,red,blue,red_walls,blue_walls,red_to_play);
+    const uint N = walls.shape(1)+1;
+    py::array_t<bool> mask({boards.size(),size_t(command_count(N))});
+    auto m = mask.mutable_unchecked<2>();
+    
+    py::gil_scoped_release release;
+    for(size_t k=0;k<boards.size();k++){
+        for(uint move=0;move<command_count(N);move++)
+            m(k,move)=false;
+        for(Move move: boards[k].legal_moves())
+            m(k,move)=true;
+    }
+    return mask;
+}
+
+py::array_t<int32_t> batch_distances(
+    const IntArray& walls, const IntArray& red, const IntArray& blue,
+    const IntArray& red_walls, const IntArray& blue_walls, const BoolArray& red_to_play
+){
+    const std::vector<Board> boards = unstack(walls,red,blue,red_walls,blue_walls,red_to_play);
+    py::array_t<int32_t> steps({boards.size(),size_t(2)});
+    auto s = steps.mutable_unchecked<2>();
+    
+    py::gil_scoped_release release;
+    for(size_t k=0;k<boards.size();k++){
+        const Board& board = boards[k];
+        const DistanceFields& fields = distance_cache().get(board);
+        const Piece* pieces[2] = {&board.red,&board.blue};
+        for(uint c=0;c<2;c++){
+            const uint8_t n = fields[c][field_index(board,pieces[c]->location)];
+            // the same as python's movement.UNREACHABLE
+            s(k,c) = n==UNREACHABLE?std::numeric_limits<int32_t>::max():n;
+        }
+    }
+    return steps;
+}
+
+py::array_t<double> evaluate_many(
+    const BaseBot& bot,
+    const IntArray& walls, const IntArray& red, const IntArray& blue,
+    const IntArray& red_walls, const IntArray& blue_walls, const BoolArray& red_to_play
+){
+    const std::vector<Board> boards = unstack(walls,red,blue,red_walls,blue_walls,red_to_play);
+    py::array_t<double> scores(boards.size());
+    auto s = scores.mutable_unchecked<1>();
+    
+    py::gil_scoped_release release;
+    for(size_t k=0;k<boards.size();k++)
+        s(k) = bot.evaluate(boards[k]);
+    return scores;
+}
+
 PYBIND11_MODULE(_corridors,m) {
 
 
@@ -88,23 +314,6 @@ PYBIND11_MODULE(_corridors,m) {
         
     
         
-    py::class_<walls_type>(m, "Walls")
-        .def("__repr__",[](const walls_type &w){return "some walls";})
-        .def("__getitem__",[](const walls_type &w, py::tuple key){
-            int j = key[0].cast<int>();
-            int i = key[1].cast<int>();
-            
-            //really need bounds checking here!
-            return w[j][i];
-        })
-        .def("__setitem__",[](walls_type &w, py::tuple key, Wall value){
-            //not good enough - need a 'set wall' function
-            int j = key[0].cast<int>();
-            int i = key[1].cast<int>();
-            w[j][i] = value;
-        })
-    //Ideally I'd have some kind of slice function t
-    ;
     py::class_<Location>(m,"Location")
         .def(py::init<uint, uint>())
         .def_readwrite("j", &Location::j)
@@ -123,42 +332,257 @@ PYBIND11_MODULE(_corridors,m) {
     ;
     
     py::class_<Piece>(m,"Piece")
-        .def(py::init<Color,Location,uint>())
-        .def_readonly("color",&Piece::color)
-        .def_readwrite("location",&Piece::location)
+        .def(py::init<Color,Location,uint,uint>(),
+            py::arg("color"),py::arg("location"),py::arg("walls"),py::arg("goal"))
+        .def_property_readonly("color",[](const Piece& piece){
+            return color_name(piece.color);
+        })
+        .def_property("location",
+            [](const Piece& piece){
+                return py::make_tuple(piece.location.j,piece.location.i);
+            },
+            [](Piece& piece, std::pair<uint,uint> location){
+                piece.location = Location(location.first,location.second);
+            },
+            "(j, i), as in board.Piece; set the board's keys with rehash")
         .def_readwrite("walls",&Piece::walls)
+        .def_readonly("goal",&Piece::goal)
+        .def("hasWon",&Piece::hasWon)
+        .def("__json__",&piece_json)
     ;
     
     
     
-    py::class_<Board>(m, "Board")
-        .def(py::init<>())
-        .def("apply",&Board::apply)
+    /*
+        As well as its own API, Board has board.Board's, so games and bots
+        can play on it directly.
+    */
+    py::class_<Board>(m, "Board", py::dynamic_attr())
+        .def(py::init<uint,uint>(),py::arg("N")=9,py::arg("walls")=10)
+        .def("apply",(void (Board::*)(const Command&)) &Board::apply)
         .def("gameOver",&Board::gameOver)
         .def("legalCommand",&Board::legalCommand)
+        .def("legalCommand",[](const Board& board, py::sequence command){
+            // like board.Board's, what isn't a command isn't legal either
+            try{
+                return board.legal(parse_command(command,board.N));
+            }
+            catch(py::error_already_set& e){
+                if (not e.matches(py::module_::import("corridors.board").attr("BrokenRule")))
+                    throw;
+                return false;
+            }
+        })
+        .def("__call__",[](py::object self, py::args command){
+            play(self,command);
+        })
+        .def("push",[](py::object self, py::sequence command){
+            const Board before(self.cast<const Board&>());
+            play(self,command);
+            undo_stack(self).append(py::make_tuple(command,before));
+        },"Apply a command in place, remembering enough to take it back with pop()")
+        .def("pop",[](py::object self){
+            const py::tuple undo = undo_stack(self).attr("pop")();
+            self.cast<Board&>() = undo[1].cast<const Board&>();
+            return py::object(undo[0]);
+        },"Undo the last pushed command, and return it")
+        .def_property("do_checks",&do_checks,[](py::object self, bool checks){
+            self.attr("__dict__")["_do_checks"] = checks;
+        },"Turn off to skip the legality checks of commands known to be legal")
+        .def("allLegalCommands",[](const Board& board, bool selective){
+            py::list commands;
+            for(Move move: BaseBot(selective).legal_moves(board))
+                commands.append(python_command(move,board.N));
+            return commands;
+        },py::arg("selective")=false)
+        .def("winner",[](const Board& board){
+            if (board.red.hasWon())
+                return py::object(py::str("red"));
+            if (board.blue.hasWon())
+                return py::object(py::str("blue"));
+            return py::object(py::none());
+        })
+        .def("currentPiece",(Piece& (Board::*)()) &Board::currentPiece,
+            py::return_value_policy::reference_internal)
+        .def("stepsToEscape",&stepsToEscape)
+        .def("snapshot",[](const Board& board){return Board(board);},
+            "A copy; the python Board's snapshot is immutable, this just isn't shared")
+        .def("thaw",[](const Board& board){return Board(board);})
+        .def("__copy__",[](const Board& board){return Board(board);})
+        .def("__deepcopy__",[](py::object self, py::dict){
+            // like board.Board's, keeps do_checks and what there is to pop
+            py::object copy = py::cast(Board(self.cast<const Board&>()));
+            copy.attr("do_checks") = do_checks(self);
+            copy.attr("__dict__")["_undo"] = undo_stack(self).attr("copy")();
+            return copy;
+        })
+        .def("__eq__",[](const Board& board, py::object other){
+            if (not py::isinstance<Board>(other))
+                return py::reinterpret_borrow<py::object>(Py_NotImplemented);
+            const Board& b = other.cast<const Board&>();
+            auto same_piece = [](const Piece& p, const Piece& q){
+                return p.location==q.location and p.walls==q.walls;
+            };
+            // equal keys almost always mean equal positions, but check in
+            // full in case of a collision
+            bool same = board.key==b.key and board.N==b.N and board.turn==b.turn
+                and same_piece(board.red,b.red) and same_piece(board.blue,b.blue);
+            for(uint j=0;same and j<board.N-1;j++)
+                for(uint i=0;same and i<board.N-1;i++)
+                    same = board.walls.get(j,i)==b.walls.get(j,i);
+            return py::object(py::bool_(same));
+        })
+        .def("__hash__",[](const Board& board){return board.key;})
+        .def("__repr__",[](py::object self){
+            // board.Board draws the board through the API they share
+            return py::module_::import("corridors.board").attr("Board").attr("__repr__")(self);
+        })
+        .def("info",[](py::object self){
+            return py::module_::import("corridors.board").attr("Board").attr("info")(self);
+        })
+        .def("__json__",[](const Board& board){
+            py::list walls;
+            for(uint j=0;j<board.N-1;j++){
+                py::list row;
+                for(uint i=0;i<board.N-1;i++)
+                    row.append(int(board.walls.get(j,i)));
+                walls.append(row);
+            }
+            py::dict settings;
+            settings["N"] = board.N;
+            settings["walls_per_piece"] = board.walls_per_piece;
+            py::dict json;
+            json["red"] = piece_json(board.red);
+            json["blue"] = piece_json(board.blue);
+            json["walls"] = walls;
+            json["turn"] = color_name(board.turn);
+            json["settings"] = settings;
+            return json;
+        })
+        .def("apply_move",(void (Board::*)(Move)) &Board::apply,
+            "Apply a move code; doesn't check it's legal")
+        .def("legal_move",&Board::legal)
+        .def("legal_moves",[](const Board& board){
+            return moves_to_array(board.legal_moves());
+        },"The legal move codes, as a numpy array")
         .def_readonly("N", &Board::N)
-        .def_readwrite("turn",&Board::turn)
-        .def_readonly("walls", &Board::walls)
+        .def_readonly("boardSize", &Board::N)
+        .def_readonly("wallsPerPiece", &Board::walls_per_piece)
+        .def_property("turn",
+            [](const Board& board){return color_name(board.turn);},
+            [](Board& board, py::object turn){
+                if (not py::isinstance<py::str>(turn))
+                    board.turn = turn.cast<Color>();
+                else if (turn.cast<std::string>()=="red" or turn.cast<std::string>()=="blue")
+                    board.turn = turn.cast<std::string>()=="red"?RED:BLUE;
+                else
+                    throw py::value_error("turn must be \"red\" or \"blue\"");
+            },
+            "\"red\" or \"blue\"; can be set with either or a Color")
+        .def_property_readonly("walls",[](py::object self){
+            // a read-only view, since placing walls has to go through the
+            // board to keep its exits and keys up to date
+            const Board& board = self.cast<const Board&>();
+            const size_t M = board.N-1;
+            py::array_t<int8_t> walls(
+                {M,M},
+                {sizeof(board.walls.grid[0]),sizeof(int8_t)},
+                &board.walls.grid[0][0],
+                self
+            );
+            walls.attr("setflags")(py::arg("write")=false);
+            return walls;
+        },"(N-1, N-1) numpy view of the walls, EMPTY, HORIZONTAL or VERTICAL")
         .def_readwrite("red",&Board::red)
         .def_readwrite("blue",&Board::blue)
         .def("place_wall",&place_wall)
+        .def("rehash",&Board::rehash,
+            "Work the keys out again, after setting pieces or turn by hand")
+        .def("key",[](const Board& board){ return board.key; },
+            "64 bit Zobrist key of the position")
+        .def("mirrorKey",[](const Board& board){ return board.mirror_key; },
+            "key() of the position's left-right mirror image")
+        .def("canonicalKey",[](const Board& board){
+            return std::min(board.key,board.mirror_key);
+        },"The same key for a position and its mirror image")
+        .def("isCanonical",[](const Board& board){
+            return board.key<=board.mirror_key;
+        },"Whether this is the orientation canonicalKey() stands for")
         
     ;
     
-    py::class_<StepsBot2>(m,"StepsBot2")
+    py::class_<BaseBot>(m,"BaseBot")
+        .def(py::init<bool>(),py::arg("selective")=false)
+        .def("legal_commands",&BaseBot::legal_commands)
+        .def("legal_moves",[](BaseBot& bot, const Board& board){
+            return moves_to_array(bot.legal_moves(board));
+        },"The move codes legal_commands would give, as a numpy array")
+        .def("evaluate_many",&evaluate_many,
+            "evaluate for each of a batch of positions, as stacked arrays",
+            py::arg("walls"),py::arg("red"),py::arg("blue"),
+            py::arg("red_walls"),py::arg("blue_walls"),py::arg("red_to_play"))
+        .def_readwrite("selective",&BaseBot::selective)
+    ;
+    
+    py::class_<StepsBot2,BaseBot>(m,"StepsBot2")
         .def(py::init<>())
         .def("evaluate",&StepsBot2::evaluate)
         .def("call",&StepsBot2::call)
+        .def("move",&StepsBot2::move)
     ;
     
     
     
-    py::class_<AlphaBetaBot>(m,"AlphaBetaBot")
-        .def(py::init<uint>())
-        .def("call",&AlphaBetaBot::call)
+    py::class_<AlphaBetaBot,BaseBot>(m,"AlphaBetaBot")
+        .def(py::init<uint,bool,uint,uint>(),
+            py::arg("maxDepth")=3,py::arg("selective")=true,py::arg("tableBits")=16,
+            py::arg("threads")=1)
+        // searches don't touch python, so other python threads can run
+        .def("call",(Command (AlphaBetaBot::*)(const Board&)) &AlphaBetaBot::call,
+            py::call_guard<py::gil_scoped_release>())
+        .def("call",(Command (AlphaBetaBot::*)(const Board&, uint)) &AlphaBetaBot::call,
+            "Iterative deepening until time_ms milliseconds are up",
+            py::arg("board"),py::arg("time_ms"),
+            py::call_guard<py::gil_scoped_release>())
+        .def("move",(Move (AlphaBetaBot::*)(const Board&)) &AlphaBetaBot::move,
+            "The same as call, as a move code",
+            py::call_guard<py::gil_scoped_release>())
+        .def("move",(Move (AlphaBetaBot::*)(const Board&, uint)) &AlphaBetaBot::move,
+            py::arg("board"),py::arg("time_ms"),
+            py::call_guard<py::gil_scoped_release>())
+        .def_property_readonly("threads",&AlphaBetaBot::threads)
+        .def_property_readonly("depth",&AlphaBetaBot::depth)
+        .def_property_readonly("nodes",&AlphaBetaBot::nodes)
+        .def_property_readonly("table_size",[](const AlphaBetaBot& bot){
+            return bot.table().size();
+        })
+        .def_property_readonly("table_used",[](const AlphaBetaBot& bot){
+            return bot.table().used();
+        })
     ;
     
     m.def("stepsToEscape", &stepsToEscape);
+    
+    // batch versions, taking stacked arrays; see unstack
+    m.def("legal_mask", &legal_mask,
+        "(B, commands) mask of the legal move codes of each position",
+        py::arg("walls"),py::arg("red"),py::arg("blue"),
+        py::arg("red_walls"),py::arg("blue_walls"),py::arg("red_to_play"));
+    m.def("distances", &batch_distances,
+        "(B, 2) red's and blue's steps to escape in each position",
+        py::arg("walls"),py::arg("red"),py::arg("blue"),
+        py::arg("red_walls"),py::arg("blue_walls"),py::arg("red_to_play"));
+    m.def("mirror", (Board (*)(const Board&)) &mirror,
+        "The board's left-right mirror image");
+    m.def("mirror", (Command (*)(const Command&, uint)) &mirror,
+        "The command that does in the mirror image what this one does here",
+        py::arg("command"),py::arg("N")=9);
+    m.def("mirror", (Move (*)(Move, uint)) &mirror,
+        py::arg("move"),py::arg("N")=9);
+    
+    // move codes are indices into python's board.boardCommands(N)
+    m.def("move_code", &command_index, py::arg("command"),py::arg("N")=9);
+    m.def("decode_move", &to_command, py::arg("move"),py::arg("N")=9);
 
     // m.def("apply_wall_command", &apply_wall_command);
     
@@ -21,6 +21,8 @@ BOOST_PYTHON_MODULE(_corridors_mcts) {
         }
     );
 
+    p::scope().attr("BOARD_SIZE") = BOARD_SIZE;
+
     p::class_<corridors_threaded_api,boost::noncopyable>(
         "_corridors_mcts",
         p::init
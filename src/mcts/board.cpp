@@ -227,6 +227,49 @@ size_t board::get_hash() const
     // NB: we intentionally leave _action out of the hash as the hash is only for the position
 }
 
+board board::get_mirror() const
+{
+    board output(*this);
+    output.hero_x = BOARD_SIZE-1-hero_x;
+    output.villain_x = BOARD_SIZE-1-villain_x;
+
+    output.wall_middles = flags::flags<(BOARD_SIZE-1)*(BOARD_SIZE-1)>();
+    output.horizontal_walls = flags::flags<(BOARD_SIZE-1)*BOARD_SIZE>();
+    output.vertical_walls = flags::flags<(BOARD_SIZE-1)*BOARD_SIZE>();
+
+    // wall middles are indexed y*(BOARD_SIZE-1) + x
+    for (size_t i=0;i<(BOARD_SIZE-1)*(BOARD_SIZE-1);++i)
+    {
+        size_t y = i / (BOARD_SIZE-1);
+        size_t x = i % (BOARD_SIZE-1);
+        if (wall_middles.test(i))
+            output.wall_middles.set(y*(BOARD_SIZE-1) + (BOARD_SIZE-2-x));
+    }
+
+    // horizontal walls are indexed y*BOARD_SIZE + x, for the square x they run along;
+    // vertical walls x*BOARD_SIZE + y, for the gap x between columns x and x+1
+    for (size_t i=0;i<(BOARD_SIZE-1)*BOARD_SIZE;++i)
+    {
+        if (horizontal_walls.test(i))
+            output.horizontal_walls.set((i / BOARD_SIZE)*BOARD_SIZE + (BOARD_SIZE-1-i % BOARD_SIZE));
+        if (vertical_walls.test(i))
+            output.vertical_walls.set((BOARD_SIZE-2-i / BOARD_SIZE)*BOARD_SIZE + i % BOARD_SIZE);
+    }
+
+    output._action.token_position = (_action.token_position / BOARD_SIZE)*BOARD_SIZE
+        + (BOARD_SIZE-1-_action.token_position % BOARD_SIZE);
+    output._action.wall_middle = (_action.wall_middle / (BOARD_SIZE-1))*(BOARD_SIZE-1)
+        + (BOARD_SIZE-2-_action.wall_middle % (BOARD_SIZE-1));
+
+    output._stored_hash = 0; // to ensure we recompute the hash
+    return output;
+}
+
+size_t board::get_canonical_hash() const
+{
+    return std::min(get_hash(), get_mirror().get_hash());
+}
+
 bool board::is_terminal() const
 {
     return hero_wins() || villain_wins();
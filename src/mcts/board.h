@@ -6,7 +6,10 @@
 
 #include "flags.hpp"
 
+// fixed at compile time, e.g. scons board_size=7
+#ifndef BOARD_SIZE
 #define BOARD_SIZE 9
+#endif
 #define STARTING_WALLS 10
 
 namespace corridors {
@@ -48,6 +51,10 @@ namespace corridors {
             template <typename SOMETHING_EMPLACABLE>
             void get_legal_moves(SOMETHING_EMPLACABLE & output) const;
             size_t get_hash() const;
+            // left-right mirror image (x -> BOARD_SIZE-1-x), still from hero's perspective
+            board get_mirror() const;
+            // the same for a position and its mirror image, for tables that only want to store one of them
+            size_t get_canonical_hash() const;
             bool is_terminal() const;
             double get_terminal_eval() const; // eval from hero's perspective
             std::string display() const;
@@ -0,0 +1,34 @@
+import random
+
+import corridors.board
+import corridors.bitboard
+import corridors.movement
+
+
+def test_bitboard_matches_board():
+    random.seed(1)
+    for game in range(5):
+        board = corridors.board.Board()
+        bitboard = corridors.bitboard.BitBoard()
+        while not board.gameOver():
+            commands = list(board.allLegalCommands())
+            assert commands == list(bitboard.allLegalCommands())
+            for piece in (board.red, board.blue):
+                assert bitboard.stepsToEscape(piece) == corridors.movement.stepsToEscape(
+                    board, piece
+                )
+            command = random.choice(commands)
+            board(*command)
+            bitboard(*command)
+            assert (bitboard.walls == board.walls).all()
+            assert bitboard.toBoard() == board
+        assert bitboard.winner() == board.winner()
+
+
+def test_bitboard_round_trip():
+    board = corridors.board.Board()
+    board("hwall", (3, 4))
+    board("vwall", (5, 2))
+    bitboard = corridors.bitboard.BitBoard.fromBoard(board)
+    assert bitboard.toBoard() == board
+    assert bitboard.turn == "red"
@@ -0,0 +1,263 @@
+import numpy as np
+import pytest
+
+from corridors.board import Board, boardCommands
+
+
+def naiveLegalCommands(board):
+    return [c for c in boardCommands(board.N) if board.legalCommand(c)]
+
+
+def test_legal_commands_staged():
+    board = Board()
+    commands = board.allLegalCommands()
+    assert next(commands)[0] in ("move", "hop")
+    assert board._legalCommands is None  # not exhausted, so not cached
+
+    assert list(board.allLegalCommands()) == naiveLegalCommands(board)
+    assert board._legalCommands is not None
+
+
+def test_legal_commands_cache_invalidated():
+    board = Board()
+    before = list(board.allLegalCommands())
+    board("hwall", (0, 3))
+    assert board._legalCommands is None
+    after = list(board.allLegalCommands())
+    assert after != before
+    assert after == naiveLegalCommands(board)
+
+
+def test_selective_commands():
+    import random
+
+    random.seed(5)
+    board = Board()
+    while not board.gameOver():
+        everything = list(board.allLegalCommands())
+        selective = list(board.allLegalCommands(selective=True))
+        assert selective == [c for c in everything if c in selective]
+
+        # the walls left out never slow the other piece down
+        other = board.blue if board.turn == "red" else board.red
+        steps = board.stepsToEscape(other)
+        for command in everything:
+            if command not in selective:
+                board.push(command)
+                assert board.stepsToEscape(other) == steps
+                board.pop()
+        board(*random.choice(everything))
+
+
+def test_push_pop():
+    import copy
+    import random
+
+    random.seed(3)
+    board = Board()
+    start = copy.deepcopy(board)
+    positions = []
+    while not board.gameOver():
+        positions.append(copy.deepcopy(board))
+        board.push(random.choice(list(board.allLegalCommands())))
+
+    while positions:
+        board.pop()
+        assert board == positions.pop()
+    assert board == start
+    assert list(board.allLegalCommands()) == naiveLegalCommands(board)
+
+
+def test_distances_repaired():
+    import random
+    from corridors.movement import distanceField
+
+    random.seed(4)
+    board = Board()
+    while not board.gameOver():
+        walls = [c for c in board.allLegalCommands() if c[0] != "move"]
+        board.push(random.choice(walls or list(board.allLegalCommands())))
+        assert (board.distances["red"] == distanceField(board.squares, 9, 0)).all()
+        assert (board.distances["blue"] == distanceField(board.squares, 9, 8)).all()
+
+    while board._undo:
+        board.pop()
+        assert (board.distances["red"] == distanceField(board.squares, 9, 0)).all()
+
+
+def test_wall_status_matches_search():
+    import random
+    from corridors import movement
+    from corridors.bitboard import BitBoard
+
+    random.seed(5)
+    board = Board()
+    while not board.gameOver():
+        bitboard = BitBoard.fromBoard(board)
+        status = board.wallStatus()
+        available = movement.availableWalls(board.walls)
+        assert (board.available == available).all()
+        for o, orientation in enumerate(movement.ORIENTATIONS):
+            for (j, i), free in np.ndenumerate(available[o]):
+                if not free:
+                    assert status[o, j, i] == movement.OCCUPIED
+                    continue
+                escapable = bitboard.escapableWall((j, i), orientation)
+                assert status[o, j, i] == (
+                    movement.FREE if escapable else movement.TRAPPING
+                )
+        board.push(random.choice(list(board.allLegalCommands())))
+
+
+def test_trapping_wall():
+    from corridors.movement import HORIZONTAL, VERTICAL
+
+    board = Board()
+    board.placeWall((7, 3), HORIZONTAL)
+    board.placeWall((7, 2), VERTICAL)
+    assert board.legalCommand(["vwall", (6, 4)])
+    assert not board.legalCommand(["vwall", (7, 4)])
+    assert not board.escapableWall((7, 4), VERTICAL)
+    assert ["vwall", (7, 4)] not in list(board.allLegalCommands())
+
+
+def test_evaluate_batch():
+    import random
+    from corridors import bots
+
+    random.seed(6)
+    board = Board()
+    evalBots = [bots.StepsBot(), bots.StepsBot2(), bots.StepsBot3()]
+    while not board.gameOver():
+        commands = list(board.allLegalCommands())
+        for bot in evalBots:
+            scores = bot.evaluate_batch(board, commands)
+            assert scores == pytest.approx(
+                bots.BaseBot.evaluate_batch(bot, board, commands)
+            )
+        board(*random.choice(commands))
+
+
+def test_zobrist_key():
+    import copy
+    import random
+    from corridors import zobrist
+
+    random.seed(8)
+    board = Board()
+    keys = {board.key()}
+    while not board.gameOver():
+        board.push(random.choice(list(board.allLegalCommands())))
+        assert board.key() == zobrist.key(board)
+        keys.add(board.key())
+        clone = copy.deepcopy(board)
+        assert clone == board and hash(clone) == hash(board)
+
+    while board._undo:
+        board.pop()
+        assert board.key() == zobrist.key(board)
+    assert board == Board()
+    assert len(keys) > 1
+
+
+def test_distance_cache():
+    from corridors import movement
+    from corridors.movement import HORIZONTAL, VERTICAL
+
+    a = Board()
+    a.placeWall((2, 2), HORIZONTAL)
+    a.placeWall((5, 6), VERTICAL)
+
+    hits = movement.distanceCache.hits
+    b = Board()
+    b.placeWall((5, 6), VERTICAL)
+    b.placeWall((2, 2), HORIZONTAL)
+    assert movement.distanceCache.hits > hits
+    assert b.distances is a.distances
+
+
+def test_snapshot_copy_on_write():
+    board = Board()
+    snapshot = board.snapshot()
+    assert snapshot.walls is board.walls
+    assert board.snapshot() is snapshot
+
+    commands = list(snapshot.allLegalCommands())
+    board("hwall", (0, 3))
+    assert snapshot.walls[0, 3] == 0
+    assert board.walls[0, 3] != 0
+    assert list(snapshot.allLegalCommands()) == commands
+    assert snapshot == Board()
+
+    with pytest.raises(ValueError):
+        snapshot.walls[0, 0] = 1
+    with pytest.raises(AttributeError):
+        snapshot.turn = "blue"
+
+
+def test_snapshot_thaw():
+    import copy
+
+    board = Board()
+    board("hwall", (2, 2))
+    snapshot = board.snapshot()
+    clone = snapshot.thaw()
+    assert clone == board and clone.walls is snapshot.walls
+
+    clone.push(["vwall", (5, 5)])
+    assert snapshot.walls[5, 5] == 0
+    clone.pop()
+    assert clone == snapshot
+    assert copy.deepcopy(snapshot) == snapshot
+
+
+def test_deepcopy_leaves_walls_writeable():
+    import copy
+
+    board = Board()
+    board("hwall", (2, 2))
+    clone = copy.deepcopy(board)
+    assert clone == board and clone.walls is not board.walls
+    assert board.walls.flags.writeable and clone.walls.flags.writeable
+    clone("vwall", (5, 5))
+    assert board.walls[5, 5] == 0
+    assert clone.stepsToEscape(clone.red) == 8
+
+
+def test_mirror():
+    import random
+    from corridors import zobrist
+    from corridors.symmetry import mirrored, canonical
+
+    random.seed(5)
+    board = Board()
+    assert board.isCanonical() and board.key() == board.canonicalKey()
+    commands = boardCommands(board.N)
+    for move in range(30):
+        board(*random.choice(list(board.allLegalCommands())))
+        mirror, table = mirrored(board)
+        assert mirror.key() == zobrist.key(board, mirror=True)
+        assert mirror.canonicalKey() == board.canonicalKey()
+        assert canonical(mirror)[0] == canonical(board)[0]
+        legal = [commands.index(c) for c in board.allLegalCommands()]
+        mirrorLegal = [commands.index(c) for c in mirror.allLegalCommands()]
+        assert sorted(table[k] for k in legal) == sorted(mirrorLegal)
+        assert (mirror.distances["red"] == board.distances["red"][:, ::-1]).all()
+
+
+@pytest.mark.parametrize("N", [5, 7, 11])
+def test_board_sizes(N):
+    import random
+    from corridors.bitboard import BitBoard
+
+    random.seed(N)
+    board = Board(N)
+    bitboard = BitBoard(N)
+    assert board.red.location == (N - 1, N // 2)
+    while not board.gameOver():
+        commands = list(board.allLegalCommands())
+        assert commands == naiveLegalCommands(board)
+        assert commands == list(bitboard.allLegalCommands())
+        command = random.choice(commands)
+        board(*command)
+        bitboard(*command)
@@ -0,0 +1,32 @@
+import corridors.bots
+from corridors.board import Board
+
+
+def minimax(board, depth, evalBot):
+    if depth == 0 or board.gameOver():
+        return evalBot.evaluate(board)
+    scores = []
+    for command in list(board.allLegalCommands()):
+        board.push(command)
+        scores.append(minimax(board, depth - 1, evalBot))
+        board.pop()
+    return max(scores) if board.turn == "red" else min(scores)
+
+
+def test_alphabeta_matches_minimax():
+    board = Board()
+    board("move", "up")
+    board("hwall", (1, 3))
+    board.do_checks = False
+
+    evalBot = corridors.bots.StepsBot3()
+    bot = corridors.bots.AlphaBetaBot(evalBot, maxDepth=2, selective=False)
+    bot.ab_calls = 0
+    bot.aborted = False
+    for depth in (1, 2):
+        score, command = bot.alphabeta(board, depth, -float("inf"), float("inf"))
+        assert score == minimax(board, depth, evalBot)
+
+    # and again, now that the answers are in the table
+    assert bot.alphabeta(board, 2, -float("inf"), float("inf"))[0] == score
+    assert bot(board) in list(board.allLegalCommands())
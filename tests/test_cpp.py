@@ -0,0 +1,349 @@
+import random
+
+import numpy as np
+import pytest
+
+from corridors.board import Board, BrokenRule, boardCommands
+
+_corridors = pytest.importorskip("corridors._corridors")
+
+
+def to_cpp(board):
+    "Like cpp_bots.to_cpp_board, without importing the MCTS extension"
+    c_board = _corridors.Board(board.N, board.wallsPerPiece)
+    c_board.red.location = board.red.location
+    c_board.blue.location = board.blue.location
+    c_board.red.walls = board.red.walls
+    c_board.blue.walls = board.blue.walls
+    for j in range(board.N - 1):
+        for i in range(board.N - 1):
+            if board.walls[j, i]:
+                c_board.place_wall(_corridors.Wall(int(board.walls[j, i])), j, i)
+    c_board.turn = board.turn
+    c_board.rehash()
+    return c_board
+
+
+def random_positions(seed, count=3, N=9):
+    random.seed(seed)
+    for game in range(count):
+        board = Board(N)
+        while not board.gameOver():
+            yield board
+            board(*random.choice(list(board.allLegalCommands())))
+
+
+def test_steps_to_escape():
+    for N in (5, 9, 11):
+        for board in random_positions(10, N=N):
+            c_board = to_cpp(board)
+            for piece, c_piece in ((board.red, c_board.red), (board.blue, c_board.blue)):
+                assert _corridors.stepsToEscape(
+                    c_board, c_piece
+                ) == board.stepsToEscape(piece)
+
+
+def test_legal_commands():
+    player = _corridors.BaseBot()
+    for N in (5, 9, 11):
+        for board in random_positions(15, N=N):
+            c_board = to_cpp(board)
+            commands = sorted(
+                ["hwall" if c[0] == "h" else "vwall", (c[1], c[2])]
+                for c in (c.to_tuple() for c in player.legal_commands(c_board))
+                if c[0] in ("h", "v")
+            )
+            assert commands == sorted(
+                c for c in board.allLegalCommands() if c[0].endswith("wall")
+            )
+
+
+def test_board_sizes():
+    for N in (5, 7, 11):
+        c_board = _corridors.Board(N)
+        board = Board(N)
+        assert c_board.N == N
+        assert c_board.red.location == board.red.location
+        assert c_board.blue.location == board.blue.location
+        for command in range(5):
+            c_command = _corridors.StepsBot2().call(c_board)
+            c_board.apply(c_command)
+        assert not c_board.gameOver()
+
+
+def test_mirror():
+    from corridors.symmetry import mirrorBoard
+
+    for board in random_positions(11, count=1):
+        c_board = to_cpp(board)
+        c_mirror = _corridors.mirror(c_board)
+        mirror = mirrorBoard(board)
+        for j in range(8):
+            for i in range(8):
+                assert int(c_mirror.walls[j, i]) == mirror.walls[j, i]
+        for piece in ("red", "blue"):
+            assert getattr(c_mirror, piece).location == getattr(mirror, piece).location
+            assert _corridors.stepsToEscape(
+                c_mirror, getattr(c_mirror, piece)
+            ) == mirror.stepsToEscape(getattr(mirror, piece))
+
+
+def test_alphabeta_deadline():
+    import time
+
+    board = _corridors.Board()
+    bot = _corridors.AlphaBetaBot(3)
+    command = bot.call(board)
+    assert bot.depth == 3
+    assert board.legalCommand(command)
+
+    bot = _corridors.AlphaBetaBot(20)
+    start = time.perf_counter()
+    command = bot.call(board, 100)
+    assert time.perf_counter() - start < 0.5
+    assert 1 <= bot.depth < 20
+    assert board.legalCommand(command)
+
+
+def test_alphabeta_move_order():
+    # with a good move order a depth 4 search of this position fits well
+    # inside the node budget
+    for k, board in enumerate(random_positions(1, count=1)):
+        if k == 18:
+            break
+    board = to_cpp(board)
+    bot = _corridors.AlphaBetaBot(4)
+    command = bot.call(board)
+    assert bot.depth == 4
+    assert bot.nodes < 2000
+    assert board.legalCommand(command)
+
+
+
+def test_selective_commands():
+    # the same walls as the python generator, and only a few of them all
+    everything = _corridors.BaseBot()
+    selective = _corridors.BaseBot(selective=True)
+    for board in random_positions(12, count=1):
+        c_board = to_cpp(board)
+        commands = [c.to_tuple() for c in selective.legal_commands(c_board)]
+        walls = sorted(
+            ["hwall" if c[0] == "h" else "vwall", (c[1], c[2])]
+            for c in commands
+            if c[0] in ("h", "v")
+        )
+        assert walls == sorted(
+            c for c in board.allLegalCommands(selective=True) if c[0].endswith("wall")
+        )
+        assert len(selective.legal_commands(c_board)) <= len(
+            everything.legal_commands(c_board)
+        )
+
+
+def test_zobrist_keys():
+    random.seed(13)
+    c_board = _corridors.Board()
+    player = _corridors.BaseBot()
+    while not c_board.gameOver():
+        c_board.apply(random.choice(player.legal_commands(c_board)))
+        key, mirror_key = c_board.key(), c_board.mirrorKey()
+        c_board.rehash()
+        assert (c_board.key(), c_board.mirrorKey()) == (key, mirror_key)
+        assert _corridors.mirror(c_board).key() == mirror_key
+        assert c_board.canonicalKey() == min(key, mirror_key)
+        assert c_board.isCanonical() == (key <= mirror_key)
+
+
+def test_alphabeta_table():
+    board = _corridors.Board()
+    bot = _corridors.AlphaBetaBot(4, tableBits=10)
+    assert bot.table_size == 1024
+    bot.call(board)
+    first = bot.nodes
+    assert 0 < bot.table_used <= 1024
+
+    # the second time round the table has the answers
+    bot.call(board)
+    assert bot.nodes < first
+
+
+def test_alphabeta_threads():
+    for board in random_positions(14, count=1):
+        if board.red.walls < 8:
+            break
+    board = to_cpp(board)
+    bot = _corridors.AlphaBetaBot(20, threads=3)
+    assert bot.threads == 3
+    command = bot.call(board, 200)
+    assert bot.depth >= 1
+    assert board.legalCommand(command)
+
+    # and without a deadline, the helpers stop when the main search does
+    bot = _corridors.AlphaBetaBot(3, threads=2)
+    command = bot.call(board)
+    assert bot.depth == 3
+    assert board.legalCommand(command)
+
+
+def test_move_codes():
+    # codes index boardCommands, like the python environment's actions
+    player = _corridors.BaseBot()
+    for N in (5, 9):
+        commands = boardCommands(N)
+        for board in random_positions(16, count=1, N=N):
+            c_board = to_cpp(board)
+            moves = player.legal_moves(c_board)
+            assert moves.dtype == np.uint16
+            legal = list(board.allLegalCommands())
+            assert list(moves) == [
+                k for k, command in enumerate(commands) if command in legal
+            ]
+            assert list(c_board.legal_moves()) == list(moves)
+            for move in moves:
+                command = _corridors.decode_move(int(move), N)
+                assert _corridors.move_code(command, N) == move
+                assert c_board.legal_move(int(move))
+
+    board = _corridors.Board()
+    move = _corridors.AlphaBetaBot(3).move(board)
+    assert board.legal_move(move)
+    board.apply_move(move)
+    assert board.turn == "blue"
+
+
+def test_batch_functions():
+    from corridors.environment import Games, greedyActions
+
+    rng = np.random.default_rng(17)
+    games = Games.new(16)
+    for move in range(10):
+        games.step(greedyActions(games, games.legalMask(), rng))
+    assert (games.walls != 0).any()
+
+    arrays = games.arrays()
+    assert (_corridors.legal_mask(*arrays) == games.legalMask()).all()
+
+    steps = _corridors.distances(*arrays)
+    assert steps.shape == (16, 2)
+    red, blue = games.distances()
+    assert (steps[:, 0] == red).all() and (steps[:, 1] == blue).all()
+
+    bot = _corridors.StepsBot2()
+    live = ~games.over()
+    assert live.any()
+    scores = bot.evaluate_many(*(array[live] for array in arrays))
+    for k, score in zip(np.nonzero(live)[0], scores):
+        c_board = _corridors.Board()
+        c_board.red.location = tuple(games.red[k])
+        c_board.blue.location = tuple(games.blue[k])
+        for j, i in zip(*games.walls[k].nonzero()):
+            wall = _corridors.Wall(int(games.walls[k, j, i]))
+            c_board.place_wall(wall, int(j), int(i))
+        c_board.rehash()
+        assert score == bot.evaluate(c_board)
+
+    with pytest.raises(ValueError):
+        _corridors.distances(games.walls[:, :4], *arrays[1:])
+
+
+def test_native_board():
+    # _corridors.Board plays the same game as board.Board, through its API
+    from corridors import utilities
+    from corridors.game import Game
+
+    random.seed(18)
+    board = Board()
+    game = Game(red=None, board=_corridors.Board())
+    c_board = game.board
+    while True:
+        assert c_board.allLegalCommands() == list(board.allLegalCommands())
+        assert c_board.allLegalCommands(selective=True) == list(
+            board.allLegalCommands(selective=True)
+        )
+        assert (c_board.walls == board.walls).all()
+        assert utilities.dumps(c_board) == utilities.dumps(board)
+        assert c_board.currentPiece().location == board.currentPiece().location
+        assert (c_board.gameOver(), c_board.winner()) == (
+            board.gameOver(),
+            board.winner(),
+        )
+        if board.gameOver():
+            break
+        command = random.choice(list(board.allLegalCommands()))
+        board(*command)
+        c_board(*command)
+    assert utilities.dumps(game)
+
+    with pytest.raises(BrokenRule):
+        c_board("move", "up")
+    with pytest.raises(BrokenRule):
+        _corridors.Board()("hop", "up", "down")
+    with pytest.raises(BrokenRule):
+        _corridors.Board()("hwall", (8, 0))
+    assert not _corridors.Board().legalCommand(["hop", "up", "down"])
+    assert not _corridors.Board().legalCommand(["hwall", (8, 0)])
+    assert not _corridors.Board().legalCommand(["jump"])
+    with pytest.raises(ValueError):
+        c_board.walls[0, 0] = 1
+
+
+def test_native_push_pop():
+    import copy
+
+    c_board = _corridors.Board()
+    start = copy.deepcopy(c_board)
+    c_board.push(["hwall", (3, 4)])
+    c_board.push(["move", "down"])
+    clone = copy.deepcopy(c_board)
+    assert c_board != start and c_board.blue.location == (1, 4)
+    assert c_board.pop() == ["move", "down"]
+    assert c_board.pop() == ["hwall", (3, 4)]
+    assert c_board == start and c_board.walls[3, 4] == 0
+    assert clone.pop() == ["move", "down"] and clone != start
+
+    with pytest.raises(BrokenRule):
+        c_board.push(["move", "down"])
+    c_board.do_checks = False
+    assert not c_board.do_checks and copy.deepcopy(c_board).do_checks is False
+
+
+def test_python_bots_on_native_board():
+    # the python bots only use board.Board's API, so play on either
+    from corridors import bots, utilities
+
+    random.seed(25)
+    board = Board()
+    c_board = _corridors.Board()
+    for _ in range(6):
+        command = random.choice(list(board.allLegalCommands()))
+        board(*command)
+        c_board(*command)
+    assert repr(c_board) == repr(board)
+    assert c_board.red.hasWon() == board.red.hasWon()
+
+    assert bots.StepsBot3()(c_board) == bots.StepsBot3()(board)
+    command = bots.AlphaBetaBot(bots.StepsBot3(), maxDepth=2)(c_board)
+    assert command in c_board.allLegalCommands()
+    # the bots search a copy
+    assert utilities.dumps(c_board) == utilities.dumps(board)
+
+
+def test_alphabeta_threads_error():
+    # an error in the main search still stops and joins the helpers
+    board = _corridors.Board()
+    board.red.location = (0, 4)
+    board.rehash()
+    assert board.gameOver()
+    with pytest.raises(RuntimeError):
+        _corridors.AlphaBetaBot(3, threads=2).call(board)
+
+
+def test_alphabeta_game_over():
+    # a bot that has already moved mustn't answer with that move again
+    bot = _corridors.AlphaBetaBot(2)
+    board = _corridors.Board()
+    bot.call(board)
+    board.red.location = (0, 4)
+    board.rehash()
+    with pytest.raises(RuntimeError):
+        bot.call(board)
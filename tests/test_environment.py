@@ -0,0 +1,36 @@
+import random
+
+from corridors.board import Board, boardCommands
+from corridors.environment import Games, selfPlay, greedyActions
+
+
+def test_legal_mask_matches_board():
+    random.seed(2)
+    commands = boardCommands(9)
+    boards = [Board() for _ in range(3)]
+    games = Games.new(len(boards))
+
+    while not all(board.gameOver() for board in boards):
+        mask = games.legalMask()
+        actions = []
+        for k, board in enumerate(boards):
+            legal = list(board.allLegalCommands())
+            assert (mask[k] == [command in legal for command in commands]).all()
+            if legal:
+                command = random.choice(legal)
+                board(*command)
+                actions.append(commands.index(command))
+            else:
+                actions.append(-1)
+        games.step(actions)
+
+    assert list(games.winner()) == [
+        1 if board.winner() == "red" else -1 for board in boards
+    ]
+
+
+def test_greedy_self_play():
+    games = selfPlay(20, greedyActions, seed=0)
+    assert games.over().all()
+    assert set(games.winner()) <= {1, -1}
+    assert (games.redWalls >= 0).all() and (games.blueWalls >= 0).all()